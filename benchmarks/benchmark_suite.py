@@ -0,0 +1,589 @@
+"""Benchmarks for the import, simulator and visualizer hot paths.
+
+Runs against synthetic databases of several sizes in an isolated folder,
+so user databases, rulesets and stats are never touched. Results are saved
+as JSON with throughput in rows per second and compared against a stored
+baseline.
+
+Run from the project root:
+    python -m benchmarks.benchmark_suite
+    python -m benchmarks.benchmark_suite --sizes 100k,1M --save-baseline
+"""
+
+import argparse
+import datetime
+import importlib
+import platform
+import shutil
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+import utils.constants as consts
+from utils import (
+    db_utils,
+    file_utils,
+    layout_utils,
+    rule_utils,
+    stat_aggregate_utils,
+)
+from utils.logger import logger
+
+model_import_db_csv = importlib.import_module(
+    "pages.10_import_db_csv.model_import_db_csv",
+)
+model_import_db_synthetic = importlib.import_module(
+    "pages.10_import_db_csv.model_import_db_synthetic",
+)
+model_rule_sim = importlib.import_module(
+    "pages.33_rule_simulator.model_rule_sim",
+)
+layout_visualizer_data_store = importlib.import_module(
+    "pages.40_visualizer.layout_visualizer_data_store",
+)
+layout_visualizer_common_functions = importlib.import_module(
+    "pages.40_visualizer.layout_visualizer_common_functions",
+)
+
+BENCHMARK_RULESET_NAME = "benchmark_rules.json"
+
+# Rules covering a plain column rule, a joined student table and a catch all
+BENCHMARK_RULESET = {
+    "rule_preselection": {},
+    "rules_assignment": [
+        {
+            "rule_name": "Hohes Fachsemester",
+            "rule_assignment": {
+                "table_x": "belegungen",
+                "column_x": "fachsemester",
+                "operator_symbol": ">=",
+                "table_y": None,
+                "column_y": 5,
+            },
+            "rule_join_operation": None,
+            "rule_assignment_2": None,
+        },
+        {
+            "rule_name": "Haupthörer Erstwunsch",
+            "rule_assignment": {
+                "table_x": "studierende",
+                "column_x": "hoererstatus",
+                "operator_symbol": "==",
+                "table_y": None,
+                "column_y": "H",
+            },
+            "rule_join_operation": "AND",
+            "rule_assignment_2": {
+                "table_x": "belegungen",
+                "column_x": "wunsch_prio",
+                "operator_symbol": "==",
+                "table_y": None,
+                "column_y": 1,
+            },
+        },
+        {
+            "rule_name": "Rest",
+            "rule_assignment": {
+                "table_x": "belegungen",
+                "column_x": "fachsemester",
+                "operator_symbol": ">=",
+                "table_y": None,
+                "column_y": 0,
+            },
+            "rule_join_operation": None,
+            "rule_assignment_2": None,
+        },
+    ],
+}
+
+# Benchmarks faster than this are too noisy to count as regression
+REGRESSION_MIN_SECONDS = 0.05
+
+# Pandas dtypes of the base db structure as used in import mappings
+IMPORT_MAPPING_DTYPES = {
+    "int": "int64",
+    "Int64": "Int64",
+    "float": "float64",
+    "object": "object",
+}
+
+
+def use_isolated_folders(work_folder: Path):
+    """Point all userdata folders of the app to a benchmark work folder."""
+    consts.FOLDER_DB = Path(work_folder, "databases")
+    consts.FOLDER_CSV_IMPORT = Path(work_folder, "import_files")
+    consts.FOLDER_RULE_FILES = Path(work_folder, "rule_files")
+    consts.FOLDER_STAT_FILES = Path(work_folder, "stats")
+    consts.FOLDER_SWEEP_FILES = Path(work_folder, "sweeps")
+    for folder in [
+        consts.FOLDER_DB,
+        consts.FOLDER_CSV_IMPORT,
+        consts.FOLDER_RULE_FILES,
+        consts.FOLDER_STAT_FILES,
+        consts.FOLDER_SWEEP_FILES,
+    ]:
+        file_utils.get_folder(folder)
+    # Benchmarks should measure the code, not the profiler
+    consts.PROFILING_SETTING_PROFILER = "off"
+    consts.PROFILING_SETTING_TRACK_MEMORY = False
+
+
+def measure(benchmark_name: str, rows: int, function, *args, **kwargs):
+    """Run a function and return its result and a benchmark record.
+
+    Uses the fastest of the configured repetitions.
+    """
+    durations = []
+    for _ in range(max(1, consts.BENCHMARK_SETTING_REPEAT)):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        durations.append(time.perf_counter() - start_time)
+
+    return result, create_record(benchmark_name, min(durations), rows)
+
+
+def create_record(benchmark_name: str, seconds: float, rows):
+    """Return a benchmark record with throughput."""
+    return {
+        "benchmark": benchmark_name,
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_second": (
+            round(rows / seconds, 1) if rows and seconds > 0 else None
+        ),
+    }
+
+
+def get_fixture_database(size_name: str):
+    """Return the name of a synthetic fixture database, create it if needed.
+
+    Fixtures are created once per size and seed and copied for each run,
+    as the simulation changes its database.
+    """
+    fixture_name = (
+        f"benchmark_fixture_{size_name}_{consts.BENCHMARK_SETTING_SEED}.db"
+    )
+    fixture_folder = file_utils.get_folder(
+        Path(consts.FOLDER_BENCHMARK_FILES, "fixtures"),
+    )
+
+    if not file_utils.check_file_presence(fixture_folder, fixture_name):
+        model_import_db_synthetic.generate_synthetic_database(
+            fixture_name,
+            model_import_db_synthetic.SYNTHETIC_DATASET_SIZES[size_name],
+            seed=consts.BENCHMARK_SETTING_SEED,
+        )
+        shutil.move(db_utils.get_db_path(fixture_name), fixture_folder)
+
+    return Path(fixture_folder, fixture_name)
+
+
+def copy_fixture_database(fixture_path: Path, database_name: str):
+    """Copy a fixture into the isolated database folder."""
+    shutil.copyfile(fixture_path, db_utils.get_db_path(database_name))
+
+
+def export_fixture_to_csv(fixture_path: Path):
+    """Write all fixture tables as CSV files with an import mapping.
+
+    Returns the number of exported rows.
+    """
+    base_db_structure = file_utils.read_json(
+        consts.FOLDER_UTILS,
+        consts.FILENAME_BASE_DB_STRUCTURE,
+    )
+    import_folder = file_utils.get_folder(consts.FOLDER_CSV_IMPORT)
+
+    import_mapping = {}
+    row_count = 0
+    with closing(sqlite3.connect(fixture_path)) as conn:
+        for table, table_info in base_db_structure.items():
+            df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            df.to_csv(
+                Path(import_folder, f"{table}.csv"),
+                sep=";",
+                index=False,
+                encoding=consts.DB_SETTING_READ_CSV_ENCODING,
+            )
+            row_count += len(df.index)
+
+            dtypes = {}
+            for column, dtype in table_info["columns"].items():
+                if dtype.startswith("datetime"):
+                    dtypes[f"_parse_dates_{column}"] = "object"
+                else:
+                    dtypes[column] = IMPORT_MAPPING_DTYPES[dtype]
+
+            import_mapping[table] = {
+                "map_to": table,
+                "dtypes": dtypes,
+                "map_to_columns": {
+                    column: column for column in table_info["columns"]
+                },
+            }
+
+    file_utils.write_json(
+        import_mapping,
+        import_folder,
+        consts.FILENAME_IMPORT_MAPPING,
+    )
+
+    return row_count
+
+
+def run_import_benchmark(size_name: str, fixture_path: Path):
+    """Benchmark the CSV import of a fixture."""
+    database_name = f"benchmark_import_{size_name}.db"
+    row_count = export_fixture_to_csv(fixture_path)
+
+    durations = []
+    for _ in range(max(1, consts.BENCHMARK_SETTING_REPEAT)):
+        # The import does not overwrite, so every run starts without the db
+        if file_utils.check_file_presence(consts.FOLDER_DB, database_name):
+            db_utils.delete_db(database_name)
+        start_time = time.perf_counter()
+        model_import_db_csv.import_csv_files(database_name)
+        durations.append(time.perf_counter() - start_time)
+    db_utils.delete_db(database_name)
+
+    return [
+        create_record(
+            f"{size_name}/import_csv_files",
+            min(durations),
+            row_count,
+        ),
+    ]
+
+
+def run_simulator_benchmark(size_name: str, fixture_path: Path):
+    """Benchmark the simulation end to end and each of its stages."""
+    database_name = f"benchmark_{size_name}.db"
+    stat_folder_name = f"benchmark_{size_name}"
+    rule_preselection, list_rule_assignments = rule_utils.read_rule_file(
+        consts.FOLDER_RULE_FILES,
+        BENCHMARK_RULESET_NAME,
+    )
+
+    durations = []
+    for _ in range(max(1, consts.BENCHMARK_SETTING_REPEAT)):
+        # Every run starts from the unchanged fixture
+        copy_fixture_database(fixture_path, database_name)
+        start_time = time.perf_counter()
+        model_rule_sim.rule_simulator(
+            rule_preselection,
+            list_rule_assignments,
+            database_name,
+            BENCHMARK_RULESET_NAME,
+            stat_folder_name,
+        )
+        durations.append(time.perf_counter() - start_time)
+
+    stat_info = rule_utils.read_stat_info(stat_folder_name)
+    row_count = stat_info["stage_profile"][0]["rows_out"]
+    records = [
+        create_record(f"{size_name}/rule_simulator", min(durations), row_count),
+    ]
+    # Stage durations of the last run
+    records.extend(
+        create_record(
+            f"{size_name}/stage/{stage['stage']}",
+            stage["seconds"],
+            stage["rows_in"] or stage["rows_out"],
+        )
+        for stage in stat_info["stage_profile"]
+    )
+
+    return records, stat_folder_name, row_count
+
+
+def run_visualizer_benchmark(
+    size_name: str,
+    stat_folder_name: str,
+    row_count: int,
+):
+    """Benchmark loading stats and building visualizer figures."""
+    records = []
+
+    stat_files, record = measure(
+        f"{size_name}/read_stat_files",
+        row_count,
+        rule_utils.read_stat_files,
+        stat_folder_name,
+    )
+    stat_info = stat_files[0]
+    records.append(record)
+
+    # Named after the former data store function to keep baselines comparable
+    stat_aggregates, record = measure(
+        f"{size_name}/create_data_store",
+        row_count,
+        layout_visualizer_data_store.load_stat_part,
+        stat_folder_name,
+        layout_visualizer_data_store.STAT_PART_AGGREGATES,
+    )
+    records.append(record)
+
+    stat_info, df_aggregates = stat_aggregates
+    new_assignment_count = stat_aggregate_utils.get_total(
+        df_aggregates,
+        stat_aggregate_utils.SELECTION_NEW,
+    )
+    if not new_assignment_count:
+        logger.warning("Keine neuen Einschreibungen, überspringe Diagramme.")
+        return records
+
+    _, record = measure(
+        f"{size_name}/figure/barchart_for_rules",
+        new_assignment_count,
+        lambda: layout_utils.create_barchart_for_rules(
+            stat_aggregate_utils.get_counts(
+                df_aggregates,
+                stat_aggregate_utils.SELECTION_NEW,
+                ["sortierwert", "status"],
+            ),
+            stat_info,
+        ),
+    )
+    records.append(record)
+
+    _, record = measure(
+        f"{size_name}/figure/piechart_for_assignment_status",
+        new_assignment_count,
+        lambda: layout_utils.create_piechart_for_assignment_status(
+            stat_aggregate_utils.get_counts(
+                df_aggregates,
+                stat_aggregate_utils.SELECTION_NEW,
+                ["status"],
+            ),
+        ),
+    )
+    records.append(record)
+
+    _, record = measure(
+        f"{size_name}/figure/stat_tab",
+        row_count,
+        layout_visualizer_common_functions.create_stat_tab,
+        stat_folder_name,
+        stat_info,
+        df_aggregates,
+    )
+    records.append(record)
+
+    for value_parameter in [
+        "Anzahl Belegungen pro Status",
+        "Fachsemester",
+        "Studiengänge",
+        "Veranstaltungen",
+        "Gruppen",
+        "Hörerstatus",
+    ]:
+        _, record = measure(
+            f"{size_name}/figure/flex_piechart/{value_parameter}",
+            new_assignment_count,
+            layout_visualizer_common_functions.create_flex_piechart_figure,
+            value_parameter,
+            "für neue Zulassungen und Ablehnungen",
+            df_aggregates,
+            stat_info["database_filename"],
+        )
+        records.append(record)
+
+    return records
+
+
+def compare_with_baseline(records: list, baseline: dict, threshold: float):
+    """Return records with their relative change against the baseline.
+
+    Benchmarks slower than the baseline by more than the threshold are
+    marked as regression, unless they are below the noise floor.
+    """
+    baseline_seconds = {
+        record["benchmark"]: record["seconds"]
+        for record in baseline.get("results", [])
+    }
+
+    comparison = []
+    for record in records:
+        previous_seconds = baseline_seconds.get(record["benchmark"])
+        if not previous_seconds:
+            continue
+
+        change = record["seconds"] / previous_seconds - 1
+        comparison.append(
+            {
+                "benchmark": record["benchmark"],
+                "seconds": record["seconds"],
+                "baseline_seconds": previous_seconds,
+                "change": round(change, 4),
+                "regression": (
+                    change > threshold
+                    and record["seconds"] >= REGRESSION_MIN_SECONDS
+                ),
+            },
+        )
+
+    return comparison
+
+
+def run_benchmarks(sizes: list, save_baseline=False, threshold=None):
+    """Run all benchmarks for the given dataset sizes.
+
+    Returns the result dict, which is also saved in the benchmark folder.
+    """
+    if threshold is None:
+        threshold = consts.BENCHMARK_SETTING_REGRESSION_THRESHOLD
+
+    benchmark_folder = file_utils.get_folder(consts.FOLDER_BENCHMARK_FILES)
+    work_folder = Path(benchmark_folder, "work")
+    shutil.rmtree(work_folder, ignore_errors=True)
+    file_utils.get_folder(work_folder)
+    use_isolated_folders(work_folder)
+
+    file_utils.write_json(
+        BENCHMARK_RULESET,
+        consts.FOLDER_RULE_FILES,
+        BENCHMARK_RULESET_NAME,
+    )
+
+    records = []
+    try:
+        for size_name in sizes:
+            logger.info(
+                f"{consts.CONSOLE_BLUE}Benchmark für Größe '{size_name}'"
+                f" {consts.CONSOLE_ENDCMD}",
+            )
+            fixture_path = get_fixture_database(size_name)
+
+            records.extend(run_import_benchmark(size_name, fixture_path))
+            (
+                simulator_records,
+                stat_folder_name,
+                row_count,
+            ) = run_simulator_benchmark(size_name, fixture_path)
+            records.extend(simulator_records)
+            records.extend(
+                run_visualizer_benchmark(
+                    size_name,
+                    stat_folder_name,
+                    row_count,
+                ),
+            )
+
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    comparison = []
+    if file_utils.check_file_presence(
+        benchmark_folder,
+        consts.FILENAME_BENCHMARK_BASELINE,
+    ):
+        baseline = file_utils.read_json(
+            benchmark_folder,
+            consts.FILENAME_BENCHMARK_BASELINE,
+        )
+        comparison = compare_with_baseline(records, baseline, threshold)
+
+    result = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "app_version": consts.APP_VERSION,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "repeat": consts.BENCHMARK_SETTING_REPEAT,
+        "seed": consts.BENCHMARK_SETTING_SEED,
+        "regression_threshold": threshold,
+        "results": records,
+        "comparison": comparison,
+    }
+
+    current_datetime = datetime.datetime.now().strftime("%d_%m_%Y_%H_%M_%S")
+    file_utils.write_json(
+        result,
+        benchmark_folder,
+        f"benchmark_{current_datetime}.json",
+    )
+    if save_baseline:
+        file_utils.write_json(
+            result,
+            benchmark_folder,
+            consts.FILENAME_BENCHMARK_BASELINE,
+        )
+        logger.info("Ergebnisse als neue Baseline gespeichert.")
+
+    return result
+
+
+def log_result(result: dict):
+    """Write benchmark results and regressions to the log."""
+    df_results = pd.DataFrame(result["results"])
+    logger.info(f"Benchmark Ergebnisse:\n{df_results.to_string(index=False)}")
+
+    if not result["comparison"]:
+        logger.info("Keine Baseline zum Vergleich vorhanden.")
+        return
+
+    df_comparison = pd.DataFrame(result["comparison"])
+    logger.info(
+        f"Vergleich mit Baseline:\n{df_comparison.to_string(index=False)}",
+    )
+
+    regressions = df_comparison[df_comparison["regression"]]
+    if regressions.empty:
+        logger.info(
+            f"{consts.CONSOLE_GREEN}Keine Regressionen gefunden."
+            f"{consts.CONSOLE_ENDCMD}",
+        )
+    else:
+        logger.warning(
+            f"{len(regressions.index)} Benchmarks sind mehr als"
+            f" {result['regression_threshold']:.0%} langsamer als die"
+            " Baseline.",
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(consts.BENCHMARK_SETTING_SIZES),
+        help="Comma separated dataset sizes, e.g. 100k,1M,10M",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Relative slowdown that counts as regression, e.g. 0.2",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save results as new baseline",
+    )
+    arguments = parser.parse_args()
+
+    sizes = [size.strip() for size in arguments.sizes.split(",")]
+    unknown_sizes = [
+        size
+        for size in sizes
+        if size not in model_import_db_synthetic.SYNTHETIC_DATASET_SIZES
+    ]
+    if unknown_sizes:
+        parser.error(
+            f"Unknown sizes {unknown_sizes}, use"
+            f" {list(model_import_db_synthetic.SYNTHETIC_DATASET_SIZES)}",
+        )
+
+    result = run_benchmarks(sizes, arguments.save_baseline, arguments.threshold)
+    log_result(result)
+
+    # Non zero exit code lets scripts detect regressions
+    if any(record["regression"] for record in result["comparison"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
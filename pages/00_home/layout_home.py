@@ -158,6 +158,14 @@ cards_row_simulator = html.Div(
                     "bi-book",
                     f"{consts.PAGE_DB_MANAGER_URL}",
                 ),
+                card(
+                    "Regelwerke vergleichen",
+                    "Mehrere Regelwerke parallel auf einer Datenbank"
+                    " simulieren, ohne die Datenbank zu verändern.",
+                    "Öffnen",
+                    "bi-layout-three-columns",
+                    f"{consts.PAGE_SIM_SWEEP_URL}",
+                ),
                 card(
                     "Ergebnis Visualisierungs-Tool",
                     "Darstellung und Erkundung von Simualtions-Ergebnissen."
@@ -5,7 +5,7 @@ import dash_bootstrap_components as dbc
 from dash import Input, Output, callback, dcc, html
 
 import utils.constants as consts
-from utils import file_utils
+from utils import file_utils, layout_utils
 from utils.logger import logger
 
 from . import model_import_db_csv
@@ -137,8 +137,7 @@ def run_import(search: str):
 )
 def clear_log(search):
     """Clear the log on pageload."""
-    logger.log_stream.truncate(0)
-    logger.log_stream.seek(0)
+    layout_utils.clear_log_stream()
 
     return False
 
@@ -149,14 +148,7 @@ def clear_log(search):
 )
 def update_log(_):
     """Update the log shown in the textarea in intervals."""
-    content = logger.log_stream.getvalue()
-    content = content.replace(consts.CONSOLE_GREEN, "")
-    content = content.replace(consts.CONSOLE_BLUE, "")
-    content = content.replace(consts.CONSOLE_RED, "")
-    content = content.replace(consts.CONSOLE_YELLOW, "")
-    content = content.replace(consts.CONSOLE_ENDCMD, "")
-
-    return content
+    return layout_utils.get_log_stream_content()
 
 
 @callback(
@@ -9,7 +9,7 @@ from pathlib import Path
 import pandas as pd
 
 import utils.constants as consts
-from utils import db_utils, file_utils
+from utils import db_utils, file_utils, profiling_utils
 from utils.logger import logger
 
 from . import (
@@ -217,6 +217,7 @@ def map_to_base_db(df, import_mapping, table):
     return df
 
 
+@profiling_utils.profile_run("import")
 def import_csv_files(db_filename: None):
     """Write CSV tables to a database compatible with the simulator.
 
@@ -0,0 +1,640 @@
+"""Generate a synthetic university database for load testing.
+
+Creates a whole database from scratch through the same base db structure
+as the CSV import, with configurable sizes and skewed distributions. Used
+to build databases with up to millions of assignments for benchmarks.
+"""
+
+import datetime
+import math
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+import utils.constants as consts
+from utils import db_utils, file_utils
+from utils.logger import logger
+
+from . import model_import_db_csv
+
+# Assignment counts of the standard benchmark databases
+SYNTHETIC_DATASET_SIZES = {
+    "100k": 100_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000,
+}
+
+# Number of students generated and inserted at once, keeps memory bounded
+# for large databases
+SYNTHETIC_STUDENT_CHUNK_SIZE = 100_000
+
+SYNTHETIC_ASSIGNMENT_PROCEDURE = "Sim Synthetische Generierung"
+
+# Default number of choices per student with wish priority 1
+SYNTHETIC_FIRST_PRIORITY_CHOICES = 2
+
+
+def get_power_law_weights(count: int, skew: float, rng):
+    """Return normalized weights following a power law in random order.
+
+    A few entries get most of the weight, like popular lectures or large
+    study programs do in real data.
+    """
+    weights = 1 / np.arange(1, count + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def insert_rows(cursor, table: str, base_db_structure, rows):
+    """Insert rows into a table of the base db structure at once."""
+    placeholders = ", ".join(["?"] * len(base_db_structure[table]["columns"]))
+    cursor.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+
+def create_study_program_rows(study_program_count: int, rng):
+    """Return study program rows and the type of each study program."""
+    study_program_ids = np.arange(1, study_program_count + 1)
+    study_types = rng.choice(["V", "T"], size=study_program_count, p=[0.8, 0.2])
+    standard_periods = rng.choice([6, 4], size=study_program_count)
+
+    rows = [
+        (
+            study_program_id,  # _pk_id
+            "A",  # status
+            f"STG{study_program_id}",  # kurztext
+            f"Synthetischer Studiengang {study_program_id}",  # text
+            study_program_id % 10 + 1,  # fachbereich
+            study_type,  # studiumstyp
+            1 if standard_period == 6 else 2,  # abschluss
+            standard_period,  # regelstudienzeit
+            2020,  # po_version
+            study_program_id,  # studienfach
+        )
+        for study_program_id, study_type, standard_period in zip(
+            study_program_ids.tolist(),
+            study_types.tolist(),
+            standard_periods.tolist(),
+            strict=True,
+        )
+    ]
+
+    return rows, study_types
+
+
+def create_lecture_rows(lecture_count: int, semester: int, rng):
+    """Return lecture rows."""
+    sws = rng.choice([2.0, 4.0], size=lecture_count, p=[0.7, 0.3])
+
+    return [
+        (
+            lecture_id,  # _pk_id
+            "A",  # status
+            f"VA{lecture_id}",  # kurztext
+            f"Synthetische Veranstaltung {lecture_id}",  # text
+            lecture_sws,  # sws
+            semester,  # semester
+            "5",  # credits
+            1,  # uebernahmerhythmus
+            "J",  # belegpflicht
+            "de",  # unterrichtssprache
+        )
+        for lecture_id, lecture_sws in zip(
+            range(1, lecture_count + 1),
+            sws.tolist(),
+            strict=True,
+        )
+    ]
+
+
+def create_study_program_lecture_rows(
+    lecture_study_programs,
+    study_program_count: int,
+    rng,
+):
+    """Return rows relating each lecture to its own and up to two other study
+    programs.
+    """
+    lecture_count = len(lecture_study_programs)
+    additional_counts = rng.binomial(2, 0.3, size=lecture_count)
+
+    lecture_ids = np.concatenate(
+        [
+            np.arange(1, lecture_count + 1),
+            np.repeat(np.arange(1, lecture_count + 1), additional_counts),
+        ],
+    )
+    study_program_ids = np.concatenate(
+        [
+            lecture_study_programs + 1,
+            rng.integers(
+                1,
+                study_program_count + 1,
+                size=additional_counts.sum(),
+            ),
+        ],
+    )
+    compulsory_types = rng.choice(
+        [1, 2, 3],
+        size=len(lecture_ids),
+        p=[0.5, 0.3, 0.2],
+    )
+
+    return [
+        (
+            relation_id,  # _pk_id
+            lecture_id,  # veranstaltungs_id
+            study_program_id,  # studiengangs_id
+            1,  # semester_von
+            99,  # semester_bis
+            compulsory_type,  # fachart_id
+        )
+        for relation_id, lecture_id, study_program_id, compulsory_type in zip(
+            range(1, len(lecture_ids) + 1),
+            lecture_ids.tolist(),
+            study_program_ids.tolist(),
+            compulsory_types.tolist(),
+            strict=True,
+        )
+    ]
+
+
+def create_lecture_combination_rows(lecture_group_counts, combo_share, rng):
+    """Return rows of lecture combinations between random lecture groups."""
+    lecture_count = len(lecture_group_counts)
+    combo_count = int(lecture_count * combo_share)
+    if lecture_count < 2 or not combo_count:
+        return []
+
+    source_lectures = rng.integers(0, lecture_count, size=combo_count)
+    # Offset guarantees that target and source lecture differ
+    target_lectures = (
+        source_lectures + rng.integers(1, lecture_count, size=combo_count)
+    ) % lecture_count
+
+    source_groups = 1 + (
+        rng.random(combo_count) * lecture_group_counts[source_lectures]
+    ).astype(int)
+    target_groups = 1 + (
+        rng.random(combo_count) * lecture_group_counts[target_lectures]
+    ).astype(int)
+
+    return [
+        (
+            combo_id,  # _pk_kombo_id
+            source_lecture + 1,  # quell_veranstaltungs_id
+            source_group,  # quell_gruppen_id
+            target_lecture + 1,  # ziel_veranstaltungs_id
+            target_group,  # ziel_gruppen_id
+        )
+        for combo_id, source_lecture, source_group, target_lecture, target_group in zip(
+            range(1, combo_count + 1),
+            source_lectures.tolist(),
+            source_groups.tolist(),
+            target_lectures.tolist(),
+            target_groups.tolist(),
+            strict=True,
+        )
+    ]
+
+
+def create_student_chunk(
+    first_student_index: int,
+    student_count: int,
+    study_program_weights,
+    study_types,
+    rng,
+):
+    """Return student data of one chunk as dict of arrays."""
+    study_programs = rng.choice(
+        len(study_program_weights),
+        size=student_count,
+        p=study_program_weights,
+    )
+    subject_semesters = np.minimum(rng.geometric(0.3, size=student_count), 14)
+
+    return {
+        "matriculation_numbers": np.arange(
+            100000 + first_student_index,
+            100000 + first_student_index + student_count,
+        ),
+        "study_programs": study_programs,
+        "study_types": study_types[study_programs],
+        "subject_semesters": subject_semesters,
+        "university_semesters": subject_semesters
+        + rng.poisson(1, size=student_count),
+        "listener_status": rng.choice(
+            ["H", "N"],
+            size=student_count,
+            p=[0.9, 0.1],
+        ),
+        "study_kinds": rng.choice(
+            ["E", "Z"],
+            size=student_count,
+            p=[0.85, 0.15],
+        ),
+    }
+
+
+def create_assignment_chunk(
+    students: dict,
+    mean_assignments_per_student: float,
+    max_assignments_per_student: int,
+    lecture_weights,
+    lectures_by_study_program,
+    own_study_program_share: float,
+    first_priority_choices: int,
+    rng,
+):
+    """Return assignment data of one student chunk as dict of arrays.
+
+    Students choose most lectures from their own study program, the rest
+    across the university weighted by lecture popularity. The simulator
+    knows two wish priorities, the first first_priority_choices choices get
+    priority 1 and later ones priority 2.
+    """
+    student_count = len(students["matriculation_numbers"])
+    lecture_count = len(lecture_weights)
+    study_program_lecture_order, study_program_starts, study_program_counts = (
+        lectures_by_study_program
+    )
+
+    assignment_counts = np.clip(
+        1 + rng.poisson(mean_assignments_per_student - 1, size=student_count),
+        1,
+        min(max_assignments_per_student, lecture_count),
+    )
+    student_indices = np.repeat(np.arange(student_count), assignment_counts)
+    assignment_count = len(student_indices)
+
+    lectures = rng.choice(lecture_count, size=assignment_count, p=lecture_weights)
+
+    # Pick a random lecture of the student's study program where possible
+    study_programs = students["study_programs"][student_indices]
+    own_lecture_counts = study_program_counts[study_programs]
+    own_choice = (rng.random(assignment_count) < own_study_program_share) & (
+        own_lecture_counts > 0
+    )
+    own_lectures = study_program_lecture_order[
+        np.minimum(
+            study_program_starts[study_programs]
+            + (rng.random(assignment_count) * own_lecture_counts).astype(int),
+            lecture_count - 1,
+        )
+    ]
+    lectures = np.where(own_choice, own_lectures, lectures)
+
+    # Remove repeated choices of the same lecture by the same student
+    _, first_indices = np.unique(
+        student_indices.astype(np.int64) * lecture_count + lectures,
+        return_index=True,
+    )
+    first_indices.sort()
+    student_indices = student_indices[first_indices]
+    lectures = lectures[first_indices]
+
+    # Position of a choice per student decides its wish priority
+    student_starts = np.flatnonzero(
+        np.r_[True, student_indices[1:] != student_indices[:-1]],
+    )
+    choice_positions = np.arange(len(student_indices)) - np.repeat(
+        student_starts,
+        np.diff(np.r_[student_starts, len(student_indices)]),
+    )
+
+    return {
+        "student_indices": student_indices,
+        "lectures": lectures,
+        "wish_priorities": np.where(
+            choice_positions < first_priority_choices,
+            1,
+            2,
+        ),
+        "first_assignments": rng.choice(
+            ["J", "N"],
+            size=len(lectures),
+            p=[0.8, 0.2],
+        ),
+        "lottery_numbers": rng.integers(0, 10**16, size=len(lectures)),
+    }
+
+
+def generate_synthetic_database(
+    database_name: str,
+    assignment_count: int,
+    student_count=None,
+    lecture_count=None,
+    study_program_count=None,
+    max_groups_per_lecture=4,
+    mean_assignments_per_student=5.0,
+    max_assignments_per_student=10,
+    combo_share=0.05,
+    capacity_ratio=0.8,
+    popularity_skew=1.1,
+    own_study_program_share=0.7,
+    first_priority_choices=SYNTHETIC_FIRST_PRIORITY_CHOICES,
+    semester=None,
+    seed=None,
+):
+    """Create a database with synthetic students, lectures and assignments.
+
+    Arguments:
+    ---------
+    assignment_count: approximate number of enrolled assignments to create
+    student_count: exact number of students to create, their mean number of
+    assignments is then derived from the assignment count. If not specified,
+    students get added until the assignment count is reached
+    lecture_count / study_program_count: derived from the assignment count
+    if not specified
+    first_priority_choices: number of choices per student with wish
+    priority 1, all later choices get priority 2
+    capacity_ratio: participant slots per lecture group relative to its
+    number of assignments, values below 1 lead to denied assignments
+    popularity_skew: power law exponent of lecture popularity
+    seed: seed for all random values, same seed creates the same data
+
+    Returns the number of created assignments.
+
+    """
+    logger.info(
+        f"Starte Generierung einer synthetischen Datenbank mit ca."
+        f" {assignment_count} Belegungen...",
+    )
+
+    if semester is None:
+        semester = consts.RULE_SETTING_CURRENT_SEMESTER
+    if lecture_count is None:
+        lecture_count = max(10, assignment_count // 400)
+    if study_program_count is None:
+        # Study program 999 is reserved for incomings by the import patches
+        study_program_count = min(max(5, lecture_count // 25), 500)
+    if student_count is not None:
+        mean_assignments_per_student = min(
+            max(1.0, assignment_count / max(1, student_count)),
+            max_assignments_per_student,
+        )
+
+    if (
+        file_utils.check_file_presence(consts.FOLDER_DB, database_name)
+        and not consts.DB_SETTING_OVERWRITE_IMPORT
+    ):
+        logger.error(
+            f"Datenbank mit dem Namen '{database_name}'"
+            " existiert bereits und wird nicht überschrieben."
+            " Breche ab.",
+        )
+        raise FileExistsError
+
+    base_db_structure = file_utils.read_json(
+        consts.FOLDER_UTILS,
+        consts.FILENAME_BASE_DB_STRUCTURE,
+    )
+    rng = np.random.default_rng(seed)
+    timestamp = datetime.datetime.now()
+
+    # Lectures belong to one study program, their popularity is skewed
+    lecture_study_programs = rng.integers(
+        0,
+        study_program_count,
+        size=lecture_count,
+    )
+    lecture_weights = get_power_law_weights(lecture_count, popularity_skew, rng)
+    study_program_weights = get_power_law_weights(
+        study_program_count,
+        0.8,
+        rng,
+    )
+    lecture_group_counts = 1 + rng.binomial(
+        max_groups_per_lecture - 1,
+        0.3,
+        size=lecture_count,
+    )
+    study_program_lecture_order = np.argsort(
+        lecture_study_programs,
+        kind="stable",
+    )
+    study_program_counts = np.bincount(
+        lecture_study_programs,
+        minlength=study_program_count,
+    )
+    lectures_by_study_program = (
+        study_program_lecture_order,
+        np.r_[0, np.cumsum(study_program_counts)[:-1]],
+        study_program_counts,
+    )
+
+    database_path = db_utils.get_db_path(database_name)
+    with closing(sqlite3.connect(database_path)) as conn:
+        model_import_db_csv.create_base_db(base_db_structure, conn)
+        db_utils.create_internal_information_table(
+            db_utils.create_db_id(consts.DB_SETTING_INTERNAL_ID_LENGTH),
+            0,
+            timestamp,
+            conn,
+        )
+
+        # Data can be regenerated, so skip syncing to disk for speed
+        conn.execute("PRAGMA synchronous = OFF")
+        cursor = conn.cursor()
+
+        study_program_rows, study_types = create_study_program_rows(
+            study_program_count,
+            rng,
+        )
+        insert_rows(cursor, "studiengang", base_db_structure, study_program_rows)
+        insert_rows(
+            cursor,
+            "veranstaltung",
+            base_db_structure,
+            create_lecture_rows(lecture_count, semester, rng),
+        )
+        insert_rows(
+            cursor,
+            "zuordnung_stg_va_beleg",
+            base_db_structure,
+            create_study_program_lecture_rows(
+                lecture_study_programs,
+                study_program_count,
+                rng,
+            ),
+        )
+        insert_rows(
+            cursor,
+            "i_pflicht",
+            base_db_structure,
+            [(1, "P", "Pflicht"), (2, "WP", "Wahlpflicht"), (3, "W", "Wahl")],
+        )
+        insert_rows(
+            cursor,
+            "i_gruppe",
+            base_db_structure,
+            [
+                (group_id, f"Gruppe {group_id}", 1)
+                for group_id in range(1, max_groups_per_lecture + 1)
+            ],
+        )
+        insert_rows(
+            cursor,
+            "veranstaltung_kombo",
+            base_db_structure,
+            create_lecture_combination_rows(
+                lecture_group_counts,
+                combo_share,
+                rng,
+            ),
+        )
+
+        # Students and their assignments are created in chunks
+        group_demand = np.zeros(
+            lecture_count * max_groups_per_lecture,
+            dtype=np.int64,
+        )
+        created_assignments = 0
+        created_students = 0
+        # Repeated choices get removed, so without a student count keep
+        # adding students until the assignment count is reached
+        while (
+            created_students < student_count
+            if student_count is not None
+            else created_assignments < assignment_count
+        ):
+            if student_count is not None:
+                missing_students = student_count - created_students
+            else:
+                missing_students = math.ceil(
+                    (assignment_count - created_assignments)
+                    / mean_assignments_per_student,
+                )
+            students = create_student_chunk(
+                created_students,
+                min(SYNTHETIC_STUDENT_CHUNK_SIZE, missing_students),
+                study_program_weights,
+                study_types,
+                rng,
+            )
+            assignments = create_assignment_chunk(
+                students,
+                mean_assignments_per_student,
+                max_assignments_per_student,
+                lecture_weights,
+                lectures_by_study_program,
+                own_study_program_share,
+                first_priority_choices,
+                rng,
+            )
+
+            insert_rows(
+                cursor,
+                consts.TABLE_NAME_STUDENT,
+                base_db_structure,
+                zip(
+                    students["matriculation_numbers"].tolist(),
+                    [semester] * len(students["matriculation_numbers"]),
+                    (students["study_programs"] + 1).tolist(),
+                    students["subject_semesters"].tolist(),
+                    ["E"] * len(students["matriculation_numbers"]),
+                    students["listener_status"].tolist(),
+                    students["study_kinds"].tolist(),
+                    students["study_types"].tolist(),
+                    [None] * len(students["matriculation_numbers"]),
+                    students["university_semesters"].tolist(),
+                    students["university_semesters"].tolist(),
+                    strict=True,
+                ),
+            )
+
+            student_indices = assignments["student_indices"]
+            lectures = assignments["lectures"]
+            groups = (
+                rng.random(len(lectures)) * lecture_group_counts[lectures]
+            ).astype(int)
+            group_demand += np.bincount(
+                lectures * max_groups_per_lecture + groups,
+                minlength=len(group_demand),
+            )
+
+            chunk_assignment_count = len(lectures)
+            insert_rows(
+                cursor,
+                consts.TABLE_NAME_ASSIGNMENTS,
+                base_db_structure,
+                zip(
+                    range(
+                        created_assignments + 1,
+                        created_assignments + chunk_assignment_count + 1,
+                    ),  # _pk_id
+                    (lectures + 1).tolist(),  # veranstaltungs_id
+                    [consts.RULE_SETTING_STATUS_ENROLLED]
+                    * chunk_assignment_count,  # status
+                    assignments["wish_priorities"].tolist(),  # wunsch_prio
+                    students["subject_semesters"][
+                        student_indices
+                    ].tolist(),  # fachsemester
+                    students["matriculation_numbers"][
+                        student_indices
+                    ].tolist(),  # matrikelnummer
+                    (
+                        students["study_programs"][student_indices] + 1
+                    ).tolist(),  # studiengangs_id
+                    [None] * chunk_assignment_count,  # sortierwert
+                    [None] * chunk_assignment_count,  # systemnachricht
+                    [SYNTHETIC_ASSIGNMENT_PROCEDURE]
+                    * chunk_assignment_count,  # belegungs_verfahren
+                    [None] * chunk_assignment_count,  # ex_zwischenspeicher
+                    (groups + 1).tolist(),  # gruppen_id
+                    [semester] * chunk_assignment_count,  # semester
+                    [timestamp] * chunk_assignment_count,  # zeitstempel
+                    [None] * chunk_assignment_count,  # kombo_id
+                    assignments["lottery_numbers"].tolist(),  # los_nummer
+                    assignments["first_assignments"].tolist(),  # erstbelegung
+                    strict=True,
+                ),
+            )
+            created_assignments += chunk_assignment_count
+            created_students += len(students["matriculation_numbers"])
+
+            logger.info(
+                f"{created_assignments} Belegungen und {created_students}"
+                " Studierende generiert...",
+            )
+
+        # Slots per lecture group depend on its demand, so some groups are
+        # overbooked and others have free slots
+        lecture_group_indices = np.flatnonzero(
+            np.arange(max_groups_per_lecture)[np.newaxis, :]
+            < lecture_group_counts[:, np.newaxis],
+        )
+        capacities = np.maximum(
+            1,
+            np.round(
+                group_demand[lecture_group_indices]
+                * capacity_ratio
+                * rng.lognormal(0, 0.3, size=len(lecture_group_indices)),
+            ).astype(int),
+        )
+        insert_rows(
+            cursor,
+            "veranstaltung_gruppengroesse",
+            base_db_structure,
+            zip(
+                range(1, len(lecture_group_indices) + 1),  # _pk_id
+                (
+                    lecture_group_indices // max_groups_per_lecture + 1
+                ).tolist(),  # veranstaltungs_id
+                (
+                    lecture_group_indices % max_groups_per_lecture + 1
+                ).tolist(),  # gruppen_id
+                capacities.tolist(),  # max_teilnehmer
+                strict=True,
+            ),
+        )
+
+        conn.commit()
+
+    logger.info(
+        f"{consts.CONSOLE_GREEN}Synthetische Datenbank '{database_name}' mit"
+        f" {created_assignments} Belegungen, {created_students}"
+        f" Studierenden und {lecture_count} Veranstaltungen erstellt.{consts.CONSOLE_ENDCMD}",
+    )
+
+    return created_assignments
@@ -14,6 +14,7 @@ from utils import db_utils
 from . import (
     model_generate_new_assignments,
     model_reset_assignment_status,
+    model_rollback_round,
     model_trigger_self_disenrollment,
 )
 
@@ -289,14 +290,55 @@ self_disenroll = html.Div(
             direction="horizontal",
             gap=3,
         ),
-        html.Div(
-            dbc.Button(
-                "Starten",
-                outline=False,
-                color="warning",
-                id="button-modify-assignments-start-disenroll",
-                n_clicks=0,
-            ),
+        dbc.Stack(
+            [
+                html.Div(
+                    html.H5(
+                        "Seed:",
+                        className="text-center",
+                    ),
+                ),
+                html.Div(
+                    dbc.Input(
+                        id="input-modify-assignments-disenroll-seed",
+                        size="sm",
+                    ),
+                ),
+                dbc.Tooltip(
+                    """Falls angegeben, werden bei gleichem Datenbankstand
+                        immer dieselben Belegungen abgemeldet.""",
+                    target="input-modify-assignments-disenroll-seed",
+                    placement="top",
+                ),
+            ],
+            direction="horizontal",
+            gap=3,
+            className="mt-2",
+        ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Button(
+                        "Starten",
+                        outline=False,
+                        color="warning",
+                        id="button-modify-assignments-start-disenroll",
+                        n_clicks=0,
+                    ),
+                    width="auto",
+                ),
+                dbc.Col(
+                    dbc.Button(
+                        "In allen Veranstaltungen des aktuellen Semesters"
+                        " starten",
+                        outline=False,
+                        color="warning",
+                        id="button-modify-assignments-start-disenroll-semester",
+                        n_clicks=0,
+                    ),
+                    width="auto",
+                ),
+            ],
             className="mt-2",
         ),
         html.Hr(className="mt-5"),
@@ -351,6 +393,57 @@ reset_status = html.Div(
                 ),
             ],
         ),
+        html.Hr(className="mt-5"),
+    ],
+)
+
+rollback_round = html.Div(
+    [
+        html.H3("Simulationsrunde zurücksetzen"),
+        html.P(
+            """Stellt die Belegungen einer Datenbank auf den Stand vor einer
+            Simulationsrunde wieder her. Spätere Runden werden ebenfalls
+            zurückgesetzt. Nur von der Simulation geänderte Belegungen werden
+            wiederhergestellt. Statusänderungen und gelöschte Belegungen über
+            diese Seite beenden den Verlauf, vorherige Runden können danach
+            nicht mehr zurückgesetzt werden.""",
+        ),
+        dbc.Stack(
+            [
+                html.Div(
+                    html.H5(
+                        "Runde:",
+                        className="text-center",
+                    ),
+                ),
+                html.Div(
+                    dbc.Input(
+                        id="input-modify-assignments-rollback-round",
+                        size="sm",
+                    ),
+                ),
+                dbc.Tooltip(
+                    "Falls nicht angegeben, wird die aktuelle Runde der"
+                    " Datenbank zurückgesetzt.",
+                    target="input-modify-assignments-rollback-round",
+                    placement="top",
+                ),
+            ],
+            direction="horizontal",
+            gap=3,
+        ),
+        html.Div(
+            dbc.Button(
+                [
+                    html.I(className="bi bi-exclamation-square me-2"),
+                    "Runde zurücksetzen",
+                ],
+                color="warning",
+                outline=False,
+                id="button-modify-assignments-rollback-round",
+            ),
+            className="mt-2",
+        ),
         html.Div(className="mb-5")
     ],
 )
@@ -364,6 +457,7 @@ layout_generate_new_assignments = html.Div(
         generator,
         self_disenroll,
         reset_status,
+        rollback_round,
     ],
     className="page-container",
 )
@@ -481,11 +575,45 @@ def validate_input_generation_target_semester(value):
     return False
 
 
+@callback(
+    Output("input-modify-assignments-rollback-round", "invalid"),
+    Input("input-modify-assignments-rollback-round", "value"),
+)
+def validate_input_rollback_round(value):
+    """Validate if input for round can be cast to int."""
+    if value:
+        try:
+            value = int(value)
+
+        except ValueError:
+            return True
+
+    return False
+
+
+@callback(
+    Output("input-modify-assignments-disenroll-seed", "invalid"),
+    Input("input-modify-assignments-disenroll-seed", "value"),
+)
+def validate_input_disenroll_seed(value):
+    """Validate if input for seed can be cast to int."""
+    if value:
+        try:
+            value = int(value)
+
+        except ValueError:
+            return True
+
+    return False
+
+
 @callback(
     Output("button-modify-assignments-reset-lecture", "disabled"),
     Output("button-modify-assignments-reset-semester", "disabled"),
     Output("button-modify-assignments-reset-db", "disabled"),
     Output("button-modify-assignments-start-disenroll", "disabled"),
+    Output("button-modify-assignments-start-disenroll-semester", "disabled"),
+    Output("button-modify-assignments-rollback-round", "disabled"),
     Output("button-modify-assignments-generator-start", "disabled"),
     Input("button-modify-assignments-generator-set-db", "outline"),
     Input("button-modify-assignments-generator-set-target", "outline"),
@@ -501,14 +629,14 @@ def toggle_action_buttons(
     """
     # Database name and event id are set
     if not selected_db_invalid and not selected_lecture_invalid:
-        return False, False, False, False, False
+        return False, False, False, False, False, False, False
 
     # Only a database name is set -> activate buttons for status reset
-    # of semester and whole db
+    # of semester and whole db, semester wide disenrollment and rollback
     elif not selected_db_invalid and selected_lecture_invalid:
-        return True, False, False, True, True
+        return True, False, False, True, False, False, True
 
-    return True, True, True, True, True
+    return True, True, True, True, True, True, True
 
 
 @callback(
@@ -612,7 +740,9 @@ def run_generator(
     Input("input-modify-assignments-set-target", "value"),
     Input("select-modify-assignments-set-db", "value"),
     Input("button-modify-assignments-start-disenroll", "n_clicks"),
+    Input("button-modify-assignments-start-disenroll-semester", "n_clicks"),
     Input("input-modify-assignments-disenroll-probability", "value"),
+    Input("input-modify-assignments-disenroll-seed", "value"),
     prevent_initial_call=True,
 )
 def run_disenroll(
@@ -620,18 +750,28 @@ def run_disenroll(
     value_target_id,
     value_db,
     n_clicks_start_disenroll,
+    n_clicks_start_disenroll_semester,
     value_disenroll_probability,
+    value_disenroll_seed,
 ):
     """Set status of assignments to disenrolled by chance."""
     triggered_id = ctx.triggered_id
 
-    # Self disenroll
+    # Self disenroll in target or in all lectures of the current semester
     if (
         n_clicks_start_disenroll
         and triggered_id == "button-modify-assignments-start-disenroll"
+    ) or (
+        n_clicks_start_disenroll_semester
+        and triggered_id
+        == "button-modify-assignments-start-disenroll-semester"
     ):
         # Cast string inputs
         value_target_id = validate_and_cast_int(value_target_id, None)
+        value_disenroll_seed = validate_and_cast_int(
+            value_disenroll_seed,
+            None,
+        )
 
         # Use float for probability
         if isinstance(value_disenroll_probability, str) and not str.isspace(
@@ -639,12 +779,19 @@ def run_disenroll(
         ):
             value_disenroll_probability = float(value_disenroll_probability)
 
+        semester = None
+        if triggered_id == "button-modify-assignments-start-disenroll-semester":
+            value_target_id = None
+            semester = consts.RULE_SETTING_CURRENT_SEMESTER
+
         count = (
             model_trigger_self_disenrollment.trigger_self_disenrollment_chance(
                 value_target_id,
                 value_db,
                 value_target_type,
                 value_disenroll_probability,
+                semester=semester,
+                seed=value_disenroll_seed,
             )
         )
 
@@ -761,3 +908,57 @@ def run_reset(
         )
 
     return ""
+
+
+@callback(
+    Output(
+        "spinner-modify-assignments-fullscreen",
+        "children",
+        allow_duplicate=True,
+    ),
+    Input("select-modify-assignments-set-db", "value"),
+    Input("button-modify-assignments-rollback-round", "n_clicks"),
+    Input("input-modify-assignments-rollback-round", "value"),
+    prevent_initial_call=True,
+)
+def run_rollback(
+    value_db,
+    n_clicks_rollback_round,
+    value_rollback_round,
+):
+    """Restore assignments to the state before a simulation round."""
+    triggered_id = ctx.triggered_id
+
+    if (
+        n_clicks_rollback_round
+        and triggered_id == "button-modify-assignments-rollback-round"
+    ):
+        # Cast string inputs
+        value_rollback_round = validate_and_cast_int(value_rollback_round, None)
+
+        rollback_result = model_rollback_round.rollback_round(
+            value_db,
+            value_rollback_round,
+        )
+        if rollback_result is None:
+            return (
+                dbc.Alert(
+                    "Runde konnte nicht zurückgesetzt werden."
+                    " Siehe Konsolenausgabe oder Log.",
+                    dismissable=True,
+                    color="danger",
+                ),
+            )
+
+        restored_assignments, deleted_assignments = rollback_result
+        return (
+            dbc.Alert(
+                f"Es wurden {restored_assignments} Belegungen"
+                f" wiederhergestellt und {deleted_assignments} in der Runde"
+                " hinzugefügte Belegungen gelöscht.",
+                dismissable=True,
+                color="primary",
+            ),
+        )
+
+    return ""
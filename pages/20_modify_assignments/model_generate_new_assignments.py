@@ -1,18 +1,43 @@
 """Functions to generate new assignments based on existing ones."""
 
 import datetime
-import random
 import sqlite3
-from collections import Counter
 from contextlib import closing
 
+import numpy as np
+
 import utils.constants as consts
-from utils import db_utils
+from utils import cache_utils, db_utils
 from utils.logger import logger
 
+# Columns of student (s) and assignment (b) rows that are sampled together.
+# Drawing them as one tuple keeps e.g. fachsemester, studiengang and
+# hochschulsemester consistent with each other
+SAMPLING_MODEL_COLUMNS = [
+    ("s", "_pk_studienfach"),
+    ("s", "fachsemester"),
+    ("s", "einschreibestatus"),
+    ("s", "hoererstatus"),
+    ("s", "studiumsart"),
+    ("s", "studiumstyp"),
+    ("s", "hochschulsemester"),
+    ("b", "veranstaltungs_id"),
+    ("b", "wunsch_prio"),
+    ("b", "fachsemester"),
+    ("b", "studiengangs_id"),
+    ("b", "gruppen_id"),
+    ("b", "erstbelegung"),
+]
+
+# Fitted sampling models per database state and target, so repeated
+# generations for a target don't need to read its rows again
+sampling_model_cache = cache_utils.LRUCache(
+    max_entries=consts.GENERATOR_SETTING_SAMPLING_MODEL_CACHE_MAX_ENTRIES,
+)
+
 
-def get_students_data(target_type, target_id, cursor):
-    """Return student rows from database.
+def delete_assignments(target_type, target_id, cursor):
+    """Delete assignments from database.
 
     Arguments:
     ---------
@@ -21,22 +46,20 @@ def get_students_data(target_type, target_id, cursor):
     cursor: sqlite3 cursor object
 
     """
-
     cursor.execute(
-        f"""
-        SELECT *
-        FROM studierende s
-        JOIN {consts.TABLE_NAME_ASSIGNMENTS} b
-        ON s._pk_matrikelnummer = b.matrikelnummer
-        WHERE b.{target_type} = ?
-        """,
+        f"""DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}
+        WHERE {target_type} = ?""",
         (target_id,),
     )
-    return cursor.fetchall()
 
 
-def delete_assignments(target_type, target_id, cursor):
-    """Delete assignments from database.
+def fit_sampling_model(target_type, target_id, cursor):
+    """Return a joint frequency table of the student and assignment rows of
+    a target.
+
+    Every distinct combination of the correlated columns is kept once with
+    its count, so sampled rows are always combinations found in the data.
+    Returns None if the target has no assignments with student data.
 
     Arguments:
     ---------
@@ -45,36 +68,79 @@ def delete_assignments(target_type, target_id, cursor):
     cursor: sqlite3 cursor object
 
     """
+    columns = ", ".join(
+        f"{table_alias}.{column}"
+        for table_alias, column in SAMPLING_MODEL_COLUMNS
+    )
     cursor.execute(
-        f"""DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}
-        WHERE {target_type} = ?""",
+        f"""
+        SELECT {columns}, COUNT(*)
+        FROM {consts.TABLE_NAME_STUDENT} s
+        JOIN {consts.TABLE_NAME_ASSIGNMENTS} b
+        ON s._pk_matrikelnummer = b.matrikelnummer
+        WHERE b.{target_type} = ?
+        GROUP BY {columns}
+        """,
         (target_id,),
     )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    # Rows as object array, so sampled values stay python objects which
+    # sqlite can bind
+    template_rows = np.empty(len(rows), dtype=object)
+    template_rows[:] = [row[:-1] for row in rows]
+    counts = np.fromiter(
+        (row[-1] for row in rows),
+        dtype=float,
+        count=len(rows),
+    )
 
+    return {
+        "template_rows": template_rows,
+        "weights": counts / counts.sum(),
+    }
 
-def get_probability_distribution(rows: list):
-    """Return distribution of probablities across all given rows."""
-    distribution = {}
-    table_column_count = len(rows[0])
-    for i in range(table_column_count):
-        column_values = [row[i] for row in rows]
-        counter = Counter(column_values)
-        total = len(column_values)
-        distribution[i] = {
-            value: count / total for value, count in counter.items()
-        }
-    return distribution
 
+def get_sampling_model(database_name, target_type, target_id, cursor):
+    """Return the sampling model of a target, fitted once per database
+    state.
+    """
+    cache_key = (
+        db_utils.get_db_data_version(database_name),
+        target_type,
+        target_id,
+    )
+    sampling_model = sampling_model_cache.get(cache_key)
+    if sampling_model is None:
+        sampling_model = fit_sampling_model(target_type, target_id, cursor)
+        if sampling_model is not None:
+            sampling_model_cache.put(cache_key, sampling_model)
+    else:
+        logger.debug(
+            f"Verwende gespeichertes Stichprobenmodell für {target_type}"
+            f" {target_id}",
+        )
+
+    return sampling_model
+
+
+def sample_template_rows(sampling_model, amount: int, rng):
+    """Return sampled template rows, one tuple of column values per column
+    of SAMPLING_MODEL_COLUMNS.
+    """
+    sampled_rows = sampling_model["template_rows"][
+        rng.choice(
+            len(sampling_model["template_rows"]),
+            size=amount,
+            p=sampling_model["weights"],
+        )
+    ]
+    if not amount:
+        return {column: () for column in SAMPLING_MODEL_COLUMNS}
 
-def pick_row_values_by_chance(rows: list, distribution: dict, column: list):
-    """Return a random column value based on probability distribution."""
-    for i in range(len(rows[0])):
-        if distribution[i]:
-            column[i] = random.choices(
-                list(distribution[i].keys()),
-                weights = distribution[i].values(),
-            )[0]
-    return column
+    return dict(zip(SAMPLING_MODEL_COLUMNS, zip(*sampled_rows)))
 
 
 def generate_new_assignments(
@@ -87,9 +153,15 @@ def generate_new_assignments(
     semester_to_generate_for=None,
     delete_lecture_assignments=False,
     assignment_status_to_use=consts.RULE_SETTING_STATUS_ENROLLED,
+    seed=None,
 ):
     """Generate new assignment data with corresponding student data based on
-    probability distribution of already given assignment data in db.
+    the joint distribution of already given assignment data in db.
+
+    All rows are sampled at once and inserted in one transaction.
+    seed: optional seed, so a generation can be repeated.
+    Earlier rounds can't be rolled back after deleting the assignments of the
+    target, see db_utils.clear_status_journal().
     """
     logger.info(
         "Starte Generierung von neuen Belegungsdaten...",
@@ -105,14 +177,14 @@ def generate_new_assignments(
     with closing(sqlite3.connect(database_path)) as conn:
         cursor = conn.cursor()
 
-        # Select lecture / study program assignment data to use
+        # Check for lecture / study program assignment data to use
         cursor.execute(
-            f"""SELECT * FROM {consts.TABLE_NAME_ASSIGNMENTS} 
+            f"""SELECT semester FROM {consts.TABLE_NAME_ASSIGNMENTS}
             WHERE {target_type} = ?""",
             (target_id,),
         )
-        rows_assignments = cursor.fetchall()
-        if not rows_assignments:
+        row_assignment = cursor.fetchone()
+        if row_assignment is None:
             logger.warning(
                 f"{target_type} '{target_id}' hat keine Belegungen."
                 " Breche generierung ab",
@@ -121,47 +193,17 @@ def generate_new_assignments(
 
         # Select other data for lecture
         if target_type == "veranstaltungs_id":
-            # Get semester of given lecture
-            cursor.execute(
-                f"""SELECT semester FROM {consts.TABLE_NAME_ASSIGNMENTS}
-                WHERE veranstaltungs_id = ?""",
-                (target_id,),
-            )
-            lecture_semester = cursor.fetchone()[0]
             # Use lecture semester if not specified
             if semester_to_generate_for is None:
-                semester_to_generate_for = lecture_semester
-
-            # Get students from lecture
-            rows_students = get_students_data(target_type, target_id, cursor)
-            if not rows_students:
-                logger.warning(
-                    f"Keine Studierenden in Veranstaltung '{target_id}'."
-                    " Breche generierung ab",
-                )
-                return False, None
-
-            # Delete all assignments of lecture
-            if delete_lecture_assignments:
-                delete_assignments(target_type, target_id, cursor)
+                semester_to_generate_for = row_assignment[0]
+            target_name = "Veranstaltung"
 
         # Select other data for study program
         elif target_type == "studiengangs_id":
             # Use current semester if not specified
             if semester_to_generate_for is None:
                 semester_to_generate_for = consts.RULE_SETTING_CURRENT_SEMESTER
-
-            # Get all students that made assignments for a given study program
-            rows_students = get_students_data(target_type, target_id, cursor)
-            if not rows_students:
-                logger.warning(
-                    f"Keine Studierenden in Studiengang '{target_id}'."
-                    " Breche generierung ab",
-                )
-                return False, None
-
-            if delete_lecture_assignments:
-                delete_assignments(target_type, target_id, cursor)
+            target_name = "Studiengang"
 
         else:
             logger.error(
@@ -171,6 +213,28 @@ def generate_new_assignments(
             )
             return False, None
 
+        # Get joint distribution of students that made assignments for the
+        # given lecture / study program
+        sampling_model = get_sampling_model(
+            database_name,
+            target_type,
+            target_id,
+            cursor,
+        )
+        if sampling_model is None:
+            logger.warning(
+                f"Keine Studierenden in {target_name} '{target_id}'."
+                " Breche generierung ab",
+            )
+            return False, None
+
+        # Delete all assignments of lecture / study program
+        # Rolling back earlier rounds would restore the deleted rows only
+        # partially. Generated rows are new, so rollbacks don't touch them
+        if delete_lecture_assignments:
+            delete_assignments(target_type, target_id, cursor)
+            db_utils.clear_status_journal(conn)
+
         # Get highest matricule number and put all generated students after
         if not start_matricule_number:
             cursor.execute("SELECT MAX(_pk_matrikelnummer) FROM studierende")
@@ -183,109 +247,159 @@ def generate_new_assignments(
         )
         start_assignment_number = cursor.fetchone()[0] + 1
 
-        # Get distributions of probabilities
-        distribution_assignments = get_probability_distribution(
-            rows_assignments,
-        )
-        distribution_students = get_probability_distribution(
-            rows_students,
-        )
-
         logger.info(
             f"Generiere {amount} Belegungen und zugehörige Studierende Person"
             f" für {target_type} {target_id} im Semester"
             f" {semester_to_generate_for}...",
         )
 
-        # Generate new assignment and corresponding student
-        for _ in range(amount):
-            # Initialize clean list with column count of
-            # assignment / student table
-            column_assignment = [None] * len(rows_assignments[0])
-            column_student = [None] * len(rows_students[0])
-
-            # Add values to new row depending on probabilities
-            column_assignment = pick_row_values_by_chance(
-                rows_assignments,
-                distribution_assignments,
-                column_assignment,
-            )
-            column_student = pick_row_values_by_chance(
-                rows_students,
-                distribution_students,
-                column_student,
-            )
+        # Sample whole template rows for all new rows at once
+        rng = np.random.default_rng(seed)
+        sampled_columns = sample_template_rows(sampling_model, amount, rng)
 
-            # Create list with probability values and new hard values
-            # Assignment
-            assignment = [
-                start_assignment_number,  # _pk_id
+        assignment_ids = range(
+            start_assignment_number,
+            start_assignment_number + amount,
+        )
+        matricule_numbers = range(
+            start_matricule_number,
+            start_matricule_number + amount,
+        )
+        lottery_numbers = rng.integers(
+            0,
+            10000000000000000,
+            size=amount,
+            endpoint=True,
+        ).tolist()
+        timestamp = datetime.datetime.now()
+
+        # Create rows with sampled values and new hard values
+        # Assignment
+        assignments = [
+            (
+                assignment_id,  # _pk_id
                 target_id
                 if target_type == "veranstaltungs_id"
-                else column_assignment[1],  # veranstaltungs_id
+                else lecture_id,  # veranstaltungs_id
                 assignment_status_to_use,  # status
-                column_assignment[3],  # wunsch_prio
-                column_assignment[4],  # fachsemester
-                start_matricule_number,  # matrikelnummer
+                wish_priority,  # wunsch_prio
+                subject_semester,  # fachsemester
+                matricule_number,  # matrikelnummer
                 target_id
                 if target_type == "studiengangs_id"
-                else column_assignment[6],  # studiengangs_id
+                else study_program_id,  # studiengangs_id
                 None,  # sortierwert
                 None,  # systemnachricht
                 "Sim Init Generierung",  # belegungs_verfahren
                 None,  # ex_zwischenspeicher
-                column_assignment[11],  # gruppen_id
+                group_id,  # gruppen_id
                 semester_to_generate_for,  # semester
-                datetime.datetime.now(),  # zeitstempel
+                timestamp,  # zeitstempel
                 None,  # kombo_id
-                random.randint(0, 10000000000000000),  # los_nummer
-                column_assignment[16],  # erstbelegung
-            ]
-            # Add generated rows to assignment table
-            cursor.execute(
-                f"""INSERT INTO {consts.TABLE_NAME_ASSIGNMENTS}
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                assignment,
+                lottery_number,  # los_nummer
+                first_assignment,  # erstbelegung
             )
-
-            # Student
-            # Check if subject semester (fachsemester) is bigger than
-            # university semester, if so use the bigger subject semester
-            # for consistency
-            if column_student[3] > column_student[9]:
-                column_student[9] = column_student[3]
-
-            student = [
-                start_matricule_number,  # _pk_matrikelnummer
+            for (
+                assignment_id,
+                lecture_id,
+                wish_priority,
+                subject_semester,
+                matricule_number,
+                study_program_id,
+                group_id,
+                lottery_number,
+                first_assignment,
+            ) in zip(
+                assignment_ids,
+                sampled_columns[("b", "veranstaltungs_id")],
+                sampled_columns[("b", "wunsch_prio")],
+                sampled_columns[("b", "fachsemester")],
+                matricule_numbers,
+                sampled_columns[("b", "studiengangs_id")],
+                sampled_columns[("b", "gruppen_id")],
+                lottery_numbers,
+                sampled_columns[("b", "erstbelegung")],
+            )
+        ]
+
+        # Student
+        # Check if subject semester (fachsemester) is bigger than
+        # university semester, if so use the bigger subject semester
+        # for consistency
+        university_semesters = [
+            max(subject_semester, university_semester)
+            for subject_semester, university_semester in zip(
+                sampled_columns[("s", "fachsemester")],
+                sampled_columns[("s", "hochschulsemester")],
+            )
+        ]
+        students = [
+            (
+                matricule_number,  # _pk_matrikelnummer
                 semester_to_generate_for,  # _pk_semester
-                column_student[2],  # _pk_studienfach
-                column_student[3],  # fachsemester
-                column_student[4],  # einschreibestatus
-                column_student[5],  # hoererstatus
-                column_student[6],  # studiumsart
-                column_student[7],  # studiumstyp
+                subject,  # _pk_studienfach
+                subject_semester,  # fachsemester
+                enrollment_status,  # einschreibestatus
+                student_status,  # hoererstatus
+                study_kind,  # studiumsart
+                study_type,  # studiumstyp
                 None,  # ende_grund
-                column_student[9],  # hochschulsemester
-                column_student[9],  # hochschulsemester_gewichtet
-            ]
-
-            cursor.execute(
-                f"""INSERT INTO {consts.TABLE_NAME_STUDENT}
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                student,
+                university_semester,  # hochschulsemester
+                university_semester,  # hochschulsemester_gewichtet
             )
+            for (
+                matricule_number,
+                subject,
+                subject_semester,
+                enrollment_status,
+                student_status,
+                study_kind,
+                study_type,
+                university_semester,
+            ) in zip(
+                matricule_numbers,
+                sampled_columns[("s", "_pk_studienfach")],
+                sampled_columns[("s", "fachsemester")],
+                sampled_columns[("s", "einschreibestatus")],
+                sampled_columns[("s", "hoererstatus")],
+                sampled_columns[("s", "studiumsart")],
+                sampled_columns[("s", "studiumstyp")],
+                university_semesters,
+            )
+        ]
 
-            start_assignment_number += 1
-            start_matricule_number += 1
+        # Add generated rows to assignment and student table
+        cursor.executemany(
+            f"""INSERT INTO {consts.TABLE_NAME_ASSIGNMENTS}
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            assignments,
+        )
+        cursor.executemany(
+            f"""INSERT INTO {consts.TABLE_NAME_STUDENT}
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            students,
+        )
 
         conn.commit()
         db_utils.vacuum_db(conn)
 
-        logger.info(
-            f"{consts.CONSOLE_GREEN}Generierung von {amount} neuen Belegungen"
-            f" und zugehörigen Studierenden für {target_type} {target_id} im"
-            f" Semester {semester_to_generate_for} abgeschlossen."
-            f"{consts.CONSOLE_ENDCMD}",
+    # Generated rows follow the distribution of the model, so the model
+    # stays valid for the new database state unless rows were deleted
+    if not delete_lecture_assignments:
+        sampling_model_cache.put(
+            (
+                db_utils.get_db_data_version(database_name),
+                target_type,
+                target_id,
+            ),
+            sampling_model,
         )
 
-        return True, semester_to_generate_for
+    logger.info(
+        f"{consts.CONSOLE_GREEN}Generierung von {amount} neuen Belegungen"
+        f" und zugehörigen Studierenden für {target_type} {target_id} im"
+        f" Semester {semester_to_generate_for} abgeschlossen."
+        f"{consts.CONSOLE_ENDCMD}",
+    )
+
+    return True, semester_to_generate_for
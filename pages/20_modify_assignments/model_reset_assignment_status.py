@@ -15,65 +15,81 @@ def reset_assignment_status(
     target_type=None,
     semester=None,
 ):
+    """Reset status of assignments to enrolled and delete Kombotrigger rows.
+
+    target_id: single id or list of ids of target_type
+    semester: single semester or list of semesters
+    Without target and semester, all assignments of the database are reset.
+    Earlier rounds can't be rolled back afterwards, see
+    db_utils.clear_status_journal().
+    Returns the number of reset assignments and deleted Kombotrigger rows.
+    """
     logger.info(
             f"Setze Belegungsstatus von Einträgen in {database_name} zurück...",
         )
+
+    assignment_status_values = (
+        consts.RULE_SETTING_STATUS_ACCEPTED,
+        consts.RULE_SETTING_STATUS_DENIED,
+        "HP",
+        "NP",
+        "ST",
+    )
+
+    # Set the parameterized conditions based on the provided parameters
+    query_conditions = ["status IN (?, ?, ?, ?, ?)"]
+    query_parameters = list(assignment_status_values)
+    if target_id is not None and target_type is not None:
+        condition, parameters = db_utils.get_in_condition(
+            target_type,
+            target_id,
+        )
+        query_conditions.append(condition)
+        query_parameters.extend(parameters)
+    if semester is not None:
+        condition, parameters = db_utils.get_in_condition(
+            "semester",
+            semester,
+        )
+        query_conditions.append(condition)
+        query_parameters.extend(parameters)
+    query_condition = " AND ".join(query_conditions)
+
     database_path = db_utils.get_db_path(database_name, True)
     with closing(sqlite3.connect(database_path)) as conn:
         cursor = conn.cursor()
 
-        assignment_status_values = (
-            consts.RULE_SETTING_STATUS_ACCEPTED,
-            consts.RULE_SETTING_STATUS_DENIED,
-            "HP",
-            "NP",
-            "ST",
+        # Remove kombotrigger rows from db first, so they are not reset.
+        # Both statements run in one transaction
+        cursor.execute(
+            f"DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}"
+            f" WHERE {query_condition} AND systemnachricht = 'Kombotrigger'",
+            query_parameters,
         )
-
-        # Set the condition based on the provided parameters
-        query_condition = None
-        if target_id is not None and target_type is not None:
-            query_condition = f"{target_type} = {target_id}"
-        elif semester is not None and isinstance(semester, (int, float)):
-            query_condition = f"semester = {semester}"
-
-        # Build sql query string with conditions
-        query = f"SELECT * FROM {consts.TABLE_NAME_ASSIGNMENTS} WHERE status IN (?, ?, ?, ?, ?)"
-        if query_condition is not None:
-            query += f" AND {query_condition}"
-
-        # Execute query and fetch all rows
-        cursor.execute(query, assignment_status_values)
-        rows = cursor.fetchall()
-
-        # Get kombotrigger rows
-        query += " AND systemnachricht = 'Kombotrigger'"
-        cursor.execute(query, assignment_status_values)
-        rows_combo = cursor.fetchall()
+        # Row count of a statement is taken from sqlite's changes()
+        deleted_count = cursor.rowcount
 
         # Set new status
-        for row in rows:
-            cursor.execute(
-                f"UPDATE {consts.TABLE_NAME_ASSIGNMENTS} SET status = ?, zeitstempel = ? WHERE _pk_id = ?",
-                (
-                    consts.RULE_SETTING_STATUS_ENROLLED,
-                    str(datetime.datetime.now()),
-                    row[0],
-                ),
-            )
+        cursor.execute(
+            f"UPDATE {consts.TABLE_NAME_ASSIGNMENTS}"
+            " SET status = ?, zeitstempel = ?"
+            f" WHERE {query_condition}",
+            [
+                consts.RULE_SETTING_STATUS_ENROLLED,
+                str(datetime.datetime.now()),
+                *query_parameters,
+            ],
+        )
+        changed_count = cursor.rowcount
 
-        # Remove kombotrigger rows from db
-        for row in rows_combo:
-            cursor.execute(
-                f"DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS} WHERE _pk_id = ?",
-                (row[0],),
-            )
+        # Rolling back earlier rounds would overwrite the reset status
+        if changed_count or deleted_count:
+            db_utils.clear_status_journal(conn)
 
         conn.commit()
-        db_utils.vacuum_db(conn)
 
         logger.info(
-            f"Der Status von {len(rows)} Belegungen wurde auf '{consts.RULE_SETTING_STATUS_ENROLLED}' gesetzt und {len(rows_combo)} Kombotrigger wurden gelöscht.",
+            f"Der Status von {changed_count} Belegungen wurde auf '{consts.RULE_SETTING_STATUS_ENROLLED}' gesetzt und {deleted_count} Kombotrigger wurden gelöscht.",
         )
 
-        return len(rows), len(rows_combo)
+        return changed_count, deleted_count
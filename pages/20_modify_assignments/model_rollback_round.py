@@ -0,0 +1,162 @@
+"""Function to roll back simulation rounds via the status journal.
+
+Every simulation round that writes back to the database journals the
+previous values of the rows it changed, see
+model_rule_sim.write_status_journal(). A rollback only touches those rows,
+so its cost depends on the size of the rounds, not of the database.
+Changes made outside of simulation rounds are not journaled. They clear the
+journal instead, see db_utils.clear_status_journal(), so a rollback never
+overwrites them.
+"""
+
+import sqlite3
+from contextlib import closing
+
+import utils.constants as consts
+from utils import db_utils
+from utils.logger import logger
+
+
+def get_journaled_rounds(cursor):
+    """Return all journaled rounds with their previous round, newest first."""
+    cursor.execute(
+        f"""SELECT {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND},
+        {consts.COLUMN_NAME_STATUS_JOURNAL_PREVIOUS_ROUND}
+        FROM {consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS}
+        ORDER BY {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} DESC""",
+    )
+    return cursor.fetchall()
+
+
+def check_rounds_can_be_rolled_back(
+    rounds_to_roll_back,
+    assignment_round,
+    current_round,
+):
+    """Check if the journaled rounds form an unbroken chain from the current
+    round back to the given round.
+    """
+    if not rounds_to_roll_back:
+        return False
+
+    if (
+        rounds_to_roll_back[0][0] != current_round
+        or rounds_to_roll_back[-1][0] != assignment_round
+    ):
+        return False
+
+    # Every round must start where the older journaled round ended
+    return all(
+        previous_round == older_round
+        for (_, previous_round), (older_round, _) in zip(
+            rounds_to_roll_back,
+            rounds_to_roll_back[1:],
+        )
+    )
+
+
+def rollback_round(database_name: str, assignment_round=None):
+    """Restore the assignments of a database to the state before a round.
+
+    Later rounds get rolled back as well, newest first. Uses the current
+    round if no round is given.
+    Returns the number of restored and deleted assignments, or None if the
+    round can't be rolled back.
+    """
+    database_path = db_utils.get_db_path(database_name, True)
+    with closing(sqlite3.connect(database_path)) as conn:
+        cursor = conn.cursor()
+        db_utils.create_status_journal_table(conn)
+
+        current_round = db_utils.get_assignment_round(conn)
+        if assignment_round is None:
+            assignment_round = current_round
+
+        logger.info(
+            f"Setze Runde {assignment_round} in {database_name} zurück...",
+        )
+
+        journaled_rounds = get_journaled_rounds(cursor)
+        rounds_to_roll_back = [
+            (journaled_round, previous_round)
+            for journaled_round, previous_round in journaled_rounds
+            if journaled_round >= assignment_round
+        ]
+        if not check_rounds_can_be_rolled_back(
+            rounds_to_roll_back,
+            assignment_round,
+            current_round,
+        ):
+            logger.warning(
+                f"Runde {assignment_round} kann nicht zurückgesetzt werden,"
+                " da nicht alle Runden von ihr bis zur aktuellen Runde"
+                f" {current_round} im Statusjournal vorliegen. Belegungen, die"
+                " außerhalb einer Runde geändert werden, leeren das"
+                " Statusjournal.",
+            )
+            return None
+
+        restored_count = 0
+        deleted_count = 0
+        for journaled_round, _ in rounds_to_roll_back:
+            # Rows added by the round, e.g. Kombotrigger rows
+            cursor.execute(
+                f"""DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}
+                WHERE {consts.COLUMN_NAME_ASSIGNMENTS_ID} IN (
+                    SELECT {consts.COLUMN_NAME_ASSIGNMENTS_ID}
+                    FROM {consts.TABLE_NAME_STATUS_JOURNAL}
+                    WHERE {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} = ?
+                    AND {consts.COLUMN_NAME_STATUS_JOURNAL_NEW_ROW} = 1
+                )""",
+                (journaled_round,),
+            )
+            deleted_count += cursor.rowcount
+
+            # Rows changed by the round get their previous values back
+            restored_columns = [
+                consts.COLUMN_NAME_ASSIGNMENTS_STATUS,
+                consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO,
+                consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_METHOD,
+                consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP,
+            ]
+            cursor.execute(
+                f"""SELECT {', '.join(restored_columns)},
+                {consts.COLUMN_NAME_ASSIGNMENTS_ID}
+                FROM {consts.TABLE_NAME_STATUS_JOURNAL}
+                WHERE {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} = ?
+                AND {consts.COLUMN_NAME_STATUS_JOURNAL_NEW_ROW} = 0""",
+                (journaled_round,),
+            )
+            journal_rows = cursor.fetchall()
+            cursor.executemany(
+                f"""UPDATE {consts.TABLE_NAME_ASSIGNMENTS}
+                SET {' = ?, '.join(restored_columns)} = ?
+                WHERE {consts.COLUMN_NAME_ASSIGNMENTS_ID} = ?""",
+                journal_rows,
+            )
+            restored_count += len(journal_rows)
+
+            for table in (
+                consts.TABLE_NAME_STATUS_JOURNAL,
+                consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS,
+            ):
+                cursor.execute(
+                    f"""DELETE FROM {table}
+                    WHERE {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} = ?""",
+                    (journaled_round,),
+                )
+
+        # Commits all changes in one transaction
+        db_utils.write_new_round_counter_and_timestamp(
+            rounds_to_roll_back[-1][1],
+            conn,
+        )
+
+        logger.info(
+            f"Runde {assignment_round} zurückgesetzt: {restored_count}"
+            f" Belegungen wiederhergestellt und {deleted_count} hinzugefügte"
+            " Belegungen gelöscht. Aktuelle Runde ist"
+            f" {rounds_to_roll_back[-1][1]}.",
+        )
+
+        return restored_count, deleted_count
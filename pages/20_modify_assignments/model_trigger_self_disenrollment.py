@@ -1,12 +1,13 @@
 """Function to apply a self disenroll status on assignments by chance."""
 
 import datetime
-import random
 import sqlite3
 from contextlib import closing
 
+import numpy as np
+
 import utils.constants as consts
-from utils import db_utils
+from utils import db_utils, rule_utils
 from utils.logger import logger
 
 
@@ -15,41 +16,81 @@ def trigger_self_disenrollment_chance(
     database_name,
     target_type="veranstaltungs_id",
     probability=consts.GENERATOR_SETTING_DEFAULT_DISENROLL_CHANCE,
+    semester=None,
+    seed=None,
 ):
+    """Set accepted and enrolled assignments to self disenrolled by chance.
+
+    target_id: single id or list of ids of target_type. None applies to all
+    lectures / study programs, which can be limited by semester.
+    semester: single semester or list of semesters, None for all.
+    seed: optional seed, so the same assignments get disenrolled again.
+    Earlier rounds can't be rolled back afterwards, see
+    db_utils.clear_status_journal().
+    Returns the number of changed assignments.
+    """
+    target_name = (
+        f"{target_type} {target_id}" if target_id is not None else "alle Ziele"
+    )
+    if semester is not None:
+        target_name += f" im Semester {semester}"
     logger.info(
-        f"Löse Selbstabmeldungen für {target_type} {target_id} aus...",
+        f"Löse Selbstabmeldungen für {target_name} aus...",
     )
+
+    # Build parameterized conditions
+    query_conditions = ["status IN (?, ?)"]
+    query_parameters = [
+        consts.RULE_SETTING_STATUS_ACCEPTED,
+        consts.RULE_SETTING_STATUS_ENROLLED,
+    ]
+    for column, values in ((target_type, target_id), ("semester", semester)):
+        if values is None:
+            continue
+        condition, parameters = db_utils.get_in_condition(column, values)
+        query_conditions.append(condition)
+        query_parameters.extend(parameters)
+
     database_path = db_utils.get_db_path(database_name, True)
     with closing(sqlite3.connect(database_path)) as conn:
         cursor = conn.cursor()
 
+        # Ordered ids, so a seed always disenrolls the same assignments
         cursor.execute(
-            f"SELECT * FROM {consts.TABLE_NAME_ASSIGNMENTS}"
-            f" WHERE {target_type} = ?"
-            " AND status IN (?, ?)",
+            f"SELECT _pk_id FROM {consts.TABLE_NAME_ASSIGNMENTS}"
+            f" WHERE {' AND '.join(query_conditions)}"
+            " ORDER BY _pk_id",
+            query_parameters,
+        )
+        assignment_ids = np.array(
+            [row[0] for row in cursor.fetchall()],
+            dtype=np.int64,
+        )
+        disenrolled_ids = rule_utils.draw_self_disenrolled_ids(
+            assignment_ids,
+            probability,
+            seed,
+        )
+
+        timestamp = str(datetime.datetime.now())
+        cursor.executemany(
+            f"UPDATE {consts.TABLE_NAME_ASSIGNMENTS}"
+            " SET status = ?, zeitstempel = ?"
+            " WHERE _pk_id = ?",
             (
-                target_id,
-                consts.RULE_SETTING_STATUS_ACCEPTED,
-                consts.RULE_SETTING_STATUS_ENROLLED,
+                (
+                    consts.RULE_SETTING_STATUS_SELF_DISENROLLED,
+                    timestamp,
+                    assignment_id,
+                )
+                for assignment_id in disenrolled_ids.tolist()
             ),
         )
-        rows = cursor.fetchall()
-        count = 0
-
-        for row in rows:
-            # random.random() generates a floating point value between 0 and 1
-            if random.random() < probability:
-                cursor.execute(
-                    f"UPDATE {consts.TABLE_NAME_ASSIGNMENTS}"
-                    " SET status = ?, zeitstempel = ?"
-                    " WHERE _pk_id = ?",
-                    (
-                        consts.RULE_SETTING_STATUS_SELF_DISENROLLED,
-                        str(datetime.datetime.now()),
-                        row[0],
-                    ),
-                )
-                count += 1
+        count = len(disenrolled_ids)
+
+        # Rolling back earlier rounds would overwrite the disenrollments
+        if count:
+            db_utils.clear_status_journal(conn)
 
         conn.commit()
 
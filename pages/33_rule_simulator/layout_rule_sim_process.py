@@ -5,13 +5,13 @@ from pathlib import Path
 
 import dash
 import dash_bootstrap_components as dbc
-from dash import Input, Output, callback, ctx, dcc, html
+from dash import Input, Output, State, callback, ctx, dcc, html
 
 import utils.constants as consts
-from utils import file_utils, rule_utils
+from utils import file_utils, layout_utils, rule_utils
 from utils.logger import logger
 
-from . import model_rule_sim
+from . import model_rule_sim, model_rule_sim_pipeline
 
 dash.register_page(
     __name__,
@@ -53,6 +53,94 @@ stat_naming = html.Div(
             ],
             className="mb-3",
         ),
+        html.H3("Monte-Carlo-Durchläufe:", className="mb-3"),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Input(
+                        id="input-simulator-monte-carlo-runs",
+                        type="number",
+                        min=0,
+                        step=1,
+                        value=0,
+                        size="sm",
+                    ),
+                    width=2,
+                ),
+                dbc.Tooltip(
+                    "Wiederholt das Losverfahren mit so vielen Seeds und"
+                    " speichert Zulassungswahrscheinlichkeiten in der"
+                    " Statistik. Die Datenbank wird dabei nicht verändert."
+                    " 0 für eine normale Simulation. Nur bei einer Runde"
+                    " möglich.",
+                    target="input-simulator-monte-carlo-runs",
+                    placement="top",
+                ),
+            ],
+            className="mb-3",
+        ),
+        html.H3("Runden:", className="mb-3"),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Input(
+                        id="input-simulator-rounds",
+                        type="number",
+                        min=1,
+                        step=1,
+                        value=1,
+                        size="sm",
+                    ),
+                    width=2,
+                ),
+                dbc.Tooltip(
+                    "Simuliert mehrere Belegungsrunden nacheinander, ohne die"
+                    " Datenbank zwischendurch neu zu laden. Jede Runde erhält"
+                    " einen eigenen Statistik-Ordner.",
+                    target="input-simulator-rounds",
+                    placement="top",
+                ),
+                dbc.Col(
+                    dbc.Input(
+                        id="input-simulator-disenroll-chance",
+                        type="number",
+                        min=0,
+                        max=1,
+                        step=0.00001,
+                        value=0,
+                        size="sm",
+                    ),
+                    width=2,
+                ),
+                dbc.Tooltip(
+                    "Wahrscheinlichkeit für Selbstabmeldungen zwischen den"
+                    " Runden. 0 für keine Selbstabmeldungen.",
+                    target="input-simulator-disenroll-chance",
+                    placement="top",
+                ),
+            ],
+            className="mb-3",
+        ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Checkbox(
+                        id="checkbox-simulator-dry-run",
+                        label="Testlauf ohne Änderung der Datenbank",
+                        value=False,
+                    ),
+                    width="auto",
+                ),
+                dbc.Tooltip(
+                    "Erstellt alle Statistikdateien, schreibt die Belegungen"
+                    " aber nicht in die Datenbank zurück. Runde und"
+                    " Belegungen der Datenbank bleiben unverändert.",
+                    target="checkbox-simulator-dry-run",
+                    placement="top",
+                ),
+            ],
+            className="mb-3",
+        ),
         html.Hr(),
     ],
 )
@@ -164,8 +252,20 @@ def get_standard_name_from_url(search, pathname):
     Input("button-simulator-start", "n_clicks"),
     Input("url-simulator-process", "search"),
     Input("input-simulator-stat-name", "value"),
+    State("input-simulator-monte-carlo-runs", "value"),
+    State("checkbox-simulator-dry-run", "value"),
+    State("input-simulator-rounds", "value"),
+    State("input-simulator-disenroll-chance", "value"),
 )
-def run_simulation(n_clicks, search, value_stat_name):
+def run_simulation(
+    n_clicks,
+    search,
+    value_stat_name,
+    value_monte_carlo_runs,
+    value_dry_run,
+    value_rounds,
+    value_disenroll_chance,
+):
     """Start simulator algorithm."""
     if (
         n_clicks
@@ -184,14 +284,34 @@ def run_simulation(n_clicks, search, value_stat_name):
             value_stat_name,
         )
 
+        # Multiple rounds are simulated in memory and written once. Stat
+        # folder of the last round keeps the chosen stat name
+        rounds = int(value_rounds or 1)
+        if rounds > 1:
+            simulation_successful = model_rule_sim_pipeline.run_round_pipeline(
+                rule_preselection,
+                list_rule_assignments,
+                database_name,
+                ruleset_name,
+                value_stat_name,
+                rounds,
+                disenroll_probability=float(value_disenroll_chance or 0),
+                dry_run=bool(value_dry_run),
+            )
+
         # Outputs false if rule sim fails
-        if model_rule_sim.rule_simulator(
-            rule_preselection,
-            list_rule_assignments,
-            database_name,
-            ruleset_name,
-            value_stat_name,
-        ):
+        else:
+            simulation_successful = model_rule_sim.rule_simulator(
+                rule_preselection,
+                list_rule_assignments,
+                database_name,
+                ruleset_name,
+                value_stat_name,
+                monte_carlo_runs=int(value_monte_carlo_runs or 0),
+                dry_run=bool(value_dry_run),
+            )
+
+        if simulation_successful:
             return (
                 False,
                 [
@@ -226,6 +346,22 @@ def run_simulation(n_clicks, search, value_stat_name):
     )
 
 
+@callback(
+    Output("input-simulator-monte-carlo-runs", "disabled"),
+    Output("input-simulator-monte-carlo-runs", "value"),
+    Input("input-simulator-rounds", "value"),
+    State("input-simulator-monte-carlo-runs", "value"),
+)
+def disable_monte_carlo_for_multiple_rounds(value_rounds, value_monte_carlo):
+    """Disable monte carlo runs if multiple rounds are simulated, as the
+    round pipeline only simulates single lotteries.
+    """
+    if int(value_rounds or 1) > 1:
+        return True, 0
+
+    return False, value_monte_carlo
+
+
 @callback(
     Output("button-simulator-start", "disabled"),
     Input("button-simulator-start", "n_clicks"),
@@ -244,8 +380,7 @@ def hide_start_button_when_clicked(n_clicks):
 )
 def clear_log(pathname):
     """Clear the log on pageload."""
-    logger.log_stream.truncate(0)
-    logger.log_stream.seek(0)
+    layout_utils.clear_log_stream()
 
     return True
 
@@ -256,14 +391,7 @@ def clear_log(pathname):
 )
 def update_log(_):
     """Update the browser textarea with log data in intervals."""
-    content = logger.log_stream.getvalue()
-    content = content.replace(consts.CONSOLE_GREEN, "")
-    content = content.replace(consts.CONSOLE_BLUE, "")
-    content = content.replace(consts.CONSOLE_RED, "")
-    content = content.replace(consts.CONSOLE_YELLOW, "")
-    content = content.replace(consts.CONSOLE_ENDCMD, "")
-
-    return content
+    return layout_utils.get_log_stream_content()
 
 
 @callback(
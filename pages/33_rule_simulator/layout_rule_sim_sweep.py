@@ -0,0 +1,228 @@
+"""UI layout to simulate and compare multiple rulesets on one database."""
+
+import datetime
+
+import dash
+import dash_bootstrap_components as dbc
+from dash import Input, Output, State, callback, ctx, dcc, html
+
+import utils.constants as consts
+from utils import db_utils, file_utils, layout_utils, rule_utils
+from utils.logger import logger
+
+from . import model_rule_sim_sweep
+
+dash.register_page(
+    __name__,
+    path=consts.PAGE_SIM_SWEEP_URL,
+    title=consts.PAGE_SIM_SWEEP_TITLE_NAME,
+    name=consts.PAGE_SIM_SWEEP_TITLE_NAME,
+)
+
+page_heading = html.Div(
+    [
+        html.H2("Regelwerke vergleichen"),
+        html.P(
+            "Mehrere Regelwerke parallel auf derselben Datenbank simulieren."
+            " Die Datenbank wird dabei nicht verändert, jedes Regelwerk"
+            " erhält einen eigenen Statistik-Ordner.",
+        ),
+        html.Hr(),
+    ],
+)
+
+sweep_selection = html.Div(
+    [
+        html.H3("Datenbank:", className="mb-3"),
+        dbc.Row(
+            dbc.Col(dbc.Select(id="select-sweep-db"), width=4),
+            className="mb-3",
+        ),
+        html.H3("Regelwerke:", className="mb-3"),
+        dbc.Checklist(id="checklist-sweep-rulesets", className="mb-3"),
+        html.H3("Name für Vergleich:", className="mb-3"),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Input(
+                        id="input-sweep-name",
+                        size="sm",
+                    ),
+                    width=4,
+                ),
+                dbc.Tooltip(
+                    "Wird den Namen der Statistik-Ordner vorangestellt und"
+                    " als Name der Zusammenfassung verwendet.",
+                    target="input-sweep-name",
+                    placement="top",
+                ),
+            ],
+            className="mb-3",
+        ),
+        html.Hr(),
+    ],
+)
+
+start_sweep = html.Div(
+    [
+        dbc.Button(
+            [
+                dbc.Spinner(html.Div(id="spinner-sweep-start")),
+                "Vergleich starten",
+            ],
+            color="primary",
+            id="button-sweep-start",
+            size="lg",
+        ),
+    ],
+    className="mb-3",
+)
+
+sweep_result = html.Div(
+    [
+        dcc.Interval(
+            id="interval-sweep",
+            interval=500,
+            n_intervals=0,
+        ),
+        dcc.Textarea(
+            id="log-sweep",
+            style={"width": "100%", "height": "30vh"},
+            disabled=True,
+        ),
+        html.Div(id="div-sweep-summary", className="mt-3"),
+        html.Hr(className="mt-5"),
+    ],
+)
+
+page_navigation = html.Div(
+    [
+        dbc.Stack(
+            [
+                dbc.Button(
+                    "Zurück",
+                    href=consts.PAGE_HOME_URL,
+                    outline=True,
+                    color="primary",
+                    className="me-auto",
+                ),
+                dbc.Button(
+                    "Zum Visualisierungs-Tool",
+                    href=consts.PAGE_VISUALIZER_URL,
+                    color="primary",
+                    className="ms-auto",
+                ),
+            ],
+            direction="horizontal",
+            gap=3,
+            className="mb-5",
+        ),
+    ],
+)
+
+rule_sweep = html.Div(
+    [
+        dcc.Location(id="url-sweep"),
+        page_heading,
+        sweep_selection,
+        start_sweep,
+        sweep_result,
+        page_navigation,
+    ],
+    className="page-container",
+)
+
+layout = dbc.Container(rule_sweep, fluid=False, className="main-container")
+
+
+@callback(
+    Output("select-sweep-db", "options"),
+    Output("checklist-sweep-rulesets", "options"),
+    Output("input-sweep-name", "value"),
+    Input("url-sweep", "pathname"),
+)
+def list_databases_and_rulesets(pathname):
+    """Return available databases and rulesets in filesystem."""
+    list_db = db_utils.get_db_filelist()
+    list_db.insert(0, "")
+
+    return (
+        list_db,
+        rule_utils.get_ruleset_filelist(),
+        f"Vergleich - {datetime.datetime.now().strftime('%Y-%m-%d %H-%M')}",
+    )
+
+
+@callback(
+    Output("div-sweep-summary", "children"),
+    Output("spinner-sweep-start", "children"),
+    Input("button-sweep-start", "n_clicks"),
+    State("select-sweep-db", "value"),
+    State("checklist-sweep-rulesets", "value"),
+    State("input-sweep-name", "value"),
+    prevent_initial_call=True,
+)
+def run_sweep(n_clicks, value_db, value_rulesets, value_sweep_name):
+    """Start ruleset comparison and show its summary."""
+    if not (
+        n_clicks
+        and value_db
+        and value_rulesets
+        and value_sweep_name
+        and ctx.triggered_id == "button-sweep-start"
+    ):
+        return dbc.Alert(
+            "Bitte Datenbank, mindestens ein Regelwerk und einen Namen"
+            " auswählen.",
+            color="warning",
+        ), ""
+
+    value_sweep_name = file_utils.remove_invalid_input_field_characters(
+        value_sweep_name,
+    )
+
+    try:
+        df_summary = model_rule_sim_sweep.run_ruleset_sweep(
+            value_db,
+            value_rulesets,
+            value_sweep_name,
+        )
+
+    except Exception:
+        logger.exception("Vergleich der Regelwerke fehlgeschlagen.")
+        return dbc.Alert(
+            "Vergleich der Regelwerke fehlgeschlagen.",
+            color="danger",
+        ), ""
+
+    # Failed rulesets only have their error, their other cells stay empty
+    df_summary = df_summary.convert_dtypes()
+    df_summary = df_summary.astype(object).where(df_summary.notna(), "")
+
+    return dbc.Table.from_dataframe(
+        df_summary,
+        striped=True,
+        bordered=True,
+        hover=True,
+        size="sm",
+    ), ""
+
+
+@callback(
+    Output("log-sweep", "disabled"),
+    Input("url-sweep", "pathname"),
+)
+def clear_log(pathname):
+    """Clear the log on pageload."""
+    layout_utils.clear_log_stream()
+
+    return True
+
+
+@callback(
+    Output("log-sweep", "value"),
+    Input("interval-sweep", "n_intervals"),
+)
+def update_log(_):
+    """Update the browser textarea with log data in intervals."""
+    return layout_utils.get_log_stream_content()
@@ -18,15 +18,28 @@ from contextlib import closing
 import pandas as pd
 
 import utils.constants as consts
-from utils import db_utils, rule_utils
+from utils import db_utils, profiling_utils, rule_utils
 from utils.logger import logger
 
 from . import (
     model_rule_sim_apply_lecture_combinations,
     model_rule_sim_apply_participant_slots,
     model_rule_sim_apply_rule,
+    model_rule_sim_lottery,
+    model_rule_sim_monte_carlo,
 )
 
+# Assignment columns saved in the status journal. Status, sortierwert and
+# method are compared to find the rows a round changed
+JOURNAL_COLUMNS = [
+    consts.COLUMN_NAME_ASSIGNMENTS_ID,
+    consts.COLUMN_NAME_ASSIGNMENTS_STATUS,
+    consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO,
+    consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_METHOD,
+    consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP,
+]
+JOURNAL_COMPARED_COLUMNS = JOURNAL_COLUMNS[1:4]
+
 
 def check_for_duplicate_ids(df_all_assignments):
     """Safety check to warn if duplicates are created.
@@ -51,36 +64,198 @@ def check_for_duplicate_ids(df_all_assignments):
         )
 
 
+def get_status_journal_rows(
+    df_all_assignments,
+    df_previous_assignments,
+    current_round,
+):
+    """Return status journal rows of all assignments a round changed or
+    added, holding their values from before the round.
+
+    df_previous_assignments: journaled columns of the assignments table
+    before the round, see consts.TABLE_NAME_STATUS_JOURNAL.
+    """
+    df_merged = df_all_assignments[JOURNAL_COLUMNS].merge(
+        df_previous_assignments,
+        on=consts.COLUMN_NAME_ASSIGNMENTS_ID,
+        how="left",
+        suffixes=("", "_previous"),
+        indicator=True,
+    )
+    new_rows = (df_merged["_merge"] == "left_only").to_numpy()
+
+    changed_rows = new_rows.copy()
+    for column in JOURNAL_COMPARED_COLUMNS:
+        values = df_merged[column].astype(object)
+        previous_values = df_merged[f"{column}_previous"].astype(object)
+        values_missing = values.isna().to_numpy()
+        previous_values_missing = previous_values.isna().to_numpy()
+
+        # Missing values on both sides count as unchanged
+        values_equal = (values_missing & previous_values_missing) | (
+            ~values_missing
+            & ~previous_values_missing
+            & (
+                values.where(~values_missing, "")
+                == previous_values.where(~previous_values_missing, "")
+            ).to_numpy()
+        )
+        changed_rows |= ~values_equal
+
+    df_changed = df_merged.loc[changed_rows]
+    previous_columns = [f"{column}_previous" for column in JOURNAL_COLUMNS[1:]]
+    df_previous_values = (
+        df_changed[previous_columns]
+        .astype(object)
+        .where(df_changed[previous_columns].notna(), None)
+    )
+
+    return [
+        (
+            current_round,
+            assignment_id,
+            int(new_row),
+            *previous_values,
+        )
+        for assignment_id, new_row, previous_values in zip(
+            df_changed[consts.COLUMN_NAME_ASSIGNMENTS_ID].tolist(),
+            new_rows[changed_rows].tolist(),
+            df_previous_values.itertuples(index=False, name=None),
+        )
+    ]
+
+
+def write_status_journal_rounds(journal_rounds: list, conn):
+    """Write journaled rounds with their journal rows to the status journal.
+
+    journal_rounds: list of tuples of round, previous round and the journal
+    rows of the round, see get_status_journal_rows().
+    Returns the number of journaled rows.
+    """
+    db_utils.create_status_journal_table(conn)
+    cursor = conn.cursor()
+
+    row_count = 0
+    for journaled_round, previous_round, journal_rows in journal_rounds:
+        # Entries of a round that was already rolled back and simulated
+        # again
+        for table in (
+            consts.TABLE_NAME_STATUS_JOURNAL,
+            consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS,
+        ):
+            cursor.execute(
+                f"DELETE FROM {table}"
+                f" WHERE {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} = ?",
+                (journaled_round,),
+            )
+
+        cursor.execute(
+            f"INSERT INTO {consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS}"
+            " VALUES (?, ?)",
+            (journaled_round, previous_round),
+        )
+        cursor.executemany(
+            f"INSERT INTO {consts.TABLE_NAME_STATUS_JOURNAL} ("
+            f"{consts.COLUMN_NAME_STATUS_JOURNAL_ROUND},"
+            f" {consts.COLUMN_NAME_ASSIGNMENTS_ID},"
+            f" {consts.COLUMN_NAME_STATUS_JOURNAL_NEW_ROW},"
+            f" {', '.join(JOURNAL_COLUMNS[1:])})"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            journal_rows,
+        )
+        row_count += len(journal_rows)
+
+    return row_count
+
+
+def write_status_journal(df_all_assignments, current_round, conn):
+    """Write the values of all assignments the round is about to change to
+    the status journal, so the round can be rolled back.
+
+    Must be called before the assignments table gets replaced. Returns the
+    number of journaled rows.
+    """
+    db_utils.create_status_journal_table(conn)
+    previous_round = db_utils.get_assignment_round(conn)
+
+    df_previous_assignments = pd.read_sql_query(
+        f"SELECT {', '.join(JOURNAL_COLUMNS)}"
+        f" FROM {consts.TABLE_NAME_ASSIGNMENTS}",
+        conn,
+    )
+    journal_rows = get_status_journal_rows(
+        df_all_assignments,
+        df_previous_assignments,
+        current_round,
+    )
+
+    return write_status_journal_rounds(
+        [(current_round, previous_round, journal_rows)],
+        conn,
+    )
+
+
 def write_assignments_back_to_db(
     df_all_assignments,
     current_round,
     database_path,
+    journal_rounds=None,
 ):
-    """Write assignments table with applied set of rules back to db."""
+    """Write assignments table with applied set of rules back to db.
+
+    Values of changed rows get journaled first, see write_status_journal().
+    journal_rounds: journal of rounds simulated in memory, journaled instead
+    of comparing against the database, see write_status_journal_rounds().
+    """
     logger.info("Schreibe veränderte Zeilen zurück in die Datenbank...")
     try:
         with closing(sqlite3.connect(database_path)) as conn:
-            cursor = conn.cursor()
-
-            # Delete every row from assignments table, then append new
-            # assignments table dataframe rows.
-            # Doesn't replace the whole table! Or else FKs, datatypes and
-            # other table info get deleted.
-            cursor.execute(f"DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}")
-
-            # Add all rules to assignment table, use append to not overwrite
-            # fk relations
-            df_all_assignments.to_sql(
-                consts.TABLE_NAME_ASSIGNMENTS,
-                conn,
-                if_exists="append",
-                index=False,
-            )
-
-            conn.commit()
-
-            db_utils.write_new_round_counter_and_timestamp(current_round, conn)
-            db_utils.vacuum_db(conn)
+            with profiling_utils.measure_stage(
+                "Statusjournal",
+                rows_in=len(df_all_assignments.index),
+            ) as stage:
+                if journal_rounds is None:
+                    stage["rows_out"] = write_status_journal(
+                        df_all_assignments,
+                        current_round,
+                        conn,
+                    )
+                else:
+                    stage["rows_out"] = write_status_journal_rounds(
+                        journal_rounds,
+                        conn,
+                    )
+
+            with profiling_utils.measure_stage(
+                "Zurückschreiben",
+                rows_in=len(df_all_assignments.index),
+            ):
+                cursor = conn.cursor()
+
+                # Delete every row from assignments table, then append new
+                # assignments table dataframe rows.
+                # Doesn't replace the whole table! Or else FKs, datatypes and
+                # other table info get deleted.
+                cursor.execute(f"DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}")
+
+                # Add all rules to assignment table, use append to not
+                # overwrite fk relations
+                df_all_assignments.to_sql(
+                    consts.TABLE_NAME_ASSIGNMENTS,
+                    conn,
+                    if_exists="append",
+                    index=False,
+                )
+
+                conn.commit()
+
+                db_utils.write_new_round_counter_and_timestamp(
+                    current_round,
+                    conn,
+                )
+
+            with profiling_utils.measure_stage("VACUUM"):
+                db_utils.vacuum_db(conn)
 
     except Exception:
         logger.error(
@@ -90,78 +265,73 @@ def write_assignments_back_to_db(
         raise
 
 
-def rule_simulator(
+def apply_rules_to_assignments(
+    df_all_assignments,
     rule_preselection,
     list_rule_assignments,
+    system_method,
     database_name,
-    ruleset_name,
-    stat_folder_name,
+    side_tables: dict = None,
+    data_version=None,
 ):
-    """Apply rules to assignment table.
-
-    Main function used for this task.
+    """Apply preselection and assignment rules to a copy of the assignment
+    table.
+
+    Returns the rule applied assignments of the current semester and
+    preselection with _pk_id as index, ready for the slot distribution.
+    side_tables: tables merged for rules, shared between all rules, see
+    model_rule_sim_apply_rule.load_and_merge_tables().
+    data_version: state of the database the assignments were loaded from,
+    see db_utils.get_db_data_version(). Rule results are cached per data
+    version, None disables the cache.
     """
-    logger.info("Starte Regelanwendung...")
-
-    # Get the current round from internal db table
-    database_path = db_utils.get_db_path(database_name, True)
-    with closing(sqlite3.connect(database_path)) as conn:
-        current_round = db_utils.get_assignment_round(conn)
-
-    # Begin new round and add method db message
-    current_round += 1
-    system_method = f"Sim Runde {current_round}"
-
-    logger.info(f"Aktuelle Runde: {current_round}")
-
-    # Initial DF based on starting table. Need to load the complete assignments
-    # table because it will be dropped before writing back the modified df.
-    # Pandas can't update an sql table with the same indices easily, so
-    # sacrifice speed for utility
-    logger.info("Lade komplette Belegungstabelle...")
-    df_assignment_buffer = db_utils.get_df(
-        database_name,
-        consts.TABLE_NAME_ASSIGNMENTS,
-    )
+    if side_tables is None:
+        side_tables = {}
 
-    # Keep copy of df_all_assignments for later comparisons
-    df_all_assignments = df_assignment_buffer.copy()
+    df_assignment_buffer = df_all_assignments.copy()
 
     # Marks order of applied rules for tracking
     rule_application_order_info = 0
 
     logger.info("Wende Vorselektion an...")
 
-    # Preselection of the current semester
-    rule_semester = consts.RULE(
-        "belegungen",
-        "semester",
-        "==",
-        None,
-        consts.RULE_SETTING_CURRENT_SEMESTER,
-    )
-    df_assignment_buffer = rule_utils.apply_rule_to_df(
-        df_assignment_buffer,
-        rule_semester.column_x,
-        rule_semester.operator_symbol,
-        rule_semester.table_y,
-        rule_semester.column_y,
-    )
-
-    # Preselection to only use specified rows for rule appliance
-    if rule_preselection is not None:
-        rule_preselection = rule_utils.check_and_transform_rule(
-            rule_preselection, add_suffix=True
+    with profiling_utils.measure_stage(
+        "Vorselektion",
+        rows_in=len(df_assignment_buffer.index),
+    ) as stage:
+        # Preselection of the current semester
+        rule_semester = consts.RULE(
+            "belegungen",
+            "semester",
+            "==",
+            None,
+            consts.RULE_SETTING_CURRENT_SEMESTER,
         )
-        
-        df_assignment_buffer = (
-            model_rule_sim_apply_rule.apply_preselection_rule(
-                df_assignment_buffer,
-                rule_preselection,
-                database_name,
-            )
+        df_assignment_buffer = rule_utils.apply_rule_to_df(
+            df_assignment_buffer,
+            rule_semester.column_x,
+            rule_semester.operator_symbol,
+            rule_semester.table_y,
+            rule_semester.column_y,
         )
 
+        # Preselection to only use specified rows for rule appliance
+        if rule_preselection is not None:
+            rule_preselection = rule_utils.check_and_transform_rule(
+                rule_preselection, add_suffix=True
+            )
+
+            df_assignment_buffer = (
+                model_rule_sim_apply_rule.apply_preselection_rule(
+                    df_assignment_buffer,
+                    rule_preselection,
+                    database_name,
+                    side_tables,
+                )
+            )
+
+        stage["rows_out"] = len(df_assignment_buffer.index)
+
     # Loop through rules, always increasing order info per rule
     for rule in list_rule_assignments:
         rule_application_order_info += 1
@@ -181,28 +351,49 @@ def rule_simulator(
             f" {consts.CONSOLE_ENDCMD}",
         )
 
+        rule_cache_key = model_rule_sim_apply_rule.get_rule_cache_key(
+            data_version,
+            rule_preselection,
+            rule_assignment,
+            rule_join_operation,
+            rule_assignment_2,
+        )
+
         # Apply rule, then reassign modified start table. Every apply rule
         # call works on the same start table.
         # The modifed df_assignment_buffer is returned in full,
         # df_changed_assignments are returned as a set of rows that have had
         # their status altered this rule.
-        (
-            df_assignment_buffer,
-            df_changed_assignments,
-        ) = model_rule_sim_apply_rule.apply_assignment_rule(
-            df_assignment_buffer,
-            rule_assignment,
-            rule_join_operation,
-            rule_assignment_2,
-            system_method,
-            rule_application_order_info,
-            database_name,
-        )
+        with profiling_utils.measure_stage(
+            f"Regel {rule_application_order_info}: {rule_name}",
+            rows_in=len(df_assignment_buffer.index),
+        ) as stage:
+            (
+                df_assignment_buffer,
+                df_changed_assignments,
+            ) = model_rule_sim_apply_rule.apply_assignment_rule(
+                df_assignment_buffer,
+                rule_assignment,
+                rule_join_operation,
+                rule_assignment_2,
+                system_method,
+                rule_application_order_info,
+                database_name,
+                side_tables,
+                rule_cache_key,
+            )
+            stage["rows_out"] = len(
+                df_changed_assignments.loc[
+                    df_changed_assignments[
+                        consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+                    ]
+                    == consts.RULE_SETTING_STATUS_PROPOSED
+                ].index,
+            )
 
         logger.info(
             "Anzahl der Zeilen mit Regelübereinstimmung und neuem"
-            " vorläufigen Zulassungs-Status:"
-            f" {len(df_changed_assignments.loc[df_changed_assignments[consts.COLUMN_NAME_ASSIGNMENTS_STATUS] == consts.RULE_SETTING_STATUS_PROPOSED].index)}",
+            f" vorläufigen Zulassungs-Status: {stage['rows_out']}",
         )
 
     # Set assignment _pk_id as index, removing it's column
@@ -210,24 +401,164 @@ def rule_simulator(
         consts.COLUMN_NAME_ASSIGNMENTS_ID,
         inplace=True,
     )
-    df_all_assignments.set_index(
+
+    return df_assignment_buffer
+
+
+def load_simulation_data(database_name, preload_side_tables=False):
+    """Load all data a simulation reads from the database.
+
+    Returned dict can be reused for multiple dry run simulations on the same
+    database, so the database only needs to be read once. Side tables get
+    loaded on demand by the rules if not preloaded.
+    """
+    database_path = db_utils.get_db_path(database_name, True)
+    with closing(sqlite3.connect(database_path)) as conn:
+        current_round = db_utils.get_assignment_round(conn)
+    data_version = db_utils.get_db_data_version(database_name)
+
+    # Initial DF based on starting table. Need to load the complete assignments
+    # table because it will be dropped before writing back the modified df.
+    # Pandas can't update an sql table with the same indices easily, so
+    # sacrifice speed for utility
+    logger.info("Lade komplette Belegungstabelle...")
+    with profiling_utils.measure_stage("Laden der Belegungstabelle") as stage:
+        df_all_assignments = db_utils.get_df(
+            database_name,
+            consts.TABLE_NAME_ASSIGNMENTS,
+        )
+        stage["rows_out"] = len(df_all_assignments.index)
+
+    with profiling_utils.measure_stage("Laden der Zusatztabellen"):
+        if preload_side_tables:
+            logger.info("Lade verknüpfbare Tabellen...")
+            side_tables = model_rule_sim_apply_rule.load_side_tables(
+                database_name,
+            )
+        else:
+            side_tables = {}
+
+        max_participants_lookup = (
+            model_rule_sim_apply_participant_slots.get_max_participants_lookup(
+                database_name,
+            )
+        )
+
+    return {
+        "current_round": current_round,
+        "data_version": data_version,
+        "assignments": df_all_assignments,
+        "side_tables": side_tables,
+        "max_participants_lookup": max_participants_lookup,
+    }
+
+
+def simulate_round(
+    rule_preselection,
+    list_rule_assignments,
+    database_name,
+    simulation_data,
+    lottery_mode=None,
+    lottery_seed=None,
+    monte_carlo_runs=0,
+):
+    """Simulate one assignment round in memory.
+
+    Neither the database nor simulation_data are modified. Returns a dict
+    with the round number, lottery info, the complete assignment table after
+    this round and the dataframes needed for the stat files.
+    """
+    # Begin new round and add method db message
+    current_round = simulation_data["current_round"] + 1
+    system_method = f"Sim Runde {current_round}"
+
+    logger.info(f"Aktuelle Runde: {current_round}")
+
+    df_all_assignments = simulation_data["assignments"]
+
+    df_assignment_buffer = apply_rules_to_assignments(
+        df_all_assignments,
+        rule_preselection,
+        list_rule_assignments,
+        system_method,
+        database_name,
+        simulation_data["side_tables"],
+        simulation_data["data_version"],
+    )
+
+    # Returns a new df, shared simulation data stays untouched
+    df_all_assignments = df_all_assignments.set_index(
         consts.COLUMN_NAME_ASSIGNMENTS_ID,
-        inplace=True,
     )
 
+    # Lottery numbers decide on rule chunks that only partially fit into
+    # a group. Seeded lots are only kept in memory and never written to db.
+    # Monte carlo runs always need a seeded lottery
+    if monte_carlo_runs:
+        lottery_mode = model_rule_sim_lottery.LOTTERY_MODE_SEEDED
+    elif lottery_mode is None:
+        lottery_mode = consts.RULE_SETTING_LOTTERY_MODE
+    if lottery_mode == model_rule_sim_lottery.LOTTERY_MODE_SEEDED:
+        lottery_seed = model_rule_sim_lottery.get_lottery_seed(lottery_seed)
+    else:
+        lottery_seed = None
+    with profiling_utils.measure_stage(
+        "Losverfahren",
+        rows_in=len(df_assignment_buffer.index),
+    ):
+        lottery_numbers = model_rule_sim_lottery.get_lottery_numbers(
+            df_assignment_buffer,
+            lottery_mode,
+            lottery_seed,
+        )
+
+    rule_count = len(list_rule_assignments)
+    max_participants_lookup = simulation_data["max_participants_lookup"]
+
+    # Repeat slot distribution on copies of the buffer before the buffer
+    # itself gets its slots distributed
+    monte_carlo_results = None
+    if monte_carlo_runs:
+        with profiling_utils.measure_stage(
+            "Monte-Carlo-Losverfahren",
+            rows_in=len(df_assignment_buffer.index),
+        ) as stage:
+            monte_carlo_results = (
+                model_rule_sim_monte_carlo.run_monte_carlo_lottery(
+                    df_assignment_buffer,
+                    database_name,
+                    rule_count,
+                    monte_carlo_runs,
+                    lottery_seed,
+                    max_participants_lookup,
+                )
+            )
+            stage["rows_out"] = len(monte_carlo_results[0].index)
+
     # Distribute lecture slots
     logger.info("Berechne zulässige Belegungsplätze und schreibe ein...")
-    rule_count = len(list_rule_assignments)
-    (
-        df_assignment_buffer,
-        df_accepted_assignments,
-        df_denied_assignments,
-    ) = model_rule_sim_apply_participant_slots.apply_participant_slots(
-        df_assignment_buffer,
-        database_name,
-        rule_count,
-        consts.RULE_SETTING_LOGGING_PER_LECTURE,
-    )
+    with profiling_utils.measure_stage(
+        "Platzvergabe",
+        rows_in=int(
+            (
+                df_assignment_buffer[consts.COLUMN_NAME_ASSIGNMENTS_STATUS]
+                == consts.RULE_SETTING_STATUS_PROPOSED
+            ).sum(),
+        ),
+    ) as stage:
+        (
+            df_assignment_buffer,
+            df_accepted_assignments,
+            df_denied_assignments,
+        ) = model_rule_sim_apply_participant_slots.apply_participant_slots(
+            df_assignment_buffer,
+            database_name,
+            rule_count,
+            consts.RULE_SETTING_LOGGING_PER_LECTURE,
+            lottery_numbers,
+            max_participants_lookup,
+        )
+        stage["rows_out"] = len(df_accepted_assignments.index)
     logger.info(
         f"Eingeschrieben mit Zulassung: '{len(df_accepted_assignments)}',"
         f" mit Ablehnung: '{len(df_denied_assignments)}'",
@@ -248,14 +579,19 @@ def rule_simulator(
         "Überprüfe ob Kombo-Einschreibungen getätigt werden sollen und wendet"
         " diese an...",
     )
-    (
-        df_all_assignments,
-        df_accepted_lecture_combinations,
-    ) = model_rule_sim_apply_lecture_combinations.apply_lecture_combinations(
-        df_all_assignments,
-        df_accepted_assignments,
-        database_name,
-    )
+    with profiling_utils.measure_stage(
+        "Kombo-Einschreibungen",
+        rows_in=len(df_accepted_assignments.index),
+    ) as stage:
+        (
+            df_all_assignments,
+            df_accepted_lecture_combinations,
+        ) = model_rule_sim_apply_lecture_combinations.apply_lecture_combinations(
+            df_all_assignments,
+            df_accepted_assignments,
+            database_name,
+        )
+        stage["rows_out"] = len(df_accepted_lecture_combinations.index)
 
     # Get back "_pk_id" column from index. Stat files can keep _pk_id as
     # dataframe index, no need to write back as column
@@ -265,24 +601,140 @@ def rule_simulator(
 
     check_for_duplicate_ids(df_all_assignments)
 
-    write_assignments_back_to_db(
-        df_all_assignments,
-        current_round,
-        database_path,
-    )
-
+    return {
+        "current_round": current_round,
+        "lottery_mode": lottery_mode,
+        "lottery_seed": lottery_seed,
+        "all_assignments": df_all_assignments,
+        "accepted_assignments": df_accepted_assignments,
+        "denied_assignments": df_denied_assignments,
+        "accepted_lecture_combinations": df_accepted_lecture_combinations,
+        "assignments": df_assignment_buffer,
+        "monte_carlo_results": monte_carlo_results,
+    }
+
+
+def write_round_stat_files(
+    round_result,
+    database_name,
+    ruleset_name,
+    stat_folder_name,
+    additional_stat_info: dict = None,
+):
+    """Write the stat files of a simulated round, see simulate_round()."""
     logger.info("Schreibe Statistik Dateien...")
 
-    rule_utils.write_stat_files(
-        database_name,
-        ruleset_name,
+    stat_info = {
+        "lottery_mode": round_result["lottery_mode"],
+        "lottery_seed": round_result["lottery_seed"],
+    }
+    if additional_stat_info:
+        stat_info.update(additional_stat_info)
+
+    with profiling_utils.measure_stage(
+        "Statistik Dateien",
+        rows_in=len(round_result["assignments"].index),
+    ):
+        rule_utils.write_stat_files(
+            database_name,
+            ruleset_name,
+            stat_folder_name,
+            round_result["current_round"],
+            consts.RULE_SETTING_CURRENT_SEMESTER,
+            round_result["accepted_assignments"],
+            round_result["denied_assignments"],
+            round_result["accepted_lecture_combinations"],
+            round_result["assignments"],
+            additional_stat_info=stat_info,
+        )
+
+        if round_result["monte_carlo_results"] is not None:
+            model_rule_sim_monte_carlo.write_monte_carlo_stat_files(
+                stat_folder_name,
+                *round_result["monte_carlo_results"],
+            )
+
+
+@profiling_utils.profile_run("simulation")
+def rule_simulator(
+    rule_preselection,
+    list_rule_assignments,
+    database_name,
+    ruleset_name,
+    stat_folder_name,
+    lottery_mode=None,
+    lottery_seed=None,
+    monte_carlo_runs=0,
+    dry_run=False,
+    simulation_data=None,
+):
+    """Apply rules to assignment table.
+
+    Main function used for this task.
+    Lottery mode and seed default to the settings file, see
+    model_rule_sim_lottery for details.
+
+    If monte_carlo_runs is set, rules are evaluated once and the slot
+    distribution is repeated for that many seeded lotteries. Acceptance
+    probabilities are written to the stat folder and the database is left
+    untouched, see model_rule_sim_monte_carlo.
+
+    A dry run produces the full stat folder without writing back to the
+    database, so the round counter and assignments stay unchanged. No copy of
+    the database is needed to try out a ruleset.
+
+    simulation_data: already loaded database content, see
+    load_simulation_data(). Is not modified, so it can be shared by multiple
+    dry runs.
+    """
+    logger.info("Starte Regelanwendung...")
+
+    database_path = db_utils.get_db_path(database_name, True)
+
+    # Duration, memory and row counts of every stage get saved to the stat
+    # info file
+    with profiling_utils.collect_stage_profile() as stage_profile:
+        if simulation_data is None:
+            simulation_data = load_simulation_data(database_name)
+
+        round_result = simulate_round(
+            rule_preselection,
+            list_rule_assignments,
+            database_name,
+            simulation_data,
+            lottery_mode,
+            lottery_seed,
+            monte_carlo_runs,
+        )
+
+        # Monte carlo results don't represent a single round, never write
+        # them
+        if monte_carlo_runs:
+            dry_run = True
+
+        if dry_run:
+            logger.info("Testlauf: Datenbank wird nicht verändert.")
+        else:
+            write_assignments_back_to_db(
+                round_result["all_assignments"],
+                round_result["current_round"],
+                database_path,
+            )
+
+        write_round_stat_files(
+            round_result,
+            database_name,
+            ruleset_name,
+            stat_folder_name,
+            additional_stat_info={
+                "monte_carlo_runs": monte_carlo_runs,
+                "dry_run": dry_run,
+            },
+        )
+
+    rule_utils.update_stat_info(
         stat_folder_name,
-        current_round,
-        consts.RULE_SETTING_CURRENT_SEMESTER,
-        df_accepted_assignments,
-        df_denied_assignments,
-        df_accepted_lecture_combinations,
-        df_assignment_buffer,
+        {"stage_profile": stage_profile},
     )
 
     logger.info(
@@ -291,4 +743,3 @@ def rule_simulator(
     )
 
     return True
-
@@ -9,52 +9,59 @@ import utils.constants as consts
 from utils import db_utils, rule_utils
 from utils.logger import logger
 
+from . import model_rule_sim_lottery
 
-def get_max_participants_for_lecture(lecture_id, group_id, conn):
-    """Return the available slots for a given lecture."""
-    cursor = conn.cursor()
 
-    if pd.isna(group_id):
+def get_max_participants_lookup(database_name):
+    """Return the available slots for every lecture and group combination.
+
+    All slots are loaded with one query, so the slot distribution doesn't need
+    to query the db per lecture group. Keys are (lecture id, group id) tuples,
+    group id is None for lectures without groups. Only the first entry per
+    combination is used.
+    """
+    database_path = db_utils.get_db_path(database_name, True)
+    with closing(sqlite3.connect(database_path)) as conn:
+        cursor = conn.cursor()
         cursor.execute(
             """
             SELECT v._pk_id, vg.gruppen_id, vg.max_teilnehmer
             FROM veranstaltung AS v
             JOIN veranstaltung_gruppengroesse AS vg
             ON v._pk_id = vg.veranstaltungs_id
-            WHERE v._pk_id = ?
-                AND vg.gruppen_id IS NULL
             """,
-            (lecture_id,),
         )
+        rows = cursor.fetchall()
 
-    else:
-        cursor.execute(
-            """
-            SELECT v._pk_id, vg.gruppen_id, vg.max_teilnehmer
-            FROM veranstaltung AS v
-            JOIN veranstaltung_gruppengroesse AS vg
-            ON v._pk_id = vg.veranstaltungs_id
-            WHERE v._pk_id = ?
-                AND vg.gruppen_id = ?
-            """,
-            (
-                lecture_id,
-                group_id,
-            ),
+    max_participants_lookup = {}
+    for lecture_id, group_id, max_participants in rows:
+        max_participants_lookup.setdefault(
+            (lecture_id, group_id),
+            max_participants,
         )
 
-    result = cursor.fetchall()
+    return max_participants_lookup
+
 
-    if result:
-        row = result[0]
-        return {
-            "_pk_id": row[0],
-            "gruppen_id": row[1],
-            "max_teilnehmer": row[2],
-        }
+def get_max_participants_for_lecture(
+    lecture_id,
+    group_id,
+    max_participants_lookup,
+):
+    """Return the available slots for a given lecture group.
 
+    Use standard setting if no slots are found.
+    """
+    if pd.isna(group_id):
+        group_id = None
     else:
-        return None
+        group_id = int(group_id)
+
+    max_participants = max_participants_lookup.get((lecture_id, group_id))
+    if max_participants is None:
+        return consts.RULE_SETTING_FALLBACK_PARTICIPANT_SIZE
+
+    return max_participants
 
 
 def apply_participant_slots(
@@ -62,13 +69,23 @@ def apply_participant_slots(
     database_name,
     rule_count,
     logging_per_lecture,
+    lottery_numbers,
+    max_participants_lookup=None,
 ):
     """Assign proposed assignments to lectures.
 
     Rule groups that are below the max participant threshold get their status
     set to accepted. Rule groups that partially fit into the slots use the
     lottery to assign remaining slots. Rest is denied.
+
+    lottery_numbers: series of lots with assignment ids as index, see
+    model_rule_sim_lottery.get_lottery_numbers()
+    max_participants_lookup: slots per lecture group, loaded from db if None.
+    Can be passed in when slots are distributed multiple times.
     """
+    if max_participants_lookup is None:
+        max_participants_lookup = get_max_participants_lookup(database_name)
+
     # Get all lecture + group id combinations and iterate through them
     lectures = df_assignment_buffer.drop_duplicates(
         subset=["veranstaltungs_id"],
@@ -147,29 +164,11 @@ def apply_participant_slots(
         for prio in range(1, 3):
             for group in groups:
                 # Check max participants, if not found use standard setting
-                max_participants = (
-                    consts.RULE_SETTING_FALLBACK_PARTICIPANT_SIZE
+                max_participants = get_max_participants_for_lecture(
+                    int(lecture[consts.COLUMN_NAME_ASSIGNMENTS_LECTURE_ID]),
+                    group,
+                    max_participants_lookup,
                 )
-                database_path = db_utils.get_db_path(database_name, True)
-                with closing(sqlite3.connect(database_path)) as conn:
-                    result = get_max_participants_for_lecture(
-                        int(
-                            lecture[consts.COLUMN_NAME_ASSIGNMENTS_LECTURE_ID],
-                        ),
-                        group,
-                        conn,
-                    )
-
-                    if (
-                        result is not None
-                        and result["max_teilnehmer"] is not None
-                    ):
-                        max_participants = result["max_teilnehmer"]
-
-                    elif result is None:
-                        max_participants = (
-                            consts.RULE_SETTING_FALLBACK_PARTICIPANT_SIZE
-                        )
 
                 # Select only currently used group id from buffer
                 if pd.isna(group):
@@ -234,10 +233,13 @@ def apply_participant_slots(
                         slots_free = max_participants - participants
                         if slots_free < 0:
                             slots_free = 0
-                        df_current_rule_accepted = df_current_rule.sort_values(
-                            "los_nummer",
-                            ascending=False,
-                        ).head(slots_free)
+                        df_current_rule_accepted = (
+                            model_rule_sim_lottery.pick_lottery_winners(
+                                df_current_rule,
+                                slots_free,
+                                lottery_numbers,
+                            )
+                        )
 
                         # Add to accepted list
                         df_accepted_assignments_list.append(
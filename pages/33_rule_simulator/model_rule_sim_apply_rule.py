@@ -4,14 +4,30 @@ import datetime
 import sqlite3
 from contextlib import closing
 
+import numpy as np
 import pandas as pd
 
 import utils.constants as consts
-from utils import db_utils, file_utils, rule_utils
+from utils import cache_utils, db_utils, file_utils, rule_utils
 from utils.logger import logger
 
 from . import model_rule_sim_custom_patches
 
+# Assignment columns that get changed while applying rules. Rules on them
+# depend on previous rules and are never cached
+RULE_CACHE_EXCLUDED_COLUMNS = [
+    consts.COLUMN_NAME_ASSIGNMENTS_STATUS,
+    consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO,
+    consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_MESSAGE,
+    consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_METHOD,
+    consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP,
+]
+
+# Ids of assignments matching a rule, kept while the app is running so
+# unchanged rules don't need to be evaluated again after a rule edit
+rule_cache = cache_utils.LRUCache(
+    max_entries=consts.RULE_SETTING_RULE_CACHE_MAX_ENTRIES,
+)
 
 # Used as base: https://en.wikipedia.org/wiki/Breadth-first_search (last accessed 12.04.2024)
 def find_path(start, goals, fk_relations):
@@ -66,15 +82,74 @@ def find_path(start, goals, fk_relations):
     return list(paths_to_goals.values())
 
 
+def get_side_table(table: str, side_tables: dict, base_db_structure, conn):
+    """Return a table that can be merged onto the assignment table.
+
+    Tables are loaded once with custom patches applied and their columns
+    suffixed by table name, then kept in side_tables for further rules.
+    """
+    if table not in side_tables:
+        dtypes = db_utils.get_dtypes(base_db_structure, table)
+        df = model_rule_sim_custom_patches.run_custom_rule_patches(
+            table,
+            dtypes,
+            conn,
+        )
+
+        # Rename column names to make them unique
+        df.columns = [
+            f"{col}__{table}" if f"__{table}" not in col else col
+            for col in df.columns
+        ]
+        side_tables[table] = df
+
+    return side_tables[table]
+
+
+def load_side_tables(database_name: str):
+    """Load every table that can be merged onto the assignment table.
+
+    Used when multiple simulations run on the same database, so tables only
+    need to be read once, see load_and_merge_tables().
+    """
+    side_tables = {}
+
+    base_db_structure = file_utils.read_json(
+        consts.FOLDER_UTILS,
+        consts.FILENAME_BASE_DB_STRUCTURE,
+    )
+
+    database_path = db_utils.get_db_path(database_name, True)
+    with closing(sqlite3.connect(database_path)) as conn:
+        fk_relations = db_utils.get_foreign_key_relations(conn)
+        for relation in fk_relations:
+            if relation[2] != consts.TABLE_NAME_ASSIGNMENTS:
+                get_side_table(
+                    relation[2],
+                    side_tables,
+                    base_db_structure,
+                    conn,
+                )
+
+    return side_tables
+
+
 def load_and_merge_tables(
     df_assignment_buffer,
     rule_assignment,
     rule_assignment_2,
     database_name: str,
+    side_tables: dict = None,
 ):
     """Merge multiple Dataframes as left join depending on a path of their
     database foreign keys.
+
+    side_tables: already loaded tables by table name, see get_side_table().
+    Missing tables get loaded from db and added to it.
     """
+    if side_tables is None:
+        side_tables = {}
+
     # Copy start table so original start table stays untouched.
     # Start table could be returned for later updating of changed lines and
     # writing back to db
@@ -137,20 +212,14 @@ def load_and_merge_tables(
             for relation in path:
                 table1, fk1, table2, fk2 = relation
                 if table2 not in processed_tables:
-                    # Get tables from db as df
-                    dtypes = db_utils.get_dtypes(base_db_structure, table2)
-                    df = model_rule_sim_custom_patches.run_custom_rule_patches(
+                    # Get tables from db as df, column names are made unique
+                    df = get_side_table(
                         table2,
-                        dtypes,
+                        side_tables,
+                        base_db_structure,
                         conn,
                     )
 
-                    # Rename column names to make them unique
-                    df.columns = [
-                        f"{col}__{table2}" if f"__{table2}" not in col else col
-                        for col in df.columns
-                    ]
-                    
                     # Check to warn for righthandise merge overflow
                     row_amount_lefthandside = len(df_merge)
 
@@ -196,23 +265,14 @@ def cleanup_assignment_df(df):
     return df
 
 
-def join_assignment_dfs(df_rule_applied, df_rule_applied_2, operation):
-    """Join two dataframes together using a union operator."""
-    # Prepare for DF combination, add suffix to avoid crashing columns with the
-    # same name together
-    suffix = "_df_rule_applied_2"
-
-    df_rule_applied_2 = df_rule_applied_2.add_suffix(suffix)
-
-    # Actual join happens here
+def join_matching_ids(matching_ids, matching_ids_2, operation):
+    """Join two sorted arrays of assignment ids using a set operator."""
     if operation == "AND":
-        result_df = df_rule_applied.join(df_rule_applied_2, how="inner")
+        return np.intersect1d(matching_ids, matching_ids_2, assume_unique=True)
     elif operation == "OR":
-        result_df = df_rule_applied.join(df_rule_applied_2, how="outer")
+        return np.union1d(matching_ids, matching_ids_2)
     elif operation == "NOT":
-        result_df = df_rule_applied[
-            ~df_rule_applied.index.isin(df_rule_applied_2.index)
-        ]
+        return np.setdiff1d(matching_ids, matching_ids_2, assume_unique=True)
     else:
         # Rules should always be prepared as a bundle, which checks the
         # validity of operation. raise just for safety
@@ -221,22 +281,12 @@ def join_assignment_dfs(df_rule_applied, df_rule_applied_2, operation):
             f" Operatorion muss in '{consts.JOIN_OPERATORS}' sein.",
         )
 
-    # Remove identical duplicated rows that were created by join operation
-    result_df = result_df.drop_duplicates(keep="first")
-
-    for col in df_rule_applied.columns:
-        # Move values from right side with suffix to left side without suffix
-        result_df.update({col: result_df[col + suffix]})
-        # Delete these columns to get old df structure back
-        result_df = result_df.drop(columns=[col + suffix])
-
-    return result_df
-
 
 def apply_preselection_rule(
     df_assignment_buffer,
     rule_preselection,
     database_name: str,
+    side_tables: dict = None,
 ):
     """Apply a rule for preselecting assignment table items.
 
@@ -249,6 +299,7 @@ def apply_preselection_rule(
         rule_preselection,
         None,
         database_name,
+        side_tables,
     )
 
     # Apply preselection
@@ -263,16 +314,59 @@ def apply_preselection_rule(
     return cleanup_assignment_df(df_rule_applied)
 
 
-def apply_assignment_rule(
+def get_rule_cache_key(
+    data_version,
+    rule_preselection,
+    rule_assignment,
+    rule_join_operation,
+    rule_assignment_2,
+):
+    """Return the key of a rule result in the rule cache.
+
+    Returns None if the result can't be cached. This is the case for rules
+    on assignment columns that get changed by previous rules, e.g. status,
+    as their result depends on the order of rules.
+    """
+    if data_version is None or not consts.RULE_SETTING_RULE_CACHE:
+        return None
+
+    for rule in (rule_assignment, rule_assignment_2):
+        if rule is None:
+            continue
+        for table, column in (
+            (rule.table_x, rule.column_x),
+            (rule.table_y, rule.column_y),
+        ):
+            if (
+                table == consts.TABLE_NAME_ASSIGNMENTS
+                and column.replace(f"__{table}", "")
+                in RULE_CACHE_EXCLUDED_COLUMNS
+            ):
+                return None
+
+    return (
+        data_version,
+        consts.RULE_SETTING_CURRENT_SEMESTER,
+        tuple(rule_preselection) if rule_preselection is not None else None,
+        tuple(rule_assignment),
+        rule_join_operation,
+        tuple(rule_assignment_2) if rule_assignment_2 is not None else None,
+    )
+
+
+def get_rule_matching_ids(
     df_assignment_buffer,
     rule_assignment,
     rule_join_operation,
     rule_assignment_2,
-    system_method: str,
-    rule_application_order_info: int,
     database_name: str,
+    side_tables: dict = None,
 ):
-    """Apply a rule to a dataframe."""
+    """Return sorted ids of all assignments that match a rule.
+
+    Status of the assignments is not checked here, so the result only
+    depends on the data and the rule itself and can be cached.
+    """
     # Merge all tables needed for rule application
     # Column names have their origin table added as suffix to be unique
     df_merged_required_tables = load_and_merge_tables(
@@ -280,15 +374,11 @@ def apply_assignment_rule(
         rule_assignment,
         rule_assignment_2,
         database_name,
+        side_tables,
+    )
+    column_id = (
+        f"{consts.COLUMN_NAME_ASSIGNMENTS_ID}__{consts.TABLE_NAME_ASSIGNMENTS}"
     )
-
-    # Only use enrolled entries for rule appliance
-    df_merged_required_tables = df_merged_required_tables[
-        df_merged_required_tables[
-            f"{consts.COLUMN_NAME_ASSIGNMENTS_STATUS}__{consts.TABLE_NAME_ASSIGNMENTS}"
-        ]
-        == consts.RULE_SETTING_STATUS_ENROLLED
-    ]
 
     # Apply the first rule to df
     df_rule_applied = rule_utils.apply_rule_to_df(
@@ -298,13 +388,11 @@ def apply_assignment_rule(
         rule_assignment.table_y,
         rule_assignment.column_y,
     )
-    # Cleanup removes merged tables and column suffixes
-    df_rule_applied = cleanup_assignment_df(df_rule_applied)
+    matching_ids = np.unique(df_rule_applied[column_id].to_numpy())
 
-    # Check if there is a second rule and create another dataframe with these
-    # applied rules for later join of both dfs
-    try:
-        if rule_join_operation is not None and rule_assignment_2 is not None:
+    # Check if there is a second rule and join the ids of both rules
+    if rule_join_operation is not None and rule_assignment_2 is not None:
+        try:
             df_rule_applied_2 = rule_utils.apply_rule_to_df(
                 df_merged_required_tables,
                 rule_assignment_2.column_x,
@@ -312,30 +400,70 @@ def apply_assignment_rule(
                 rule_assignment_2.table_y,
                 rule_assignment_2.column_y,
             )
-            df_rule_applied_2 = cleanup_assignment_df(df_rule_applied_2)
 
-    except Exception:
-        logger.error(
-            f"Falsches Regelformat für {rule_assignment},"
-            f" {rule_join_operation}, {rule_assignment_2}.",
+        except Exception:
+            logger.error(
+                f"Falsches Regelformat für {rule_assignment},"
+                f" {rule_join_operation}, {rule_assignment_2}.",
+            )
+            raise
+
+        matching_ids = join_matching_ids(
+            matching_ids,
+            np.unique(df_rule_applied_2[column_id].to_numpy()),
+            rule_join_operation,
         )
-        raise
 
-    # Join the two dataframes with applied rules
-    if rule_join_operation is not None and rule_assignment_2 is not None:
-        df_rule_applied = join_assignment_dfs(
-            df_rule_applied,
-            df_rule_applied_2,
+    return matching_ids
+
+
+def apply_assignment_rule(
+    df_assignment_buffer,
+    rule_assignment,
+    rule_join_operation,
+    rule_assignment_2,
+    system_method: str,
+    rule_application_order_info: int,
+    database_name: str,
+    side_tables: dict = None,
+    rule_cache_key=None,
+):
+    """Apply a rule to a dataframe.
+
+    rule_cache_key: key of the rule result in the rule cache, see
+    get_rule_cache_key(). If None, the rule is always evaluated.
+    """
+    matching_ids = None
+    if rule_cache_key is not None:
+        matching_ids = rule_cache.get(rule_cache_key)
+
+    if matching_ids is None:
+        matching_ids = get_rule_matching_ids(
+            df_assignment_buffer,
+            rule_assignment,
             rule_join_operation,
+            rule_assignment_2,
+            database_name,
+            side_tables,
         )
+        if rule_cache_key is not None:
+            rule_cache.put(rule_cache_key, matching_ids)
 
-    # Check if there are already some rows with the accepted status.
-    # These should not change and have their info not overwritten
-    # Only useful when there are multiple rounds
-    df_rule_applied = df_rule_applied.loc[
-        df_rule_applied[f"{consts.COLUMN_NAME_ASSIGNMENTS_STATUS}"]
-        != consts.RULE_SETTING_STATUS_ACCEPTED
-    ]
+    else:
+        logger.info("Regelergebnis aus Zwischenspeicher übernommen.")
+
+    # Only use enrolled entries for rule appliance.
+    # Already accepted rows should not change and have their info not
+    # overwritten, which is useful when there are multiple rounds
+    df_rule_applied = df_assignment_buffer.loc[
+        df_assignment_buffer[consts.COLUMN_NAME_ASSIGNMENTS_ID].isin(
+            matching_ids,
+        )
+        & (
+            df_assignment_buffer[consts.COLUMN_NAME_ASSIGNMENTS_STATUS]
+            == consts.RULE_SETTING_STATUS_ENROLLED
+        )
+    ].copy()
 
     # Add new status info to the set of rows that made it through the rule(s)
     # Status for proposition
@@ -0,0 +1,102 @@
+"""Functions to draw lottery numbers and pick lottery winners.
+
+The lottery decides which assignments of a rule chunk get the remaining
+slots of a group, if the chunk only partially fits into it.
+
+Lottery numbers can either be taken from the stored 'los_nummer' column of
+the assignment table or be drawn once per simulation from a seed. Seeded
+lottery numbers are never written back to the database, so a run can be
+reproduced via the seed saved in the stat info file without rewriting lots.
+"""
+
+import numpy as np
+import pandas as pd
+
+import utils.constants as consts
+from utils.logger import logger
+
+LOTTERY_MODE_STORED = "stored"
+LOTTERY_MODE_SEEDED = "seeded"
+LOTTERY_MODES = [LOTTERY_MODE_STORED, LOTTERY_MODE_SEEDED]
+
+
+def create_lottery_seed():
+    """Return a new random seed that can be saved as json."""
+    return int(np.random.default_rng().integers(0, 2**32))
+
+
+def get_lottery_seed(lottery_seed=None):
+    """Return the seed to use for a seeded lottery.
+
+    Priority: given seed, then seed from settings, then a new random seed.
+    """
+    if lottery_seed is not None:
+        return int(lottery_seed)
+
+    if consts.RULE_SETTING_LOTTERY_SEED.strip():
+        return int(consts.RULE_SETTING_LOTTERY_SEED)
+
+    return create_lottery_seed()
+
+
+def draw_lottery_numbers(assignment_ids, lottery_seed: int):
+    """Draw one unique lottery number per assignment id.
+
+    All lots of a simulation are drawn at once as a single permutation, so
+    there are no ties. Ids are sorted first, which makes the drawn lots
+    independent of the order of the assignment table.
+    """
+    assignment_ids = np.sort(np.asarray(assignment_ids))
+    rng = np.random.default_rng(lottery_seed)
+
+    return pd.Series(
+        rng.permutation(len(assignment_ids)),
+        index=assignment_ids,
+        name="los_nummer",
+    )
+
+
+def get_lottery_numbers(df_assignment_buffer, lottery_mode, lottery_seed):
+    """Return lottery numbers for all assignments of the buffer.
+
+    Buffer must have the assignment ids as index.
+    """
+    if lottery_mode == LOTTERY_MODE_SEEDED:
+        logger.info(f"Ziehe Losnummern mit Seed '{lottery_seed}'...")
+        return draw_lottery_numbers(df_assignment_buffer.index, lottery_seed)
+
+    if lottery_mode != LOTTERY_MODE_STORED:
+        logger.error(
+            f"Unbekannter Losverfahren-Modus '{lottery_mode}'. Muss in"
+            f" '{LOTTERY_MODES}' sein.",
+        )
+        raise ValueError(lottery_mode)
+
+    return df_assignment_buffer["los_nummer"]
+
+
+def pick_lottery_winners(df_current_rule, slots_free: int, lottery_numbers):
+    """Return the rows of a rule chunk with the highest lottery numbers.
+
+    Uses a partial sort (argpartition) instead of sorting the whole chunk, as
+    only the set of winners is needed and not their order.
+    Lottery numbers are compared as int64 so big stored lots keep their
+    precision.
+    Assignments without a lottery number are picked last.
+    """
+    slots_free = max(slots_free, 0)
+    if slots_free >= len(df_current_rule.index):
+        return df_current_rule
+
+    if slots_free == 0:
+        return df_current_rule.iloc[0:0]
+
+    lots = lottery_numbers.reindex(df_current_rule.index).to_numpy(
+        dtype="int64",
+        na_value=np.iinfo("int64").min,
+    )
+    # Highest lots end up behind the partition index
+    first_winner = len(lots) - slots_free
+    winners = np.argpartition(lots, first_winner)[first_winner:]
+
+    return df_current_rule.iloc[np.sort(winners)]
@@ -0,0 +1,349 @@
+"""Functions to estimate acceptance probabilities via repeated lotteries.
+
+Lottery luck can strongly affect which assignments get accepted. Instead of
+one lottery, the slot distribution is repeated for many seeded lotteries on
+the same rule applied assignments. Rules are only evaluated once and nothing
+is written back to the database.
+
+Results are acceptance probabilities with 95% confidence intervals per
+assignment, per student and per lecture group.
+
+Every run is a full slot distribution, as slots depend on the acceptances
+of earlier rules and lecture groups. Runs don't depend on each other though,
+so they are spread across one process per cpu core by default.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils.constants as consts
+from utils import file_utils, stat_file_utils
+from utils.logger import logger
+
+from . import model_rule_sim_apply_participant_slots, model_rule_sim_lottery
+
+# z value for 95% confidence intervals
+CONFIDENCE_Z = 1.96
+
+# Worker process state, set once per process by init_worker() so the buffer
+# doesn't need to be pickled for every single lottery run
+worker_state = {}
+
+
+def get_monte_carlo_seeds(lottery_seed: int, monte_carlo_runs: int):
+    """Derive independent lottery seeds for each run from one base seed."""
+    seed_sequence = np.random.SeedSequence(lottery_seed)
+    return [
+        int(child.generate_state(1)[0])
+        for child in seed_sequence.spawn(monte_carlo_runs)
+    ]
+
+
+def run_single_allocation(
+    df_assignment_buffer,
+    database_name,
+    rule_count,
+    lottery_seed,
+    max_participants_lookup,
+):
+    """Distribute slots for one seeded lottery and return accepted ids."""
+    lottery_numbers = model_rule_sim_lottery.draw_lottery_numbers(
+        df_assignment_buffer.index,
+        lottery_seed,
+    )
+    (
+        _,
+        df_accepted_assignments,
+        _,
+    ) = model_rule_sim_apply_participant_slots.apply_participant_slots(
+        df_assignment_buffer.copy(),
+        database_name,
+        rule_count,
+        False,
+        lottery_numbers,
+        max_participants_lookup,
+    )
+
+    return df_accepted_assignments.index.to_numpy()
+
+
+def init_worker(
+    df_assignment_buffer,
+    database_name,
+    rule_count,
+    max_participants_lookup,
+):
+    """Keep shared allocation inputs in a worker process."""
+    worker_state["df_assignment_buffer"] = df_assignment_buffer
+    worker_state["database_name"] = database_name
+    worker_state["rule_count"] = rule_count
+    worker_state["max_participants_lookup"] = max_participants_lookup
+
+
+def run_single_allocation_in_worker(lottery_seed):
+    """Distribute slots in a worker process, see init_worker()."""
+    return run_single_allocation(
+        worker_state["df_assignment_buffer"],
+        worker_state["database_name"],
+        worker_state["rule_count"],
+        lottery_seed,
+        worker_state["max_participants_lookup"],
+    )
+
+
+def get_wilson_interval(successes, trials):
+    """Return lower and upper bounds of the wilson score interval.
+
+    Better suited than the normal approximation for probabilities close to
+    0 or 1, which are common for accepted assignments.
+    """
+    successes = np.asarray(successes, dtype="float64")
+    trials = np.asarray(trials, dtype="float64")
+    z_squared = CONFIDENCE_Z**2
+
+    probability = successes / trials
+    denominator = 1 + z_squared / trials
+    center = (probability + z_squared / (2 * trials)) / denominator
+    margin = (
+        CONFIDENCE_Z
+        * np.sqrt(
+            probability * (1 - probability) / trials
+            + z_squared / (4 * trials**2),
+        )
+        / denominator
+    )
+
+    return np.clip(center - margin, 0, 1), np.clip(center + margin, 0, 1)
+
+
+def aggregate_monte_carlo_results(
+    df_candidates,
+    accepted_per_run: list,
+):
+    """Aggregate accepted ids of all runs into acceptance probabilities.
+
+    df_candidates: proposed assignments that took part in the lottery,
+    _pk_id as index
+    accepted_per_run: list of accepted id arrays, one per lottery run
+    """
+    monte_carlo_runs = len(accepted_per_run)
+    candidate_ids = df_candidates.index.to_numpy()
+
+    # Matrix of runs x candidates, True if the candidate got accepted.
+    # Boolean matrix stays small, e.g. 100 runs x 100k candidates = 10 MB
+    accepted_matrix = np.zeros(
+        (monte_carlo_runs, len(candidate_ids)),
+        dtype=bool,
+    )
+    for run, accepted_ids in enumerate(accepted_per_run):
+        accepted_matrix[run] = np.isin(candidate_ids, accepted_ids)
+
+    # Per assignment
+    accepted_count = accepted_matrix.sum(axis=0)
+    ci_lower, ci_upper = get_wilson_interval(accepted_count, monte_carlo_runs)
+    df_probabilities_assignments = df_candidates[
+        [
+            consts.COLUMN_NAME_ASSIGNMENTS_MATRICULE_NUMBER,
+            consts.COLUMN_NAME_ASSIGNMENTS_LECTURE_ID,
+            consts.COLUMN_NAME_ASSIGNMENTS_GROUP_ID,
+            "wunsch_prio",
+            consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO,
+        ]
+    ].copy()
+    df_probabilities_assignments["zulassungen"] = accepted_count
+    df_probabilities_assignments["wahrscheinlichkeit"] = (
+        accepted_count / monte_carlo_runs
+    )
+    df_probabilities_assignments["ci_unten"] = ci_lower
+    df_probabilities_assignments["ci_oben"] = ci_upper
+
+    # Per student: chance to get at least one of the applied for assignments.
+    # Group candidate columns by student via codes instead of a groupby per
+    # run
+    student_codes, students = pd.factorize(
+        df_candidates[consts.COLUMN_NAME_ASSIGNMENTS_MATRICULE_NUMBER],
+    )
+    accepted_per_student = np.zeros(
+        (monte_carlo_runs, len(students)),
+        dtype=np.int64,
+    )
+    for run in range(monte_carlo_runs):
+        accepted_per_student[run] = np.bincount(
+            student_codes,
+            weights=accepted_matrix[run],
+            minlength=len(students),
+        )
+    student_success_count = (accepted_per_student > 0).sum(axis=0)
+    ci_lower, ci_upper = get_wilson_interval(
+        student_success_count,
+        monte_carlo_runs,
+    )
+    df_probabilities_students = pd.DataFrame(
+        {
+            consts.COLUMN_NAME_ASSIGNMENTS_MATRICULE_NUMBER: students,
+            "bewerbungen": np.bincount(
+                student_codes,
+                minlength=len(students),
+            ),
+            "zulassungen_mittelwert": accepted_per_student.mean(axis=0),
+            "wahrscheinlichkeit_min_eine_zulassung": (
+                student_success_count / monte_carlo_runs
+            ),
+            "ci_unten": ci_lower,
+            "ci_oben": ci_upper,
+        },
+    )
+
+    # Per lecture group: share of applicants that get accepted.
+    # Confidence interval of the mean share across runs
+    group_columns = [
+        consts.COLUMN_NAME_ASSIGNMENTS_LECTURE_ID,
+        consts.COLUMN_NAME_ASSIGNMENTS_GROUP_ID,
+    ]
+    group_codes = (
+        df_candidates.groupby(group_columns, dropna=False, sort=False)
+        .ngroup()
+        .to_numpy()
+    )
+    groups = df_candidates[group_columns].drop_duplicates()
+    applicants_per_group = np.bincount(group_codes, minlength=len(groups))
+    acceptance_rate_per_run = np.stack(
+        [
+            np.bincount(
+                group_codes,
+                weights=accepted_matrix[run],
+                minlength=len(groups),
+            )
+            / applicants_per_group
+            for run in range(monte_carlo_runs)
+        ],
+    )
+    rate_mean = acceptance_rate_per_run.mean(axis=0)
+    rate_margin = (
+        CONFIDENCE_Z
+        * acceptance_rate_per_run.std(axis=0, ddof=1)
+        / np.sqrt(monte_carlo_runs)
+        if monte_carlo_runs > 1
+        else np.zeros(len(groups))
+    )
+    df_probabilities_groups = groups.reset_index(drop=True)
+    df_probabilities_groups["bewerbungen"] = applicants_per_group
+    df_probabilities_groups["zulassungen_mittelwert"] = (
+        rate_mean * applicants_per_group
+    )
+    df_probabilities_groups["wahrscheinlichkeit"] = rate_mean
+    df_probabilities_groups["ci_unten"] = np.clip(rate_mean - rate_margin, 0, 1)
+    df_probabilities_groups["ci_oben"] = np.clip(rate_mean + rate_margin, 0, 1)
+
+    return (
+        df_probabilities_assignments,
+        df_probabilities_students,
+        df_probabilities_groups,
+    )
+
+
+def run_monte_carlo_lottery(
+    df_assignment_buffer,
+    database_name,
+    rule_count,
+    monte_carlo_runs: int,
+    lottery_seed: int,
+    max_participants_lookup,
+):
+    """Repeat the slot distribution for a number of seeded lotteries.
+
+    Buffer must contain rule applied assignments with _pk_id as index and is
+    not modified. Runs are distributed across a process pool, by default one
+    process per cpu core.
+    """
+    seeds = get_monte_carlo_seeds(lottery_seed, monte_carlo_runs)
+    processes = consts.RULE_SETTING_MONTE_CARLO_PROCESSES or os.cpu_count()
+    processes = max(1, min(processes, monte_carlo_runs))
+
+    logger.info(
+        f"Starte {monte_carlo_runs} Monte-Carlo-Losverfahren mit Basis-Seed"
+        f" '{lottery_seed}' und {processes} Prozess(en)...",
+    )
+
+    if processes > 1:
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=init_worker,
+            initargs=(
+                df_assignment_buffer,
+                database_name,
+                rule_count,
+                max_participants_lookup,
+            ),
+        ) as executor:
+            accepted_per_run = list(
+                executor.map(run_single_allocation_in_worker, seeds),
+            )
+
+    else:
+        accepted_per_run = []
+        for run, seed in enumerate(seeds, start=1):
+            logger.info(f"Monte-Carlo-Durchlauf {run} von {monte_carlo_runs}")
+            accepted_per_run.append(
+                run_single_allocation(
+                    df_assignment_buffer,
+                    database_name,
+                    rule_count,
+                    seed,
+                    max_participants_lookup,
+                ),
+            )
+
+    # Only proposed assignments take part in the lottery
+    df_candidates = df_assignment_buffer.loc[
+        df_assignment_buffer[consts.COLUMN_NAME_ASSIGNMENTS_STATUS]
+        == consts.RULE_SETTING_STATUS_PROPOSED
+    ]
+
+    return aggregate_monte_carlo_results(df_candidates, accepted_per_run)
+
+
+def write_monte_carlo_stat_files(
+    stat_folder_name: str,
+    df_probabilities_assignments,
+    df_probabilities_students,
+    df_probabilities_groups,
+):
+    """Save aggregated monte carlo results next to the other stat files."""
+    stat_folder = file_utils.get_folder(
+        Path(consts.FOLDER_STAT_FILES, stat_folder_name),
+    )
+
+    stat_info = file_utils.read_json(stat_folder, consts.FILENAME_STAT_INFO)
+    stat_file_format = stat_file_utils.get_stat_folder_format(stat_info)
+
+    for df, stat_file_name in (
+        (
+            df_probabilities_assignments,
+            consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_ASSIGNMENTS,
+        ),
+        (
+            df_probabilities_students,
+            consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_STUDENTS,
+        ),
+        (
+            df_probabilities_groups,
+            consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_GROUPS,
+        ),
+    ):
+        stat_file_utils.write_stat_frame(
+            df,
+            stat_folder,
+            stat_file_name,
+            stat_file_format,
+        )
+
+    logger.info(
+        "Monte-Carlo-Ergebnisse geschrieben. Ø Zulassungswahrscheinlichkeit"
+        " pro Belegung:"
+        f" {df_probabilities_assignments['wahrscheinlichkeit'].mean():.3f}",
+    )
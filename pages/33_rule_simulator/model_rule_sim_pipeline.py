@@ -0,0 +1,276 @@
+"""Functions to simulate multiple assignment rounds in one go.
+
+All rounds are simulated in memory, the database is only read once at the
+start and written once after the last round. Between rounds a
+self-disenrollment step can free up slots for the next round.
+
+Every round gets its own stat folder. The last round uses the given stat
+folder name, earlier rounds get their round number appended.
+
+Each round is journaled on its own against the in-memory state of the round
+before, so every round of a pipeline can be rolled back like a single
+simulated round.
+"""
+
+import datetime
+
+import numpy as np
+
+import utils.constants as consts
+from utils import db_utils, profiling_utils, rule_utils
+from utils.logger import logger
+
+from . import (
+    model_rule_sim,
+    model_rule_sim_lottery,
+    model_rule_sim_monte_carlo,
+)
+
+
+def get_round_stat_folder_name(
+    stat_folder_name: str,
+    pipeline_round: int,
+    rounds: int,
+):
+    """Return the stat folder name of a round inside the pipeline."""
+    if pipeline_round == rounds:
+        return stat_folder_name
+
+    return f"{stat_folder_name} - Runde {pipeline_round}"
+
+
+def apply_self_disenrollment(
+    df_all_assignments,
+    probability: float,
+    seed,
+    semester,
+):
+    """Set accepted and enrolled assignments of a semester to self
+    disenrolled by chance.
+
+    In memory counterpart to the self disenrollment of the generator page,
+    the same seed disenrolls the same assignments.
+    Returns a modified copy and the number of changed assignments.
+    """
+    df_all_assignments = df_all_assignments.copy()
+
+    if not isinstance(semester, (list, tuple, set)):
+        semester = [semester]
+    in_semester = df_all_assignments[
+        consts.COLUMN_NAME_ASSIGNMENTS_SEMESTER
+    ].isin(semester)
+    accepted_or_enrolled = df_all_assignments[
+        consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+    ].isin(
+        [
+            consts.RULE_SETTING_STATUS_ACCEPTED,
+            consts.RULE_SETTING_STATUS_ENROLLED,
+        ],
+    )
+    candidates = in_semester & accepted_or_enrolled
+    # Sorted ids like the generator page, so a seed draws the same
+    disenrolled_ids = rule_utils.draw_self_disenrolled_ids(
+        np.sort(
+            df_all_assignments.loc[
+                candidates,
+                consts.COLUMN_NAME_ASSIGNMENTS_ID,
+            ].to_numpy(dtype=np.int64),
+        ),
+        probability,
+        seed,
+    )
+    disenrolled = df_all_assignments[consts.COLUMN_NAME_ASSIGNMENTS_ID].isin(
+        disenrolled_ids,
+    )
+
+    df_all_assignments.loc[
+        disenrolled,
+        consts.COLUMN_NAME_ASSIGNMENTS_STATUS,
+    ] = consts.RULE_SETTING_STATUS_SELF_DISENROLLED
+    df_all_assignments.loc[
+        disenrolled,
+        consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP,
+    ] = datetime.datetime.now()
+
+    return df_all_assignments, len(disenrolled_ids)
+
+
+def get_journal_state(df_all_assignments):
+    """Return the journaled columns of the in-memory assignments.
+
+    Timestamps set in memory are stored as text, like in the assignments
+    table, so they can be written to the status journal.
+    """
+    df_journal_state = df_all_assignments[model_rule_sim.JOURNAL_COLUMNS]
+    timestamps = df_journal_state[consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP]
+
+    return df_journal_state.assign(
+        **{
+            consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP: timestamps.astype(
+                object,
+            ).where(timestamps.isna(), timestamps.astype(str)),
+        },
+    )
+
+
+@profiling_utils.profile_run("pipeline")
+def run_round_pipeline(
+    rule_preselection,
+    list_rule_assignments,
+    database_name,
+    ruleset_name,
+    stat_folder_name,
+    rounds: int,
+    disenroll_probability: float = 0,
+    disenroll_semester=None,
+    seed=None,
+    lottery_mode=None,
+    dry_run=False,
+):
+    """Simulate rounds 1..k of a ruleset in memory.
+
+    disenroll_semester: semester or list of semesters the self
+    disenrollment between rounds applies to, None for the current semester.
+    seed: base seed for the self disenrollment and seeded lotteries. Each
+    round gets its own seed derived from it, so a pipeline can be repeated.
+    Returns a list with the stat folder name of every round.
+    """
+    logger.info(f"Starte Simulation von {rounds} Runden...")
+
+    database_path = db_utils.get_db_path(database_name, True)
+    simulation_data = model_rule_sim.load_simulation_data(database_name)
+
+    if lottery_mode is None:
+        lottery_mode = consts.RULE_SETTING_LOTTERY_MODE
+    if disenroll_semester is None:
+        disenroll_semester = consts.RULE_SETTING_CURRENT_SEMESTER
+    seed = model_rule_sim_lottery.get_lottery_seed(seed)
+    # First half for the lotteries, second half for the disenrollments
+    round_seeds = model_rule_sim_monte_carlo.get_monte_carlo_seeds(
+        seed,
+        2 * rounds,
+    )
+
+    # Journal of every round, written together with the last round
+    journal_rounds = []
+    df_journal_state = get_journal_state(simulation_data["assignments"])
+
+    stat_folder_names = []
+    for pipeline_round in range(1, rounds + 1):
+        logger.info(
+            f"{consts.CONSOLE_BLUE}Pipeline Runde {pipeline_round} von"
+            f" {rounds} {consts.CONSOLE_ENDCMD}",
+        )
+
+        round_stat_folder_name = get_round_stat_folder_name(
+            stat_folder_name,
+            pipeline_round,
+            rounds,
+        )
+
+        with profiling_utils.collect_stage_profile() as stage_profile:
+            disenrollment_count = 0
+            if pipeline_round > 1 and disenroll_probability:
+                with profiling_utils.measure_stage("Selbst-Abmeldung"):
+                    (
+                        df_all_assignments,
+                        disenrollment_count,
+                    ) = apply_self_disenrollment(
+                        simulation_data["assignments"],
+                        disenroll_probability,
+                        round_seeds[rounds + pipeline_round - 1],
+                        disenroll_semester,
+                    )
+                simulation_data = {
+                    **simulation_data,
+                    "assignments": df_all_assignments,
+                }
+                logger.info(
+                    f"Es wurden {disenrollment_count} Belegungen auf Status"
+                    f" {consts.RULE_SETTING_STATUS_SELF_DISENROLLED} gesetzt",
+                )
+
+            round_result = model_rule_sim.simulate_round(
+                rule_preselection,
+                list_rule_assignments,
+                database_name,
+                simulation_data,
+                lottery_mode,
+                round_seeds[pipeline_round - 1],
+            )
+            model_rule_sim.write_round_stat_files(
+                round_result,
+                database_name,
+                ruleset_name,
+                round_stat_folder_name,
+                additional_stat_info={
+                    "dry_run": dry_run,
+                    "pipeline_round": pipeline_round,
+                    "pipeline_rounds": rounds,
+                    "pipeline_seed": seed,
+                    "self_disenroll_probability": disenroll_probability,
+                    "self_disenrollments": disenrollment_count,
+                },
+            )
+
+            if not dry_run:
+                with profiling_utils.measure_stage(
+                    "Statusjournal vorbereiten",
+                    rows_in=len(round_result["all_assignments"].index),
+                ) as stage:
+                    journal_rows = model_rule_sim.get_status_journal_rows(
+                        round_result["all_assignments"],
+                        df_journal_state,
+                        round_result["current_round"],
+                    )
+                    stage["rows_out"] = len(journal_rows)
+                journal_rounds.append(
+                    (
+                        round_result["current_round"],
+                        simulation_data["current_round"],
+                        journal_rows,
+                    ),
+                )
+                df_journal_state = get_journal_state(
+                    round_result["all_assignments"],
+                )
+
+        rule_utils.update_stat_info(
+            round_stat_folder_name,
+            {"stage_profile": stage_profile},
+        )
+        stat_folder_names.append(round_stat_folder_name)
+
+        # Next round continues with the assignment state of this round.
+        # Data version stays the same, as rounds only change columns that
+        # are excluded from the rule cache and add accepted combo rows
+        simulation_data = {
+            **simulation_data,
+            "current_round": round_result["current_round"],
+            "assignments": round_result["all_assignments"],
+        }
+
+    if dry_run:
+        logger.info("Testlauf: Datenbank wird nicht verändert.")
+    else:
+        with profiling_utils.collect_stage_profile() as stage_profile:
+            model_rule_sim.write_assignments_back_to_db(
+                simulation_data["assignments"],
+                simulation_data["current_round"],
+                database_path,
+                journal_rounds,
+            )
+
+        # Write back belongs to the last round
+        stat_info = rule_utils.read_stat_info(stat_folder_names[-1])
+        rule_utils.update_stat_info(
+            stat_folder_names[-1],
+            {"stage_profile": stat_info["stage_profile"] + stage_profile},
+        )
+
+    logger.info(
+        f"{consts.CONSOLE_GREEN}{rounds} Runden erfolgreich simuliert."
+        f" {consts.CONSOLE_ENDCMD}",
+    )
+
+    return stat_folder_names
@@ -0,0 +1,220 @@
+"""Functions to simulate multiple rulesets on the same database at once.
+
+The database is loaded once, then every ruleset is simulated as a dry run in
+its own worker process. Each ruleset gets its own stat folder, a summary
+compares the outcome of all rulesets.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+import utils.constants as consts
+from utils import file_utils, rule_utils
+from utils.logger import logger
+
+from . import model_rule_sim, model_rule_sim_lottery
+
+# Worker process state, set once per process by init_worker() so the
+# database content doesn't need to be pickled for every ruleset
+worker_state = {}
+
+
+def get_sweep_stat_folder_name(sweep_name: str, ruleset_name: str):
+    """Return the stat folder name of a ruleset inside a sweep."""
+    return f"{sweep_name} - {Path(ruleset_name).stem}"
+
+
+def init_worker(simulation_data):
+    """Keep loaded database content in a worker process."""
+    worker_state["simulation_data"] = simulation_data
+
+
+def summarize_stat_folder(stat_folder_name: str):
+    """Return key figures of a simulation result for the sweep summary."""
+    column_student = consts.COLUMN_NAME_ASSIGNMENTS_MATRICULE_NUMBER
+    (
+        _,
+        df_accepted_assignments,
+        df_denied_assignments,
+        df_accepted_lecture_combinations,
+    ) = rule_utils.read_stat_frames(
+        stat_folder_name,
+        (
+            consts.RULE_SETTING_STAT_FILE_ACCEPTED,
+            consts.RULE_SETTING_STAT_FILE_DENIED,
+            consts.RULE_SETTING_STAT_FILE_ACCEPTED_LECTURE_COMBINATIONS,
+        ),
+        columns=[column_student],
+    )
+
+    # Empty stat dataframes of the simulator may not have all columns
+    students_accepted = set(
+        df_accepted_assignments.get(column_student, []),
+    )
+    students_denied = set(df_denied_assignments.get(column_student, []))
+
+    return {
+        "zulassungen": len(df_accepted_assignments.index),
+        "ablehnungen": len(
+            df_denied_assignments.index.difference(
+                df_accepted_assignments.index,
+            ),
+        ),
+        "kombo_zulassungen": len(df_accepted_lecture_combinations.index),
+        "studierende_mit_zulassung": len(students_accepted),
+        "studierende_ohne_zulassung": len(students_denied - students_accepted),
+    }
+
+
+def run_ruleset(
+    database_name: str,
+    ruleset_name: str,
+    stat_folder_name: str,
+    lottery_mode=None,
+    lottery_seed=None,
+):
+    """Simulate one ruleset as dry run in a worker process."""
+    start_time = time.perf_counter()
+
+    rule_preselection, list_rule_assignments = rule_utils.read_rule_file(
+        consts.FOLDER_RULE_FILES,
+        ruleset_name,
+    )
+    model_rule_sim.rule_simulator(
+        rule_preselection,
+        list_rule_assignments,
+        database_name,
+        ruleset_name,
+        stat_folder_name,
+        lottery_mode,
+        lottery_seed,
+        dry_run=True,
+        simulation_data=worker_state["simulation_data"],
+    )
+
+    return {
+        "regelwerk": ruleset_name,
+        "statistik": stat_folder_name,
+        **summarize_stat_folder(stat_folder_name),
+        "laufzeit_s": round(time.perf_counter() - start_time, 2),
+    }
+
+
+def run_ruleset_sweep(
+    database_name: str,
+    ruleset_names: list,
+    sweep_name: str,
+    lottery_mode=None,
+    lottery_seed=None,
+    processes=None,
+):
+    """Simulate every given ruleset on the same database as dry run.
+
+    Rulesets run in parallel worker processes, default is one per core.
+    All rulesets use the same lottery seed if a seeded lottery is used, so
+    only the rules differ between them.
+    Returns the summary as dataframe, which is also saved to the sweep
+    folder. Rulesets that failed are part of it with their error.
+    """
+    if processes is None:
+        processes = consts.RULE_SETTING_SWEEP_PROCESSES or os.cpu_count()
+    processes = max(1, min(processes, len(ruleset_names)))
+
+    logger.info(
+        f"Starte Vergleich von {len(ruleset_names)} Regelwerken auf"
+        f" '{database_name}' mit {processes} Prozess(en)...",
+    )
+
+    # Load db once, workers receive it on start
+    simulation_data = model_rule_sim.load_simulation_data(
+        database_name,
+        preload_side_tables=True,
+    )
+
+    # Draw one seed for all rulesets instead of one per worker
+    if lottery_mode is None:
+        lottery_mode = consts.RULE_SETTING_LOTTERY_MODE
+    if lottery_mode == model_rule_sim_lottery.LOTTERY_MODE_SEEDED:
+        lottery_seed = model_rule_sim_lottery.get_lottery_seed(lottery_seed)
+
+    summary = []
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=init_worker,
+        initargs=(simulation_data,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                run_ruleset,
+                database_name,
+                ruleset_name,
+                get_sweep_stat_folder_name(sweep_name, ruleset_name),
+                lottery_mode,
+                lottery_seed,
+            ): ruleset_name
+            for ruleset_name in ruleset_names
+        }
+
+        failed_count = 0
+        for future in as_completed(futures):
+            ruleset_name = futures[future]
+            try:
+                summary.append(future.result())
+                logger.info(
+                    f"{consts.CONSOLE_GREEN}Regelwerk '{ruleset_name}'"
+                    f" fertig simuliert. {consts.CONSOLE_ENDCMD}",
+                )
+
+            except Exception as e:
+                logger.error(
+                    f"Regelwerk '{ruleset_name}' konnte nicht simuliert"
+                    f" werden: {e}",
+                )
+                # Failed rulesets stay in the summary with their error, so
+                # an incomplete sweep can be told apart from a complete one
+                summary.append(
+                    {
+                        "regelwerk": ruleset_name,
+                        "statistik": get_sweep_stat_folder_name(
+                            sweep_name,
+                            ruleset_name,
+                        ),
+                        "fehler": f"{type(e).__name__}: {e}",
+                    },
+                )
+                failed_count += 1
+
+    # Keep order of the chosen rulesets
+    summary.sort(key=lambda entry: ruleset_names.index(entry["regelwerk"]))
+    df_summary = pd.DataFrame(summary)
+
+    file_utils.write_json(
+        {
+            "database_filename": database_name,
+            "assignment_round": simulation_data["current_round"] + 1,
+            "assignment_semester": consts.RULE_SETTING_CURRENT_SEMESTER,
+            "lottery_mode": lottery_mode,
+            "lottery_seed": lottery_seed,
+            "failed_rulesets": failed_count,
+            "rulesets": summary,
+        },
+        file_utils.get_folder(consts.FOLDER_SWEEP_FILES),
+        f"{sweep_name}.json",
+    )
+
+    if failed_count:
+        logger.warning(
+            f"Vergleich '{sweep_name}' abgeschlossen, {failed_count} von"
+            f" {len(df_summary.index)} Regelwerken fehlgeschlagen.",
+        )
+    else:
+        logger.info(
+            f"Vergleich '{sweep_name}' mit {len(df_summary.index)}"
+            " Regelwerken abgeschlossen.",
+        )
+
+    return df_summary
@@ -8,7 +8,7 @@ import pandas as pd
 from dash import Input, Output, callback, dcc, html
 
 import utils.constants as consts
-from utils import file_utils, layout_utils, rule_utils
+from utils import file_utils, layout_utils, rule_utils, stat_aggregate_utils
 from utils.logger import logger
 
 # Ignore FutureWarning from Pandas, triggered by internal Plotly Express Code
@@ -94,6 +94,8 @@ barchart = html.Div(
 
 piechart = html.Div(id="piechart-end-overview")
 
+stage_profile = html.Div(id="div-end-overview-stage-profile")
+
 
 sim_end_overview = html.Div(
     [
@@ -103,6 +105,7 @@ sim_end_overview = html.Div(
         data_overview,
         barchart,
         piechart,
+        stage_profile,
         html.Hr(),
         page_navigation,
     ],
@@ -121,6 +124,36 @@ layout = html.Div(
 )
 
 
+def create_stage_profile_table(stat_info):
+    """Return a table with the duration of each simulation stage."""
+    if not stat_info.get("stage_profile"):
+        return None
+
+    df_stage_profile = pd.DataFrame(stat_info["stage_profile"]).rename(
+        columns={
+            "stage": "Schritt",
+            "seconds": "Dauer (s)",
+            "peak_memory_mb": "Speicherspitze (MB)",
+            "rows_in": "Zeilen ein",
+            "rows_out": "Zeilen aus",
+            "note": "Hinweis",
+        },
+    )
+
+    return html.Div(
+        [
+            html.H5("Laufzeiten der Simulationsschritte", className=("mt-5")),
+            dbc.Table.from_dataframe(
+                df_stage_profile.fillna(""),
+                striped=True,
+                bordered=True,
+                hover=True,
+                size="sm",
+            ),
+        ],
+    )
+
+
 @callback(
     Output("spinner-end-overview", "children"),
     Output("text-end-overview-count-accepted", "children"),
@@ -131,29 +164,28 @@ layout = html.Div(
     Output("piechart-end-overview", "children"),
     Output("barchart-end-overview", "style"),
     Output("piechart-end-overview", "style"),
+    Output("div-end-overview-stage-profile", "children"),
     Input("url-end-overview", "search"),
     Input("url-end-overview", "pathname"),
 )
 def show_db_assignment_info(search, pathname):
     if search and pathname == consts.PAGE_SIM_DONE_URL:
         stat_name = file_utils.get_query_string(search, "stat_a")
-        (
-            stat_info,
-            df_accepted_assignments,
-            df_denied_assignments,
-            df_accepted_lecture_combinations,
-            df_assignments,
-        ) = rule_utils.read_stat_files(stat_name)
-
-        df_new_assignments = pd.concat(
-            [
-                df_accepted_assignments,
-                df_denied_assignments,
-                df_accepted_lecture_combinations,
-            ],
+        stat_info, df_aggregates = rule_utils.read_stat_aggregates(stat_name)
+        # New assignments including lecture combinations
+        selection_new = stat_aggregate_utils.SELECTION_NEW_WITH_COMBINATIONS
+
+        count_accepted, count_denied, count_combinations, count_enrolled = (
+            stat_aggregate_utils.get_total(df_aggregates, selection)
+            for selection in (
+                stat_aggregate_utils.SELECTION_ACCEPTED,
+                stat_aggregate_utils.SELECTION_DENIED,
+                stat_aggregate_utils.SELECTION_COMBINATIONS,
+                stat_aggregate_utils.SELECTION_ENROLLED,
+            )
         )
 
-        if not df_new_assignments.empty:
+        if count_accepted or count_denied or count_combinations:
             barchart = html.Div(
                 [
                     html.H5(
@@ -162,7 +194,11 @@ def show_db_assignment_info(search, pathname):
                     ),
                     dcc.Graph(
                         figure=layout_utils.create_barchart_for_rules(
-                            df_new_assignments,
+                            stat_aggregate_utils.get_counts(
+                                df_aggregates,
+                                selection_new,
+                                ["sortierwert", "status"],
+                            ),
                             stat_info,
                         ),
                     ),
@@ -174,7 +210,11 @@ def show_db_assignment_info(search, pathname):
                     html.H5("Aufteilung der neuen Status", className=("mt-5")),
                     dcc.Graph(
                         figure=layout_utils.create_piechart_for_assignment_status(
-                            df_new_assignments,
+                            stat_aggregate_utils.get_counts(
+                                df_aggregates,
+                                selection_new,
+                                ["status"],
+                            ),
                         ),
                     ),
                 ],
@@ -182,16 +222,16 @@ def show_db_assignment_info(search, pathname):
 
             return (
                 "",
-                f"Anzahl neue Zulassungen: {len(df_accepted_assignments)}",
-                f"Anzahl neue Ablehnungen: {len(df_denied_assignments)}",
+                f"Anzahl neue Zulassungen: {count_accepted}",
+                f"Anzahl neue Ablehnungen: {count_denied}",
                 "Anzahl neue Kombinationszulassungen:"
-                f" {len(df_accepted_lecture_combinations)}",
-                "Anzahl ausstehende Anmeldungen:"
-                f" {len(df_assignments[df_assignments["status"] == consts.RULE_SETTING_STATUS_ENROLLED])}",
+                f" {count_combinations}",
+                f"Anzahl ausstehende Anmeldungen: {count_enrolled}",
                 barchart,
                 piechart,
                 {},
                 {},
+                create_stage_profile_table(stat_info),
             )
 
         else:
@@ -205,6 +245,7 @@ def show_db_assignment_info(search, pathname):
                 None,
                 {"visibility": "hidden"},
                 {"visibility": "hidden"},
+                create_stage_profile_table(stat_info),
             )
 
     return (
@@ -217,6 +258,7 @@ def show_db_assignment_info(search, pathname):
         None,
         {"visibility": "hidden"},
         {"visibility": "hidden"},
+        None,
     )
 
 
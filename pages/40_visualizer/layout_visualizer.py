@@ -4,7 +4,6 @@ Wraps and calls other visualizer layout files.
 """
 
 import warnings
-from pathlib import Path
 
 import dash
 import dash_bootstrap_components as dbc
@@ -13,7 +12,11 @@ from dash import Input, Output, callback, ctx, dcc, html
 import utils.constants as consts
 from utils import file_utils, rule_utils
 
-from .layout_visualizer_data_store import loading_spinner
+from .layout_visualizer_data_store import (
+    get_stat_letter,
+    get_stat_names,
+    loading_spinner,
+)
 from .layout_visualizer_tab_a import tab_a
 from .layout_visualizer_tab_b import tab_b
 from .layout_visualizer_tab_comparison import tab_comparison
@@ -85,6 +88,21 @@ stat_selection = html.Div(
                 ),
             ],
         ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.H5("Weitere Statistiken zum Vergleich: "),
+                        dcc.Dropdown(
+                            id="select-visualizer-stats-more",
+                            multi=True,
+                        ),
+                    ],
+                    width=12,
+                    className="mt-3",
+                ),
+            ],
+        ),
         dbc.Row(
             [
                 dbc.Col(
@@ -155,16 +173,19 @@ layout = html.Div(
     Output("button-visualizer-load-stats", "disabled"),
     Output("select-visualizer-stat-a", "options"),
     Output("select-visualizer-stat-b", "options"),
+    Output("select-visualizer-stats-more", "options"),
     Output("tooltip-visualizer-load-stats-dbid", "style"),
     Output("tooltip-visualizer-load-stats-semester", "style"),
     Input("url-visualizer", "search"),
     Input("select-visualizer-stat-a", "value"),
     Input("select-visualizer-stat-b", "value"),
+    Input("select-visualizer-stats-more", "value"),
 )
-def toggle_button_load_stats(search, stat_a, stat_b):
+def toggle_button_load_stats(search, stat_a, stat_b, stats_more):
     """Activate the load button if only stat a is selected
-    or stat a and b database ids match.
+    or the database ids of stat a, b and further stats match.
 
+    Further stats are only compared, so they need stat b.
     """
     stat_list = rule_utils.get_stat_filelist()
     stat_list.insert(0, "")
@@ -176,53 +197,42 @@ def toggle_button_load_stats(search, stat_a, stat_b):
 
     if stat_a and stat_b:
         # Load stat info json files
-        stat_folder_a = file_utils.get_folder(
-            Path(consts.FOLDER_STAT_FILES, stat_a),
-        )
-        stat_info_a = file_utils.read_json(
-            stat_folder_a,
-            consts.FILENAME_STAT_INFO,
-        )
-
-        stat_folder_b = file_utils.get_folder(
-            Path(consts.FOLDER_STAT_FILES, stat_b),
-        )
-        stat_info_b = file_utils.read_json(
-            stat_folder_b,
-            consts.FILENAME_STAT_INFO,
-        )
+        stat_info_a = rule_utils.read_stat_info(stat_a)
 
         # Determine if database ids and semester
         # match to make tooltip visible if not
-        load_button_disabled_db_id = (
-            stat_info_a["database_id"] != stat_info_b["database_id"]
-        )
-        load_button_disabled_semester = (
-            stat_info_a["assignment_semester"]
-            != stat_info_b["assignment_semester"]
-        )
+        stat_info_mismatch = None
+        for stat_name in [stat_b, *(stats_more or [])]:
+            stat_info_mismatch = rule_utils.get_stat_info_mismatch(
+                stat_info_a,
+                rule_utils.read_stat_info(stat_name),
+            )
+            if stat_info_mismatch is not None:
+                break
 
         # Show tooltip for mismatch in db id
-        if load_button_disabled_db_id:
+        if stat_info_mismatch == "database_id":
             show_tooltip_id_mismatch = {}
 
         # Show tooltip for mismatch in semester
-        elif load_button_disabled_semester:
+        elif stat_info_mismatch == "assignment_semester":
             show_tooltip_semester_mismatch = {}
 
         return (
-            load_button_disabled_db_id or load_button_disabled_semester,
+            stat_info_mismatch is not None,
             stat_list,
             stat_list,
+            stat_list[1:],
             show_tooltip_id_mismatch,
             show_tooltip_semester_mismatch,
         )
 
     elif stat_a:
         return (
-            False,
+            bool(stats_more),
             stat_list,
             stat_list,
+            stat_list[1:],
             show_tooltip_id_mismatch,
             show_tooltip_semester_mismatch,
         )
@@ -232,6 +242,7 @@ def toggle_button_load_stats(search, stat_a, stat_b):
         True,
         stat_list,
         "",
+        stat_list[1:],
         show_tooltip_id_mismatch,
         show_tooltip_semester_mismatch,
     )
@@ -242,11 +253,13 @@ def toggle_button_load_stats(search, stat_a, stat_b):
     Input("button-visualizer-load-stats", "n_clicks"),
     Input("select-visualizer-stat-a", "value"),
     Input("select-visualizer-stat-b", "value"),
+    Input("select-visualizer-stats-more", "value"),
 )
 def trigger_page_reload_to_load_stats(
     n_clicks,
     value_stat_dropwdown_a,
     value_stat_dropwdown_b,
+    value_stat_dropdown_more,
 ):
     """Reload the page with query string in url.
 
@@ -262,6 +275,14 @@ def trigger_page_reload_to_load_stats(
         if value_stat_dropwdown_b:
             search = f"{search}&stat_b={value_stat_dropwdown_b}"
 
+            # Further stats get the letters after b, each stat only once
+            stat_names = [value_stat_dropwdown_a, value_stat_dropwdown_b]
+            for stat_name in value_stat_dropdown_more or []:
+                if stat_name not in stat_names:
+                    stat_letter = get_stat_letter(len(stat_names))
+                    search = f"{search}&stat_{stat_letter}={stat_name}"
+                    stat_names.append(stat_name)
+
         return f"{consts.PAGE_VISUALIZER_URL}?{search}"
 
     return None
@@ -270,6 +291,7 @@ def trigger_page_reload_to_load_stats(
 @callback(
     Output("select-visualizer-stat-a", "value"),
     Output("select-visualizer-stat-b", "value"),
+    Output("select-visualizer-stats-more", "value"),
     Input("url-visualizer", "search"),
     Input("url-visualizer", "pathname"),
 )
@@ -281,7 +303,12 @@ def update_loaded_select_stat_value(
     if search and pathname == consts.PAGE_VISUALIZER_URL:
         stat_name_a = file_utils.get_query_string(search, "stat_a")
         stat_name_b = file_utils.get_query_string(search, "stat_b")
+        stat_names_more = [
+            stat_name
+            for stat_letter, stat_name in get_stat_names(search).items()
+            if stat_letter not in ("a", "b")
+        ]
 
-        return stat_name_a, stat_name_b
+        return stat_name_a, stat_name_b, stat_names_more
 
-    return None, None
+    return None, None, []
@@ -10,7 +10,12 @@ import plotly.graph_objects as go
 from dash import dcc, html
 
 import utils.constants as consts
-from utils import layout_utils
+from utils import layout_utils, stat_aggregate_utils
+
+from .layout_visualizer_data_store import (
+    get_cached_figure,
+    get_stat_aggregates,
+)
 
 # Ignore FutureWarning from Pandas, triggered by internal Plotly Express Code which I have no control over
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -39,14 +44,14 @@ options_piechart_selector = [
 ]
 
 
-def create_stat_tab_overview(df_assignments):
+def create_stat_tab_overview(assignment_count: int, assignment_totals: dict):
     return html.Div(
         dbc.Row(
             [
                 dbc.Col(
                     [
                         html.P(
-                            f"Belegungseinträge gesamt: {len(df_assignments)}",
+                            f"Belegungseinträge gesamt: {assignment_count}",
                         ),
                     ],
                     width=3,
@@ -54,7 +59,7 @@ def create_stat_tab_overview(df_assignments):
                 dbc.Col(
                     [
                         html.P(
-                            f"Studierende gesamt: {df_assignments["matrikelnummer"].nunique()}",
+                            f"Studierende gesamt: {assignment_totals["matrikelnummer"]}",
                         ),
                     ],
                     width=2,
@@ -62,7 +67,7 @@ def create_stat_tab_overview(df_assignments):
                 dbc.Col(
                     [
                         html.P(
-                            f"Studiengänge gesamt: {df_assignments["studiengangs_id"].nunique()}",
+                            f"Studiengänge gesamt: {assignment_totals["studiengangs_id"]}",
                         ),
                     ],
                     width=2,
@@ -70,7 +75,7 @@ def create_stat_tab_overview(df_assignments):
                 dbc.Col(
                     [
                         html.P(
-                            f"Vorlesungen gesamt: {df_assignments["veranstaltungs_id"].nunique()}",
+                            f"Vorlesungen gesamt: {assignment_totals["veranstaltungs_id"]}",
                         ),
                     ],
                     width=2,
@@ -78,7 +83,7 @@ def create_stat_tab_overview(df_assignments):
                 dbc.Col(
                     [
                         html.P(
-                            f"Gruppen gesamt: {df_assignments["gruppen_id"].nunique()}",
+                            f"Gruppen gesamt: {assignment_totals["gruppen_id"]}",
                         ),
                     ],
                     width=2,
@@ -225,11 +230,8 @@ def create_stat_tab_figure_new_assignments(new_assignments):
     return figure_bar_new_assignments
 
 
-def round_mean_df_column(df, column):
-    if df.empty:
-        return None
-    df = df.dropna(subset=[column])
-    return round(df[column].mean(), 2) if not df.empty else None
+def round_mean(value):
+    return round(value, 2) if value is not None else None
 
 
 def create_stat_tab_figure_mean_study_semester(new_assignments):
@@ -252,11 +254,7 @@ def create_stat_tab_figure_mean_study_semester(new_assignments):
 def create_stat_tab(
     stat_name: str,
     stat_info: dict,
-    df_accepted_assignments,
-    df_denied_assignments,
-    df_accepted_lecture_combinations,
-    df_assignments,
-    df_all_new_assignments,
+    df_aggregates,
 ):
     """Assemble a stat tab containing information that doesn't change after
     it's created.
@@ -265,7 +263,13 @@ def create_stat_tab(
     their data needs to be loaded dynamically via user input.
     """
 
-    overview = create_stat_tab_overview(df_assignments)
+    overview = create_stat_tab_overview(
+        stat_aggregate_utils.get_total(
+            df_aggregates,
+            stat_aggregate_utils.SELECTION_ASSIGNMENTS,
+        ),
+        stat_info["assignment_totals"],
+    )
 
     ruleset_name = html.P(f"Regelset: {stat_info['ruleset_filename']}")
 
@@ -279,6 +283,14 @@ def create_stat_tab(
         start_collapsed=True,
     )
 
+    selections = [
+        stat_aggregate_utils.SELECTION_ACCEPTED,
+        stat_aggregate_utils.SELECTION_DENIED,
+        stat_aggregate_utils.SELECTION_COMBINATIONS,
+        stat_aggregate_utils.SELECTION_ENROLLED,
+        stat_aggregate_utils.SELECTION_SELF_DISENROLLED,
+    ]
+
     data_new_assignments = {
         "Status": [
             "Neue Zulassungen",
@@ -288,21 +300,8 @@ def create_stat_tab(
             "Insgesamt getätigte Selbstabmeldungen",
         ],
         "Anzahl": [
-            len(df_accepted_assignments),
-            len(df_denied_assignments),
-            len(df_accepted_lecture_combinations),
-            len(
-                df_assignments[
-                    df_assignments["status"]
-                    == consts.RULE_SETTING_STATUS_ENROLLED
-                ],
-            ),
-            len(
-                df_assignments[
-                    df_assignments["status"]
-                    == consts.RULE_SETTING_STATUS_SELF_DISENROLLED
-                ],
-            ),
+            stat_aggregate_utils.get_total(df_aggregates, selection)
+            for selection in selections
         ],
     }
 
@@ -338,26 +337,14 @@ def create_stat_tab(
             "Insgesamt getätigte Selbstabmeldungen",
         ],
         "Ø Fachsemester": [
-            round_mean_df_column(df_accepted_assignments, "fachsemester"),
-            round_mean_df_column(df_denied_assignments, "fachsemester"),
-            round_mean_df_column(
-                df_accepted_lecture_combinations,
-                "fachsemester",
-            ),
-            round_mean_df_column(
-                df_assignments[
-                    df_assignments["status"]
-                    == consts.RULE_SETTING_STATUS_ENROLLED
-                ],
-                "fachsemester",
-            ),
-            round_mean_df_column(
-                df_assignments[
-                    df_assignments["status"]
-                    == consts.RULE_SETTING_STATUS_SELF_DISENROLLED
-                ],
-                "fachsemester",
-            ),
+            round_mean(
+                stat_aggregate_utils.get_mean(
+                    df_aggregates,
+                    selection,
+                    "fachsemester",
+                ),
+            )
+            for selection in selections
         ],
     }
 
@@ -379,7 +366,11 @@ def create_stat_tab(
             ),
             dcc.Graph(
                 figure=layout_utils.create_barchart_for_rules(
-                    df_all_new_assignments,
+                    stat_aggregate_utils.get_counts(
+                        df_aggregates,
+                        stat_aggregate_utils.SELECTION_NEW,
+                        ["sortierwert", "status"],
+                    ),
                     stat_info,
                 ),
             ),
@@ -401,14 +392,17 @@ def create_stat_tab(
 def create_flex_piechart_figure(
     value_parameter: str,
     value_selector: str,
-    df_accepted_assignments,
-    df_denied_assignments,
-    df_accepted_lecture_combinations,
-    df_assignments,
-    all_new_assignments,
+    df_aggregates,
     database_name,
+    category_offset: int = 0,
 ):
-    """Create a piechart figure based on input dropdowns and dataframes."""
+    """Create a piechart figure based on input dropdowns and the aggregate
+    cube of a stat.
+
+    Only the values with the highest counts get their own slice, see
+    layout_utils.limit_chart_categories(). category_offset skips the highest
+    ranked values to show the values of the "other" slice.
+    """
     if value_parameter == "Anzahl Belegungen pro Status":
         column = "status"
     elif value_parameter == "Fachsemester":
@@ -429,37 +423,47 @@ def create_flex_piechart_figure(
         column = "studiumstyp"
 
     if value_selector == "für neue Zulassungen und Ablehnungen":
-        df = all_new_assignments
+        selection = stat_aggregate_utils.SELECTION_NEW
     elif value_selector == "für neue Zulassungen":
-        df = df_accepted_assignments
+        selection = stat_aggregate_utils.SELECTION_ACCEPTED
     elif value_selector == "für neue Ablehnungen":
-        df = df_denied_assignments
+        selection = stat_aggregate_utils.SELECTION_DENIED
     elif value_selector == "für neue Kombinationseinschreibungen":
-        df = df_accepted_lecture_combinations
+        selection = stat_aggregate_utils.SELECTION_COMBINATIONS
     elif value_selector == "für ausstehende Anmeldungen":
-        df = df_assignments[
-            df_assignments["status"] == consts.RULE_SETTING_STATUS_ENROLLED
-        ]
+        selection = stat_aggregate_utils.SELECTION_ENROLLED
     elif value_selector == "für insgesamt getätigte Selbstabmeldungen":
-        df = df_assignments[
-            df_assignments["status"]
-            == consts.RULE_SETTING_STATUS_SELF_DISENROLLED
-        ]
+        selection = stat_aggregate_utils.SELECTION_SELF_DISENROLLED
     if value_selector == "für gesamtes Semester und Vorselektion":
-        df = df_assignments
+        selection = stat_aggregate_utils.SELECTION_ASSIGNMENTS
+
+    flex_data = stat_aggregate_utils.get_counts(
+        df_aggregates,
+        selection,
+        [column],
+    )
 
-    if df.empty:
+    if flex_data.empty:
         # Show Empty piechart
         return px.pie(
             pd.DataFrame({"names": ["Keine Daten vorhanden"], "values": [1]}),
             names="names",
             values="values",
         )
-    df = layout_utils.expand_db_value_names(df, column, database_name)
+    flex_data = layout_utils.expand_db_value_names(
+        flex_data,
+        column,
+        database_name,
+    )
 
-    flex_data = df[column].value_counts().reset_index()
-    flex_data.columns = [column, "Anzahl"]
-    flex_data = flex_data.sort_values(by=[column])
+    # Values with the same full text are shown as one
+    flex_data = flex_data.groupby(column, sort=True)["Anzahl"].sum()
+    flex_data = flex_data.reset_index()
+    flex_data = layout_utils.limit_chart_categories(
+        flex_data,
+        column,
+        category_offset=category_offset,
+    )
 
     figure = go.Figure(
         layout={"template": consts.VISU_SETTING_PLOTLY_THEME},
@@ -471,10 +475,53 @@ def create_flex_piechart_figure(
         template=consts.VISU_SETTING_PLOTLY_THEME,
         category_orders={column: flex_data[column].tolist()},
         color_discrete_sequence=px.colors.qualitative.Bold,
+        custom_data=[layout_utils.COLUMN_DRILL_OFFSET],
     )
     figure.update_traces(
         textposition="inside", hoverinfo="label+value", textinfo="label+value"
     )
     figure.update_layout(separators=".")
+    if category_offset:
+        figure.update_layout(
+            title_text=f"Werte ab Rang {category_offset + 1}"
+            " (Klick auf einen Wert zeigt wieder die häufigsten Werte)",
+            title_font_size=12,
+        )
 
     return figure
+
+
+def get_flex_piechart_figure(
+    stat_keys: dict,
+    stat_letter: str,
+    value_parameter: str,
+    value_selector: str,
+    click_data=None,
+):
+    """Return the flex piechart figure of stat a or b, see
+    create_flex_piechart_figure(). Created once per stat and dropdown values.
+
+    click_data: clickData of the piechart, a click on the "other" slice shows
+    the values it holds. Only pass it if the click triggered the callback.
+    """
+    category_offset = layout_utils.get_drill_offset(click_data)
+
+    def create_figure():
+        stat_info, df_aggregates = get_stat_aggregates(stat_keys, stat_letter)
+        return create_flex_piechart_figure(
+            value_parameter,
+            value_selector,
+            df_aggregates,
+            stat_info["database_filename"],
+            category_offset,
+        )
+
+    return get_cached_figure(
+        stat_keys,
+        (stat_letter,),
+        "flex_piechart",
+        create_figure,
+        value_parameter,
+        value_selector,
+        category_offset,
+    )
@@ -1,8 +1,21 @@
 """Common data store for all layout tabs.
 
-This way stat data only needs to be loaded once. The common / global variable
-stat_data should be treated as read only when imported as manipulating this
-variable could result in race conditions.
+This way stat data only needs to be loaded once. Loaded stats are kept in
+stat_store, a least recently used cache shared by all sessions and bounded
+by the visualizer settings. Entries are keyed by stat name and modification
+time of the stat info file, so a stat that is simulated again gets loaded
+again. Callbacks only keep the keys of their stats in the dcc.Store
+"store-visualizer" and get the data via get_stat_data(). Stats opened by
+several sessions are loaded once, and two sessions can't overwrite each
+others stats. Loaded stat data must be treated as read only.
+
+Figures created from the stats are kept in figure_cache, keyed by the stat
+keys they show, so showing a chart again doesn't need to create it again.
+Entries of a stat are removed from both caches once its stat folder changed.
+
+A stat store entry starts with the stat info only. Its aggregates are
+loaded in a background thread on first access, see get_stat_part(), and
+count for the memory limit once they are loaded.
 
 Consideration:
 The native dash component dcc.Store can also save data between callbacks.
@@ -13,20 +26,42 @@ also aren't feasable because of size limitations when using big dataframes.
 Some dash apps load all their static data from dataframes when the program /
 server starts, avoiding dcc.Store entirely.
 In this app, the loaded data is chosen by the user so it needs to happen at
-runtime.
+runtime. Only the small aggregate cubes of the stat folders are loaded.
 """
 
+import os
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import dash_bootstrap_components as dbc
-import pandas as pd
 from dash import Input, Output, callback, html
 
 import utils.constants as consts
-from utils import db_utils, file_utils, rule_utils
+from utils import cache_utils, file_utils, rule_utils, stat_aggregate_utils
 from utils.logger import logger
 
-# Dict containing stat data that other files can import.
-# Only create_data_store() should ever write to or manipulate the data_store.
-data_store = {}
+# Loaded stat data of all sessions, see get_stat_data()
+stat_store = cache_utils.LRUCache(
+    max_entries=consts.VISU_SETTING_STAT_STORE_MAX_ENTRIES,
+    max_bytes=consts.VISU_SETTING_STAT_STORE_MAX_MB * 1024 * 1024,
+)
+stat_loader = ThreadPoolExecutor(
+    max_workers=consts.VISU_SETTING_STAT_STORE_LOADER_THREADS,
+    thread_name_prefix="stat_loader",
+)
+# Guards the start of loading a stat part, so every part is loaded once
+stat_parts_lock = threading.Lock()
+
+# Figures of all sessions, see get_cached_figure()
+figure_cache = cache_utils.LRUCache(
+    max_entries=consts.VISU_SETTING_FIGURE_CACHE_MAX_ENTRIES,
+    max_bytes=consts.VISU_SETTING_FIGURE_CACHE_MAX_MB * 1024 * 1024,
+)
+
+# Parts of a stat that get loaded on first access
+STAT_PART_AGGREGATES = "aggregates"
 
 loading_spinner = html.Div(
     [
@@ -44,73 +79,185 @@ loading_spinner = html.Div(
 )
 
 
-def create_data_store(stat_name: str, stat_suffix: str):
-    """Load stat folder by name into dict."""
-    logger.info(f"Visualizer Data Store lädt für '{stat_name}'...")
-    (
-        stat_info,
-        df_accepted_assignments,
-        df_denied_assignments,
-        df_accepted_lecture_combinations,
-        df_assignments,
-    ) = rule_utils.read_stat_files(stat_name)
-
-    if df_accepted_assignments.empty and df_denied_assignments.empty:
-        return None
-
-    # Add stat name and info to store
-    data_store[f"stat_name{stat_suffix}"] = stat_name
-    data_store[f"stat_info{stat_suffix}"] = stat_info
-
-    # Load students table to dataframe
-    database_name = stat_info["database_filename"]
-    df_students = db_utils.get_df(
-        database_name,
-        "studierende",
-        condition="_pk_semester",
-        condition_value=stat_info["assignment_semester"],
-    )
-    df_students = df_students.drop_duplicates(
-        subset="_pk_matrikelnummer", keep="first"
+def get_stat_letter(stat_index: int):
+    """Return the query string letter of a stat by its position: a, b, ...,
+    z, aa, ab, ...
+
+    Stat a and b get their own tabs, all stats are compared.
+    """
+    stat_letter = ""
+    stat_index += 1
+    while stat_index:
+        stat_index, letter_index = divmod(stat_index - 1, 26)
+        stat_letter = string.ascii_lowercase[letter_index] + stat_letter
+
+    return stat_letter
+
+
+def get_stat_names(search: str):
+    """Return the stat names of the query string per letter, in query string
+    order.
+    """
+    return {
+        parameter.removeprefix("stat_"): "".join(stat_name)
+        for parameter, stat_name in file_utils.get_query_string_params(
+            search,
+        ).items()
+        if parameter.startswith("stat_")
+    }
+
+
+def get_stat_key(stat_name: str):
+    """Return the store key of a stat folder.
+
+    Kept as list, so it can be saved in a dcc.Store.
+    """
+    stat_info_path = Path(
+        consts.FOLDER_STAT_FILES,
+        stat_name,
+        consts.FILENAME_STAT_INFO,
     )
+    return [stat_name, os.stat(stat_info_path).st_mtime_ns]
+
+
+def load_stat_data(stat_name: str):
+    """Load the stat info of a stat folder by name into dict.
 
-    # Merge student columns to each dataframe
-    student_columns = [
-        "_pk_matrikelnummer",
-        "hoererstatus",
-        "studiumsart",
-        "studiumstyp",
-    ]
-
-    dataframes = {
-        "df_accepted_assignments": df_accepted_assignments,
-        "df_denied_assignments": df_denied_assignments,
-        "df_accepted_lecture_combinations": df_accepted_lecture_combinations,
-        "df_assignments": df_assignments,
-        "df_all_new_assignments": pd.concat(
-            [
-                df_accepted_assignments,
-                df_denied_assignments,
-            ],
+    Aggregates are added as future to "parts" when they are first accessed.
+    """
+    stat_folder = file_utils.get_folder(
+        Path(consts.FOLDER_STAT_FILES, stat_name),
+    )
+    return {
+        "stat_name": stat_name,
+        "stat_info": file_utils.read_json(
+            stat_folder,
+            consts.FILENAME_STAT_INFO,
         ),
+        "parts": {},
     }
 
-    for name, df in dataframes.items():
-        if not df.empty:
-            df = df.merge(
-                df_students[student_columns],
-                left_on="matrikelnummer",
-                right_on="_pk_matrikelnummer",
-                how="left",
+
+def load_stat_part(stat_name: str, part: str):
+    """Load a part of a stat folder.
+
+    All charts are created from the aggregates, see stat_aggregate_utils.
+    They are returned with the stat info that belongs to them.
+    """
+    if part != STAT_PART_AGGREGATES:
+        raise ValueError(f"Unbekannter Teil '{part}' einer Statistik.")
+
+    logger.info(f"Visualizer Data Store lädt '{part}' für '{stat_name}'...")
+    return rule_utils.read_stat_aggregates(stat_name)
+
+
+def get_stat_data(stat_keys: dict, stat_letter: str):
+    """Return the stat store entry of a stat, loading it if it isn't in
+    the stat store (anymore).
+
+    stat_keys: data of the dcc.Store "store-visualizer"
+    """
+    stat_name, stat_mtime = stat_keys[stat_letter]
+    return stat_store.get_or_load(
+        (stat_name, stat_mtime),
+        lambda: load_stat_data(stat_name),
+    )
+
+
+def update_stat_store_size(stat_key: tuple, stat_data: dict):
+    """Add a stat again, so its loaded parts count for the memory limit."""
+    if stat_store.get(stat_key) is stat_data:
+        stat_store.put(stat_key, stat_data)
+
+
+def start_loading_stat_part(stat_keys: dict, stat_letter: str, part: str):
+    """Start loading a part of a stat in the background if it isn't
+    loaded or loading yet. Returns the future of the part.
+    """
+    stat_key = tuple(stat_keys[stat_letter])
+    stat_data = get_stat_data(stat_keys, stat_letter)
+
+    with stat_parts_lock:
+        future = stat_data["parts"].get(part)
+        # Failed loads are tried again
+        if future is None or (future.done() and future.exception()):
+            future = stat_loader.submit(
+                load_stat_part,
+                stat_data["stat_name"],
+                part,
+            )
+            stat_data["parts"][part] = future
+            future.add_done_callback(
+                lambda _: update_stat_store_size(stat_key, stat_data),
             )
-        data_store[f"{name}{stat_suffix}"] = df
 
-    logger.info(f"Visualizer Data Store für '{stat_name}' fertig geladen.")
-    return data_store
+    return future
+
+
+def get_stat_part(stat_keys: dict, stat_letter: str, part: str):
+    """Return a part of a stat, waiting for it if it's still loading.
+
+    part: STAT_PART_AGGREGATES
+    """
+    return start_loading_stat_part(stat_keys, stat_letter, part).result()
+
+
+def get_stat_aggregates(stat_keys: dict, stat_letter: str):
+    """Return the stat info and aggregates of a stat."""
+    return get_stat_part(stat_keys, stat_letter, STAT_PART_AGGREGATES)
+
+
+def get_cached_figure(
+    stat_keys: dict,
+    stat_letters,
+    figure_name: str,
+    create_function,
+    *values,
+):
+    """Return a figure of one or more stats, created once per stat keys,
+    chosen values and plotly theme. Returned figures must not be changed.
+
+    stat_letters: letters of the stats the figure is created from
+    create_function: function without arguments that creates the figure
+    """
+    cache_key = (
+        figure_name,
+        tuple(tuple(stat_keys[stat_letter]) for stat_letter in stat_letters),
+        values,
+        consts.VISU_SETTING_PLOTLY_THEME,
+    )
+
+    def create_figure():
+        figure = create_function()
+        # Size of the figure sent to the browser by the callback
+        figure_size = len(figure.to_json())
+        logger.info(
+            f"Diagramm '{figure_name}' {values} erstellt:"
+            f" {figure_size / 1024:.1f} KB.",
+        )
+        return figure
+
+    return figure_cache.get_or_load(cache_key, create_figure)
+
+
+def remove_outdated_stat_entries(stat_key: list):
+    """Remove the stat store entries and figures of older versions of a
+    stat folder.
+    """
+    stat_name, stat_mtime = stat_key
+
+    def is_outdated(key):
+        return key[0] == stat_name and key[1] != stat_mtime
+
+    stat_store.invalidate(is_outdated)
+    figure_cache.invalidate(
+        lambda cache_key: any(is_outdated(key) for key in cache_key[1]),
+    )
 
 
 @callback(
     Output("data-store-loaded-check", "hidden"),
+    Output("store-visualizer", "data"),
     Output("spinner-visualizer-data-store", "children"),
     Output("alert-visualizer", "is_open"),
     Output("alert-visualizer", "children"),
@@ -121,56 +268,38 @@ def load_stats_into_store(
     search,
     pathname,
 ):
-    """Load stats into store dict depending on stat names in query string.
+    """Load stats into the stat store depending on stat names in query
+    string and keep their keys for the other callbacks.
 
     Activates on page load by checking query string for stat names.
     """
     if search and pathname == consts.PAGE_VISUALIZER_URL:
-        stat_name_a = file_utils.get_query_string(search, "stat_a")
-        stat_name_b = file_utils.get_query_string(search, "stat_b")
-        # Use data_store declared outisde of this function
-        global data_store
-
-        if stat_name_a:
-            data_store = create_data_store(stat_name_a, "_a")
-            if data_store is None:
-                return (
-                    False,
-                    "",
-                    True,
-                    f"{stat_name_a} hat keine neuen Einschreibungen, daher kann nichts visualisiert werden.",
-                )
-
-            data_store.update(data_store)
+        stat_keys = {}
+        for stat_letter, stat_name in get_stat_names(search).items():
+            stat_keys[stat_letter] = get_stat_key(stat_name)
+            remove_outdated_stat_entries(stat_keys[stat_letter])
+            # Aggregates of all stats are loaded at the same time
+            start_loading_stat_part(
+                stat_keys,
+                stat_letter,
+                STAT_PART_AGGREGATES,
+            )
 
-        if stat_name_b:
-            data_store_b = create_data_store(stat_name_b, "_b")
-            if data_store_b is None:
+        for stat_letter in stat_keys:
+            _, df_aggregates = get_stat_aggregates(stat_keys, stat_letter)
+            if not stat_aggregate_utils.get_total(
+                df_aggregates,
+                stat_aggregate_utils.SELECTION_NEW,
+            ):
                 return (
                     False,
+                    None,
                     "",
                     True,
-                    f"{stat_name_b} hat keine neuen Einschreibungen, daher kann nichts visualisiert werden.",
+                    f"{stat_keys[stat_letter][0]} hat keine neuen Einschreibungen, daher kann nichts visualisiert werden.",
                 )
 
-            data_store.update(data_store_b)
-
-            # Pre-calculate a common dataframe for a and b
-            df_all_new_assignments_a = data_store["df_all_new_assignments_a"]
-            df_all_new_assignments_b = data_store["df_all_new_assignments_b"]
-            df_all_new_assignments_a["Statistik"] = stat_name_a
-            df_all_new_assignments_b["Statistik"] = stat_name_b
-
-            df_all_new_assignments_a_b = pd.concat(
-                [df_all_new_assignments_a, df_all_new_assignments_b],
-            )
-            df_all_new_assignments_a_b.reset_index(drop=True, inplace=True)
-            data_store["df_all_new_assignments_a_b"] = (
-                df_all_new_assignments_a_b
-            )
-
-            logger.info("Data Store geladen.")
-
-        return True, "", False, ""
+        logger.info("Data Store geladen.")
+        return True, stat_keys, "", False, ""
 
-    return False, "", False, ""
+    return False, None, "", False, ""
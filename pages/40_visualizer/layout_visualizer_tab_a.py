@@ -1,18 +1,18 @@
 """Accordion with information only regarding stat tab a."""
 
 import dash_bootstrap_components as dbc
-from dash import Input, Output, callback, dcc, html
+from dash import Input, Output, State, callback, ctx, dcc, html
 
 import utils.constants as consts
 from utils import file_utils
 
 from .layout_visualizer_common_functions import (
-    create_flex_piechart_figure,
     create_stat_tab,
+    get_flex_piechart_figure,
     options_piechart_parameter,
     options_piechart_selector,
 )
-from .layout_visualizer_data_store import data_store
+from .layout_visualizer_data_store import get_stat_aggregates
 
 tab_overview_a = html.Div(id="div-stat-tab-a")
 
@@ -140,18 +140,16 @@ def show_accordion_tab_a(
 @callback(
     Output("div-stat-tab-a", "children"),
     Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
 )
-def create_stat_tab_a(data_store_loaded):
+def create_stat_tab_a(data_store_loaded, stat_keys):
     """Create static tab elements via function."""
     if data_store_loaded:
+        stat_info_a, df_aggregates_a = get_stat_aggregates(stat_keys, "a")
         stat_tab = create_stat_tab(
-            data_store["stat_name_a"],
-            data_store["stat_info_a"],
-            data_store["df_accepted_assignments_a"],
-            data_store["df_denied_assignments_a"],
-            data_store["df_accepted_lecture_combinations_a"],
-            data_store["df_assignments_a"],
-            data_store["df_all_new_assignments_a"],
+            stat_keys["a"][0],
+            stat_info_a,
+            df_aggregates_a,
         )
         return stat_tab
 
@@ -204,23 +202,27 @@ def set_flex_piechart_options_a(data_store_loaded):
     Input("piechart-flex-parameter-a-l", "value"),
     Input("piechart-flex-selector-a-l", "value"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-a-l", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figure_tab_a_l(
     value_parameter_l,
     value_selector_l,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     """Create left flex piechart figure."""
     if value_selector_l and data_store_loaded:
-        figure_l = create_flex_piechart_figure(
+        # Changed dropdowns show the values with the highest counts
+        if ctx.triggered_id != "piechart-flex-a-l":
+            click_data = None
+        figure_l = get_flex_piechart_figure(
+            stat_keys,
+            "a",
             value_parameter_l,
             value_selector_l,
-            data_store["df_accepted_assignments_a"],
-            data_store["df_denied_assignments_a"],
-            data_store["df_accepted_lecture_combinations_a"],
-            data_store["df_assignments_a"],
-            data_store["df_all_new_assignments_a"],
-            data_store["stat_info_a"]["database_filename"]
+            click_data,
         )
 
         return figure_l, ""
@@ -233,23 +235,27 @@ def create_flex_piechart_figure_tab_a_l(
     Input("piechart-flex-parameter-a-r", "value"),
     Input("piechart-flex-selector-a-r", "value"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-a-r", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figures_tab_a(
     value_parameter_r,
     value_selector_r,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     """Create right flex piechart figure."""
     if value_selector_r and data_store_loaded:
-        figure_r = create_flex_piechart_figure(
+        # Changed dropdowns show the values with the highest counts
+        if ctx.triggered_id != "piechart-flex-a-r":
+            click_data = None
+        figure_r = get_flex_piechart_figure(
+            stat_keys,
+            "a",
             value_parameter_r,
             value_selector_r,
-            data_store["df_accepted_assignments_a"],
-            data_store["df_denied_assignments_a"],
-            data_store["df_accepted_lecture_combinations_a"],
-            data_store["df_assignments_a"],
-            data_store["df_all_new_assignments_a"],
-            data_store["stat_info_a"]["database_filename"]
+            click_data,
         )
 
         return figure_r, ""
@@ -6,18 +6,18 @@ Unreasonable to be solved programmatically layout-wise.
 """
 
 import dash_bootstrap_components as dbc
-from dash import Input, Output, callback, dcc, html
+from dash import Input, Output, State, callback, ctx, dcc, html
 
 import utils.constants as consts
 from utils import file_utils
 
 from .layout_visualizer_common_functions import (
-    create_flex_piechart_figure,
     create_stat_tab,
+    get_flex_piechart_figure,
     options_piechart_parameter,
     options_piechart_selector,
 )
-from .layout_visualizer_data_store import data_store
+from .layout_visualizer_data_store import get_stat_aggregates
 
 tab_overview_b = html.Div(id="div-stat-tab-b")
 
@@ -150,25 +150,24 @@ def show_accordion_tab_b(
     Input("url-visualizer", "search"),
     Input("url-visualizer", "pathname"),
     Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
 )
 def create_stat_tab_b(
     search,
     pathname,
     data_store_loaded,
+    stat_keys,
 ):
     """Create static tab elements via function."""
     if search and pathname == consts.PAGE_VISUALIZER_URL and data_store_loaded:
         stat_name_b = file_utils.get_query_string(search, "stat_b")
 
         if stat_name_b:
+            stat_info_b, df_aggregates_b = get_stat_aggregates(stat_keys, "b")
             stat_tab = create_stat_tab(
-                data_store["stat_name_b"],
-                data_store["stat_info_b"],
-                data_store["df_accepted_assignments_b"],
-                data_store["df_denied_assignments_b"],
-                data_store["df_accepted_lecture_combinations_b"],
-                data_store["df_assignments_b"],
-                data_store["df_all_new_assignments_b"],
+                stat_keys["b"][0],
+                stat_info_b,
+                df_aggregates_b,
             )
             return stat_tab
 
@@ -223,6 +222,8 @@ def set_flex_piechart_options_b(data_store_loaded):
     Input("url-visualizer", "search"),
     Input("url-visualizer", "pathname"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-b-l", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figure_tab_b_l(
     value_parameter_l,
@@ -230,6 +231,8 @@ def create_flex_piechart_figure_tab_b_l(
     search,
     pathname,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     """Create left flex piechart figure."""
     if (
@@ -241,15 +244,15 @@ def create_flex_piechart_figure_tab_b_l(
         stat_name_b = file_utils.get_query_string(search, "stat_b")
 
         if stat_name_b:
-            figure_l = create_flex_piechart_figure(
+            # Changed dropdowns show the values with the highest counts
+            if ctx.triggered_id != "piechart-flex-b-l":
+                click_data = None
+            figure_l = get_flex_piechart_figure(
+                stat_keys,
+                "b",
                 value_parameter_l,
                 value_selector_l,
-                data_store["df_accepted_assignments_b"],
-                data_store["df_denied_assignments_b"],
-                data_store["df_accepted_lecture_combinations_b"],
-                data_store["df_assignments_b"],
-                data_store["df_all_new_assignments_b"],
-                data_store["stat_info_b"]["database_filename"]
+                click_data,
             )
 
             return figure_l, ""
@@ -264,6 +267,8 @@ def create_flex_piechart_figure_tab_b_l(
     Input("url-visualizer", "search"),
     Input("url-visualizer", "pathname"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-b-r", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figure_tab_b_r(
     value_parameter_r,
@@ -271,6 +276,8 @@ def create_flex_piechart_figure_tab_b_r(
     search,
     pathname,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     """Create right flex piechart figure."""
     if (
@@ -282,15 +289,15 @@ def create_flex_piechart_figure_tab_b_r(
         stat_name_b = file_utils.get_query_string(search, "stat_b")
 
         if stat_name_b:
-            figure_r = create_flex_piechart_figure(
+            # Changed dropdowns show the values with the highest counts
+            if ctx.triggered_id != "piechart-flex-b-r":
+                click_data = None
+            figure_r = get_flex_piechart_figure(
+                stat_keys,
+                "b",
                 value_parameter_r,
                 value_selector_r,
-                data_store["df_accepted_assignments_b"],
-                data_store["df_denied_assignments_b"],
-                data_store["df_accepted_lecture_combinations_b"],
-                data_store["df_assignments_b"],
-                data_store["df_all_new_assignments_b"],
-                data_store["stat_info_b"]["database_filename"]
+                click_data,
             )
 
             return figure_r, ""
@@ -1,20 +1,34 @@
 """Accordion that has multiple charts showing stat comparisons."""
 
+import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import Input, Output, callback, dcc, html
+from dash import Input, Output, State, callback, ctx, dcc, html
 
 import utils.constants as consts
 from utils import file_utils
-from utils import layout_utils
+from utils import layout_utils, stat_aggregate_utils
 
 from .layout_visualizer_common_functions import (
-    create_flex_piechart_figure,
+    get_flex_piechart_figure,
     options_piechart_parameter,
     options_piechart_selector,
 )
-from .layout_visualizer_data_store import data_store
+from .layout_visualizer_data_store import (
+    get_cached_figure,
+    get_stat_aggregates,
+    get_stat_data,
+)
+from .model_visualizer_outcome_diff import (
+    COLUMN_STATUS_A,
+    COLUMN_STATUS_B,
+    KEY_ASSIGNMENT_ID,
+    KEY_STUDENT_LECTURE,
+    get_changed_rows_page,
+    get_outcome_diff,
+)
 
 barchart_rule_comparison = html.Div(
     [
@@ -140,6 +154,55 @@ flex_piecharts_comparison = html.Div(
     ],
 )
 
+outcome_diff_comparison = html.Div(
+    [
+        html.H5("Veränderte Ergebnisse je Belegung", className="mt-5"),
+        html.P(
+            "Statuswechsel jeder Belegung von Statistik A zu Statistik B."
+            " \"-\" steht für Belegungen, die nur in einer der beiden"
+            " Statistiken vorkommen.",
+        ),
+        dbc.RadioItems(
+            id="radio-outcome-diff-key",
+            options=[
+                {
+                    "label": "Abgleich über Belegungs-ID",
+                    "value": KEY_ASSIGNMENT_ID,
+                },
+                {
+                    "label": "Abgleich über Matrikelnummer und Veranstaltung",
+                    "value": KEY_STUDENT_LECTURE,
+                },
+            ],
+            value=KEY_ASSIGNMENT_ID,
+            inline=True,
+        ),
+        dbc.Spinner(html.Div(id="spinner-outcome-diff")),
+        html.Div(id="div-outcome-diff-transitions", className="mt-3"),
+        dag.AgGrid(
+            id="grid-outcome-diff-changed",
+            className="ag-theme-alpine",
+            columnDefs=[
+                {"field": "_pk_id", "headerName": "Belegungs-ID"},
+                {"field": "matrikelnummer", "headerName": "Matrikelnummer"},
+                {"field": "veranstaltungs_id", "headerName": "Veranstaltung"},
+                {"field": COLUMN_STATUS_A, "headerName": "Status A"},
+                {"field": COLUMN_STATUS_B, "headerName": "Status B"},
+            ],
+            rowData=[],
+            columnSize="sizeToFit",
+            style={"height": 400},
+        ),
+        dbc.Pagination(
+            id="pagination-outcome-diff",
+            max_value=1,
+            active_page=1,
+            fully_expanded=False,
+            className="mt-2",
+        ),
+    ],
+)
+
 tab_comparison = html.Div(
     dbc.Accordion(
         [
@@ -151,8 +214,10 @@ tab_comparison = html.Div(
                     html.Hr(),
                     flex_piecharts_comparison,
                     html.Hr(),
+                    outcome_diff_comparison,
+                    html.Hr(),
                 ],
-                title="Vergleich beider Statistiken",
+                title="Vergleich der Statistiken",
                 id="accordion-stat-tab-comparison",
                 style={"display": "none"},
             ),
@@ -163,6 +228,142 @@ tab_comparison = html.Div(
 )
 
 
+def get_new_assignment_counts(stat_keys: dict, columns: list):
+    """Return the number of new assignments of all loaded stats per value of
+    the given columns. Column "Statistik" holds the stat name.
+
+    Only the counts of every stat are stacked, so comparing many stats costs
+    about as much as comparing two.
+    """
+    counts_per_stat = []
+    for stat_letter in stat_keys:
+        _, df_aggregates = get_stat_aggregates(stat_keys, stat_letter)
+        df_counts = stat_aggregate_utils.get_counts(
+            df_aggregates,
+            stat_aggregate_utils.SELECTION_NEW,
+            columns,
+        )
+        df_counts["Statistik"] = stat_keys[stat_letter][0]
+        counts_per_stat.append(df_counts)
+
+    return pd.concat(counts_per_stat, ignore_index=True)
+
+
+def create_barchart_rule_comparison(stat_keys: dict):
+    """Create a barchart figure showing count of statuses per rule."""
+    # Count per status and rule number
+    assignments_per_rule = get_new_assignment_counts(
+        stat_keys,
+        ["sortierwert", "status"],
+    )
+
+    assignments_per_rule = assignments_per_rule.sort_values(
+        by=["Statistik", "status"], ascending=True
+    )
+
+    assignments_per_rule["text"] = (
+        assignments_per_rule["status"]
+        + ": "
+        + assignments_per_rule["Anzahl"].astype(str)
+    )
+
+    figure = go.Figure(
+        layout=dict(template=consts.VISU_SETTING_PLOTLY_THEME),
+    )
+    figure = px.bar(
+        assignments_per_rule,
+        x="sortierwert",
+        labels={"sortierwert": "Regelwert"},
+        y="Anzahl",
+        color="Statistik",
+        barmode="group",
+        text="text",
+        color_discrete_sequence=px.colors.qualitative.D3,
+    )
+    figure.update_traces(textposition="inside")
+
+    return figure
+
+
+def create_flex_barchart_comparison(
+    stat_keys: dict,
+    value_selector: str,
+    category_offset: int = 0,
+):
+    """Create a barchart figure of new assignments of all loaded stats per
+    value of the chosen column.
+
+    Only the values with the highest counts get their own bars, see
+    layout_utils.limit_chart_categories().
+    """
+    if value_selector == "Fachsemester":
+        column = "fachsemester"
+    elif value_selector == "Studiengänge":
+        column = "studiengangs_id"
+    elif value_selector == "Gruppen":
+        column = "gruppen_id"
+    elif value_selector == "Erstbelegungen":
+        column = "erstbelegung"
+    elif value_selector == "Hörerstatus":
+        column = "hoererstatus"
+    elif value_selector == "Studiumsart":
+        column = "studiumsart"
+    elif value_selector == "Studiumstyp":
+        column = "studiumstyp"
+
+    df_new_assignments = layout_utils.expand_db_value_names(
+        get_new_assignment_counts(stat_keys, [column, "status"]),
+        column,
+        get_stat_data(stat_keys, "a")["stat_info"]["database_filename"],
+    )
+
+    # Values with the same full text are shown as one
+    df_new_assignments = (
+        df_new_assignments.groupby([column, "status", "Statistik"])["Anzahl"]
+        .sum()
+        .reset_index()
+    )
+    df_new_assignments = layout_utils.limit_chart_categories(
+        df_new_assignments,
+        column,
+        group_columns=["status", "Statistik"],
+        category_offset=category_offset,
+    )
+
+    df_new_assignments = df_new_assignments.sort_values(
+        by=["Statistik", "status"], ascending=True
+    )
+
+    df_new_assignments["text"] = (
+        df_new_assignments["status"]
+        + ": "
+        + df_new_assignments["Anzahl"].astype(str)
+    )
+
+    figure = px.bar(
+        df_new_assignments,
+        x=column,
+        labels={value_selector: column},
+        y="Anzahl",
+        color="Statistik",  # Use the new column for color
+        barmode="group",
+        template=consts.VISU_SETTING_PLOTLY_THEME,
+        text="text",
+        color_discrete_sequence=px.colors.qualitative.Bold,
+        height = 500,
+        custom_data=[layout_utils.COLUMN_DRILL_OFFSET],
+    )
+    figure.update_traces(textposition="inside")
+    if category_offset:
+        figure.update_layout(
+            title_text=f"Werte ab Rang {category_offset + 1}"
+            " (Klick auf einen Wert zeigt wieder die häufigsten Werte)",
+            title_font_size=12,
+        )
+
+    return figure
+
+
 @callback(
     Output("accordion-stat-tab-comparison", "style"),
     Input("url-visualizer", "search"),
@@ -192,11 +393,13 @@ def show_accordion_tab_comparison(
     Input("url-visualizer", "search"),
     Input("url-visualizer", "pathname"),
     Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
 )
 def create_barchart_figure_rule_comparison(
     search,
     pathname,
     data_store_loaded,
+    stat_keys,
 ):
     """Create a barchart figure showing count of statuses per rule."""
     if search and pathname == consts.PAGE_VISUALIZER_URL and data_store_loaded:
@@ -204,47 +407,13 @@ def create_barchart_figure_rule_comparison(
         stat_name_b = file_utils.get_query_string(search, "stat_b")
 
         if stat_name_a and stat_name_b:
-            df_all_new_assignments_a_b = data_store[
-                "df_all_new_assignments_a_b"
-            ]
-
-            # Group status and rule number
-            assignments_per_rule = (
-                df_all_new_assignments_a_b.groupby(
-                    ["sortierwert", "status", "Statistik"],
-                )
-                .size()
-                .reset_index(name="Anzahl")
-                .copy()
-            )
-
-            assignments_per_rule = assignments_per_rule.sort_values(
-                by=["Statistik", "status"], ascending=True
+            return get_cached_figure(
+                stat_keys,
+                tuple(stat_keys),
+                "barchart_rule_comparison",
+                lambda: create_barchart_rule_comparison(stat_keys),
             )
 
-            assignments_per_rule["text"] = (
-                assignments_per_rule["status"]
-                + ": "
-                + assignments_per_rule["Anzahl"].astype(str)
-            )
-
-            figure = go.Figure(
-                layout=dict(template=consts.VISU_SETTING_PLOTLY_THEME),
-            )
-            figure = px.bar(
-                assignments_per_rule,
-                x="sortierwert",
-                labels={"sortierwert": "Regelwert"},
-                y="Anzahl",
-                color="Statistik",
-                barmode="group",
-                text="text",
-                color_discrete_sequence=px.colors.qualitative.D3,
-            )
-            figure.update_traces(textposition="inside")
-
-            return figure
-
     return None
 
 
@@ -287,63 +456,34 @@ def set_flex_barchart_options_comparison(search, pathname):
     Output("spinner-barchart-flex-comparison", "children"),
     Input("barchart-flex-selector-comparison", "value"),
     Input("data-store-loaded-check", "hidden"),
+    Input("barchart-flex-comparison", "clickData"),
+    State("store-visualizer", "data"),
 )
-def create_flex_barchart_comparison_figure(value_selector, data_store_loaded):
+def create_flex_barchart_comparison_figure(
+    value_selector,
+    data_store_loaded,
+    click_data,
+    stat_keys,
+):
     """Create a barchart figure with user chosen data."""
     if value_selector and data_store_loaded:
-        df_all_new_assignments_a_b = data_store["df_all_new_assignments_a_b"]
-
-        if value_selector == "Fachsemester":
-            column = "fachsemester"
-        elif value_selector == "Studiengänge":
-            column = "studiengangs_id"
-        elif value_selector == "Gruppen":
-            column = "gruppen_id"
-        elif value_selector == "Erstbelegungen":
-            column = "erstbelegung"
-        elif value_selector == "Hörerstatus":
-            column = "hoererstatus"
-        elif value_selector == "Studiumsart":
-            column = "studiumsart"
-        elif value_selector == "Studiumstyp":
-            column = "studiumstyp"
-
-        df_all_new_assignments_a_b = layout_utils.expand_db_value_names(
-            df_all_new_assignments_a_b,
-            column,
-            data_store["stat_info_a"]["database_filename"],
-        )
-
-        df_all_new_assignments_a_b = (
-            df_all_new_assignments_a_b.groupby([column, "status", "Statistik"])
-            .size()
-            .reset_index(name="Anzahl")
-            .copy()
-        )
-
-        df_all_new_assignments_a_b = df_all_new_assignments_a_b.sort_values(
-            by=["Statistik", "status"], ascending=True
-        )
-
-        df_all_new_assignments_a_b["text"] = (
-            df_all_new_assignments_a_b["status"]
-            + ": "
-            + df_all_new_assignments_a_b["Anzahl"].astype(str)
-        )
-
-        figure = px.bar(
-            df_all_new_assignments_a_b,
-            x=column,
-            labels={value_selector: column},
-            y="Anzahl",
-            color="Statistik",  # Use the new column for color
-            barmode="group",
-            template=consts.VISU_SETTING_PLOTLY_THEME,
-            text="text",
-            color_discrete_sequence=px.colors.qualitative.Bold,
-            height = 500
+        # Only a click on the "other" bars shows the values they hold
+        category_offset = 0
+        if ctx.triggered_id == "barchart-flex-comparison":
+            category_offset = layout_utils.get_drill_offset(click_data)
+
+        figure = get_cached_figure(
+            stat_keys,
+            tuple(stat_keys),
+            "barchart_flex_comparison",
+            lambda: create_flex_barchart_comparison(
+                stat_keys,
+                value_selector,
+                category_offset,
+            ),
+            value_selector,
+            category_offset,
         )
-        figure.update_traces(textposition="inside")
 
         return figure, ""
     return None, ""
@@ -403,23 +543,27 @@ def set_flex_piechart_comparison_options(search, pathname):
     Input("piechart-flex-parameter-comparison-l", "value"),
     Input("piechart-flex-selector-comparison-l", "value"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-comparison-l", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figure_comparison_l(
     value_parameter,
     value_selector,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     if value_selector and data_store_loaded:
         """Create left flex piechart figure, for stat a."""
-        figure = create_flex_piechart_figure(
+        # Changed dropdowns show the values with the highest counts
+        if ctx.triggered_id != "piechart-flex-comparison-l":
+            click_data = None
+        figure = get_flex_piechart_figure(
+            stat_keys,
+            "a",
             value_parameter,
             value_selector,
-            data_store["df_accepted_assignments_a"],
-            data_store["df_denied_assignments_a"],
-            data_store["df_accepted_lecture_combinations_a"],
-            data_store["df_assignments_a"],
-            data_store["df_all_new_assignments_a"],
-            data_store["stat_info_a"]["database_filename"],
+            click_data,
         )
 
         return figure, ""
@@ -433,24 +577,117 @@ def create_flex_piechart_figure_comparison_l(
     Input("piechart-flex-parameter-comparison-r", "value"),
     Input("piechart-flex-selector-comparison-r", "value"),
     Input("data-store-loaded-check", "hidden"),
+    Input("piechart-flex-comparison-r", "clickData"),
+    State("store-visualizer", "data"),
 )
 def create_flex_piechart_figure_comparison_r(
     value_parameter,
     value_selector,
     data_store_loaded,
+    click_data,
+    stat_keys,
 ):
     if value_selector and data_store_loaded:
         """Create right flex piechart figure, for stat b."""
-        figure = create_flex_piechart_figure(
+        # Changed dropdowns show the values with the highest counts
+        if ctx.triggered_id != "piechart-flex-comparison-r":
+            click_data = None
+        figure = get_flex_piechart_figure(
+            stat_keys,
+            "b",
             value_parameter,
             value_selector,
-            data_store["df_accepted_assignments_b"],
-            data_store["df_denied_assignments_b"],
-            data_store["df_accepted_lecture_combinations_b"],
-            data_store["df_assignments_b"],
-            data_store["df_all_new_assignments_b"],
-            data_store["stat_info_b"]["database_filename"],
+            click_data,
         )
 
         return figure, ""
     return None, ""
+
+
+@callback(
+    Output("div-outcome-diff-transitions", "children"),
+    Output("pagination-outcome-diff", "max_value"),
+    Output("pagination-outcome-diff", "active_page"),
+    Output("spinner-outcome-diff", "children"),
+    Input("radio-outcome-diff-key", "value"),
+    Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
+)
+def create_outcome_diff_transitions(key_type, data_store_loaded, stat_keys):
+    """Show how many assignments changed from which status in stat a to
+    which status in stat b.
+    """
+    if key_type and data_store_loaded and "b" in stat_keys:
+        outcome_diff = get_outcome_diff(
+            stat_keys["a"],
+            stat_keys["b"],
+            key_type,
+        )
+        if outcome_diff is None:
+            return (
+                html.P(
+                    "Die Statistiken haben unterschiedliche Datenbank-IDs"
+                    " oder Semester und können nicht je Belegung verglichen"
+                    " werden.",
+                ),
+                1,
+                1,
+                "",
+            )
+
+        df_transitions = outcome_diff["df_transitions"]
+        df_transitions = df_transitions.rename_axis(
+            index="Status A / Status B",
+            columns=None,
+        ).reset_index()
+        _, page_count = get_changed_rows_page(
+            outcome_diff["df_changed"],
+            1,
+            consts.VISU_SETTING_OUTCOME_DIFF_PAGE_SIZE,
+        )
+
+        return (
+            [
+                dbc.Table.from_dataframe(
+                    df_transitions,
+                    bordered=True,
+                    size="sm",
+                ),
+                html.P(
+                    f"{len(outcome_diff['df_changed'])} von"
+                    f" {outcome_diff['assignment_count']} Belegungen haben"
+                    " einen anderen Status.",
+                ),
+            ],
+            page_count,
+            1,
+            "",
+        )
+
+    return None, 1, 1, ""
+
+
+@callback(
+    Output("grid-outcome-diff-changed", "rowData"),
+    Input("pagination-outcome-diff", "active_page"),
+    Input("radio-outcome-diff-key", "value"),
+    Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
+)
+def show_outcome_diff_page(page, key_type, data_store_loaded, stat_keys):
+    """Show one page of assignments with a different status in both stats."""
+    if page and key_type and data_store_loaded and "b" in stat_keys:
+        outcome_diff = get_outcome_diff(
+            stat_keys["a"],
+            stat_keys["b"],
+            key_type,
+        )
+        if outcome_diff is not None:
+            df_page, _ = get_changed_rows_page(
+                outcome_diff["df_changed"],
+                page,
+                consts.VISU_SETTING_OUTCOME_DIFF_PAGE_SIZE,
+            )
+            return df_page.to_dict("records")
+
+    return []
@@ -3,9 +3,9 @@
 from pathlib import Path
 
 import dash_bootstrap_components as dbc
-from dash import Input, Output, callback, html
+from dash import Input, Output, State, callback, html
 
-from .layout_visualizer_data_store import data_store
+from .layout_visualizer_data_store import get_stat_data
 
 tab_overview = html.Div(id="div-visualizer-overview")
 
@@ -13,8 +13,9 @@ tab_overview = html.Div(id="div-visualizer-overview")
 @callback(
     Output("div-visualizer-overview", "children"),
     Input("data-store-loaded-check", "hidden"),
+    State("store-visualizer", "data"),
 )
-def create_stat_overview(data_store_loaded):
+def create_stat_overview(data_store_loaded, stat_keys):
     """Create a stat overview consinsting of simple text info
     regarding both rulesets.
 
@@ -23,7 +24,7 @@ def create_stat_overview(data_store_loaded):
         # Data in here is common between both datasets.
         # Use a, because a is always present.
         # Both datasets can differ
-        stat_info = data_store["stat_info_a"]
+        stat_info = get_stat_data(stat_keys, "a")["stat_info"]
 
         database_name = Path(stat_info["database_filename"]).stem
         database_id = stat_info["database_id"]
@@ -0,0 +1,314 @@
+"""Functions to compare the outcome of every assignment between two stats.
+
+Both stats are aligned on their assignment snapshots, either by assignment
+id or by matriculation number and lecture. Keys are matched with sorted
+arrays instead of a dataframe merge, so a diff of semesters with millions
+of assignments only needs a sort and a binary search per stat.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+import utils.constants as consts
+from utils import cache_utils, rule_utils
+from utils.logger import logger
+
+# Columns stats are aligned on
+KEY_ASSIGNMENT_ID = "belegung"
+KEY_STUDENT_LECTURE = "student_veranstaltung"
+KEY_COLUMNS = {
+    KEY_ASSIGNMENT_ID: [consts.COLUMN_NAME_ASSIGNMENTS_ID],
+    KEY_STUDENT_LECTURE: ["matrikelnummer", "veranstaltungs_id"],
+}
+
+# Status of assignments only found in one of both stats
+STATUS_MISSING = "-"
+
+COLUMN_STATUS_A = "status_a"
+COLUMN_STATUS_B = "status_b"
+OUTCOME_COLUMNS = [
+    consts.COLUMN_NAME_ASSIGNMENTS_STATUS,
+    "matrikelnummer",
+    "veranstaltungs_id",
+]
+
+# Diffs per stat keys, see get_outcome_diff()
+outcome_diff_cache = cache_utils.LRUCache(
+    max_entries=consts.VISU_SETTING_OUTCOME_DIFF_CACHE_MAX_ENTRIES,
+)
+
+
+def read_outcomes(stat_name: str):
+    """Read the status, matriculation number and lecture of every assignment
+    of a stat, indexed by assignment id.
+    """
+    stat_info, df_assignments = rule_utils.read_stat_frames(
+        stat_name,
+        [consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS],
+        columns=OUTCOME_COLUMNS,
+    )
+    return stat_info, df_assignments
+
+
+def get_lecture_id_count(df_outcomes_a, df_outcomes_b):
+    """Return the highest lecture id of both stats plus one, 1 if there is
+    none.
+    """
+    lecture_ids = [
+        df_outcomes["veranstaltungs_id"].max()
+        for df_outcomes in [df_outcomes_a, df_outcomes_b]
+    ]
+    lecture_ids = [
+        lecture_id for lecture_id in lecture_ids if pd.notna(lecture_id)
+    ]
+
+    return 1 + int(max(lecture_ids, default=0))
+
+
+def get_keys(df_outcomes, key_type: str, lecture_id_count: int):
+    """Return the keys of all assignments as int64 array and a mask of the
+    assignments that have a key.
+
+    Matriculation number and lecture get combined into one number, so both
+    key types can be matched the same way. Assignments with a missing
+    matriculation number or lecture get key 0 and are never matched.
+    """
+    if key_type == KEY_ASSIGNMENT_ID:
+        keys = df_outcomes.index.to_numpy(dtype=np.int64)
+        return keys, np.ones(len(keys), dtype=bool)
+
+    has_key = (
+        df_outcomes[KEY_COLUMNS[KEY_STUDENT_LECTURE]]
+        .notna()
+        .all(axis=1)
+        .to_numpy()
+    )
+    keys = df_outcomes["matrikelnummer"].to_numpy(
+        dtype=np.int64,
+        na_value=0,
+    ) * lecture_id_count + df_outcomes["veranstaltungs_id"].to_numpy(
+        dtype=np.int64,
+        na_value=0,
+    )
+
+    return np.where(has_key, keys, 0), has_key
+
+
+def match_sorted_keys(sorted_keys, other_sorted_keys):
+    """Return the position of every sorted key in other_sorted_keys, -1 if
+    it's missing.
+
+    Both arrays are sorted, so the binary searches run through
+    other_sorted_keys in order. Keys found more than once are matched by
+    their occurrence, so every position is used at most once: the n-th
+    occurrence of a key is matched to its n-th occurrence in
+    other_sorted_keys.
+    """
+    if not len(other_sorted_keys):
+        return np.full(len(sorted_keys), -1, dtype=np.int64)
+
+    # Occurrence of every key among its equal keys, 0 for unique keys
+    occurrences = np.arange(len(sorted_keys)) - np.searchsorted(
+        sorted_keys,
+        sorted_keys,
+    )
+    positions = np.searchsorted(other_sorted_keys, sorted_keys) + occurrences
+    in_range = positions < len(other_sorted_keys)
+    positions = np.minimum(positions, len(other_sorted_keys) - 1)
+    found = in_range & (other_sorted_keys[positions] == sorted_keys)
+
+    return np.where(found, positions, -1)
+
+
+def get_status_codes(codes, uniques, status_values: list):
+    """Return the position of every factorized status in status_values.
+
+    The code of STATUS_MISSING is appended, so row -1 stands for a missing
+    assignment.
+    """
+    value_codes = np.array(
+        [status_values.index(value) for value in uniques],
+        dtype=np.int64,
+    )
+    return np.append(value_codes[codes], status_values.index(STATUS_MISSING))
+
+
+def create_outcome_diff(df_outcomes_a, df_outcomes_b, key_type: str):
+    """Align the assignments of two stats and compare their status.
+
+    Returns the transition matrix with the number of assignments per status
+    in stat a (rows) and b (columns), and all assignments whose status
+    differs, sorted by key. Assignments without a key count as missing in
+    the other stat and follow the assignments with a key.
+    """
+    lecture_id_count = 1
+    if key_type == KEY_STUDENT_LECTURE:
+        lecture_id_count = get_lecture_id_count(df_outcomes_a, df_outcomes_b)
+    keys_a, has_key_a = get_keys(df_outcomes_a, key_type, lecture_id_count)
+    keys_b, has_key_b = get_keys(df_outcomes_b, key_type, lecture_id_count)
+    # Stable sorts, so duplicate keys keep their row order
+    keyed_a = np.flatnonzero(has_key_a)
+    keyed_b = np.flatnonzero(has_key_b)
+    order_a = keyed_a[np.argsort(keys_a[keyed_a], kind="stable")]
+    order_b = keyed_b[np.argsort(keys_b[keyed_b], kind="stable")]
+    sorted_keys_a = keys_a[order_a]
+    sorted_keys_b = keys_b[order_b]
+    unkeyed_a = np.flatnonzero(~has_key_a)
+    unkeyed_b = np.flatnonzero(~has_key_b)
+
+    # Statuses as small numbers, so they can be compared and counted fast
+    codes_a, uniques_a = pd.factorize(df_outcomes_a["status"])
+    codes_b, uniques_b = pd.factorize(df_outcomes_b["status"])
+    status_values = sorted({STATUS_MISSING, *uniques_a, *uniques_b})
+    codes_a = get_status_codes(codes_a, uniques_a, status_values)
+    codes_b = get_status_codes(codes_b, uniques_b, status_values)
+
+    # Assignments of a in key order with their sorted position in b,
+    # followed by the assignments only found in b and those without a key
+    positions_b = match_sorted_keys(sorted_keys_a, sorted_keys_b)
+    only_in_b = np.ones(len(order_b), dtype=bool)
+    only_in_b[positions_b[positions_b >= 0]] = False
+    only_in_b = np.flatnonzero(only_in_b)
+
+    rows_a = np.concatenate(
+        [
+            order_a,
+            np.full(len(only_in_b), -1, dtype=np.int64),
+            unkeyed_a,
+            np.full(len(unkeyed_b), -1, dtype=np.int64),
+        ],
+    )
+    # Position -1 of a missing assignment stays -1
+    rows_b = np.concatenate(
+        [
+            np.append(order_b, -1)[positions_b],
+            order_b[only_in_b],
+            np.full(len(unkeyed_a), -1, dtype=np.int64),
+            unkeyed_b,
+        ],
+    )
+    all_codes_a = codes_a[rows_a]
+    all_codes_b = codes_b[rows_b]
+
+    # Transition matrix via one bincount over the combined status codes
+    status_count = len(status_values)
+    transitions = np.bincount(
+        all_codes_a * status_count + all_codes_b,
+        minlength=status_count * status_count,
+    ).reshape(status_count, status_count)
+    df_transitions = pd.DataFrame(
+        transitions,
+        index=pd.Index(status_values, name=COLUMN_STATUS_A),
+        columns=pd.Index(status_values, name=COLUMN_STATUS_B),
+    )
+
+    # Changed assignments in key order, only their rows get copied.
+    # Assignments without a key are changed and already at the end
+    changed = np.flatnonzero(all_codes_a != all_codes_b)
+    changed_keys = np.concatenate(
+        [sorted_keys_a, sorted_keys_b[only_in_b]],
+    )
+    keyed_count = len(changed_keys)
+    changed_keyed = changed[changed < keyed_count]
+    changed = np.concatenate(
+        [
+            changed_keyed[
+                np.argsort(changed_keys[changed_keyed], kind="stable")
+            ],
+            changed[changed >= keyed_count],
+        ],
+    )
+    changed_rows_a = rows_a[changed]
+    changed_rows_b = rows_b[changed]
+    from_a = changed_rows_a >= 0
+
+    key_values = {}
+    for column in [consts.COLUMN_NAME_ASSIGNMENTS_ID, *OUTCOME_COLUMNS[1:]]:
+        if column == consts.COLUMN_NAME_ASSIGNMENTS_ID:
+            values_a = df_outcomes_a.index.to_numpy()
+            values_b = df_outcomes_b.index.to_numpy()
+        else:
+            values_a = df_outcomes_a[column].to_numpy()
+            values_b = df_outcomes_b[column].to_numpy()
+        values = np.empty(
+            len(changed),
+            dtype=np.result_type(values_a.dtype, values_b.dtype),
+        )
+        values[from_a] = values_a[changed_rows_a[from_a]]
+        values[~from_a] = values_b[changed_rows_b[~from_a]]
+        key_values[column] = values
+
+    status_names = np.array(status_values, dtype=object)
+    df_changed = pd.DataFrame(
+        {
+            **key_values,
+            COLUMN_STATUS_A: status_names[all_codes_a[changed]],
+            COLUMN_STATUS_B: status_names[all_codes_b[changed]],
+        },
+    )
+
+    return {
+        "key_type": key_type,
+        "assignment_count": len(rows_a),
+        "df_transitions": df_transitions,
+        "df_changed": df_changed,
+    }
+
+
+def load_outcome_diff(stat_name_a: str, stat_name_b: str, key_type: str):
+    """Read the outcomes of two stats and compare them.
+
+    Returns None if the stats were simulated on different database imports
+    or semesters.
+    """
+    stat_info_a, df_outcomes_a = read_outcomes(stat_name_a)
+    stat_info_b, df_outcomes_b = read_outcomes(stat_name_b)
+
+    stat_info_mismatch = rule_utils.get_stat_info_mismatch(
+        stat_info_a,
+        stat_info_b,
+    )
+    if stat_info_mismatch is not None:
+        logger.warning(
+            f"{stat_name_a} und {stat_name_b} können nicht verglichen werden,"
+            f" {stat_info_mismatch} stimmt nicht überein.",
+        )
+        return None
+
+    logger.info(
+        f"Vergleiche Belegungen von {stat_name_a} und {stat_name_b}...",
+    )
+    outcome_diff = create_outcome_diff(df_outcomes_a, df_outcomes_b, key_type)
+    logger.info(
+        f"{len(outcome_diff['df_changed'])} von"
+        f" {outcome_diff['assignment_count']} Belegungen haben einen anderen"
+        " Status.",
+    )
+
+    return outcome_diff
+
+
+def get_outcome_diff(stat_key_a: list, stat_key_b: list, key_type: str):
+    """Return the outcome diff of two stats, created once per stat keys.
+
+    stat_key_a, stat_key_b: stat name and modification time, see
+    layout_visualizer_data_store.get_stat_key()
+    """
+    return outcome_diff_cache.get_or_load(
+        (tuple(stat_key_a), tuple(stat_key_b), key_type),
+        lambda: load_outcome_diff(stat_key_a[0], stat_key_b[0], key_type),
+    )
+
+
+def get_changed_rows_page(df_changed, page: int, page_size: int):
+    """Return one page of changed assignments and the number of pages.
+
+    page: starts at 1
+    """
+    page_count = max(1, math.ceil(len(df_changed) / page_size))
+    page = min(max(page, 1), page_count)
+    start = (page - 1) * page_size
+
+    return df_changed.iloc[start : start + page_size], page_count
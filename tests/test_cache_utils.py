@@ -0,0 +1,104 @@
+"""Tests for the LRU cache shared by the app."""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils import cache_utils
+
+
+def test_least_recently_used_entry_is_removed_first():
+    cache = cache_utils.LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Reading marks an entry as recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert len(cache) == 2
+
+
+def test_entries_are_removed_once_bytes_exceed_limit():
+    value = np.zeros(100, dtype=np.int64)
+    cache = cache_utils.LRUCache(max_bytes=2 * value.nbytes)
+    cache.put("a", value)
+    cache.put("b", value.copy())
+    cache.put("c", value.copy())
+
+    assert "a" not in cache
+    assert cache.size == 2 * value.nbytes
+
+
+def test_value_bigger_than_cache_is_not_kept():
+    cache = cache_utils.LRUCache(max_bytes=10)
+    cache.put("a", np.zeros(100, dtype=np.int64))
+
+    assert "a" not in cache
+    assert cache.size == 0
+
+
+def test_replaced_entry_updates_size():
+    cache = cache_utils.LRUCache()
+    cache.put("a", np.zeros(100, dtype=np.int64))
+    cache.put("a", np.zeros(10, dtype=np.int64))
+
+    assert cache.size == 80
+
+
+def test_invalidate_removes_matching_keys():
+    cache = cache_utils.LRUCache()
+    for key in [("a", 1), ("a", 2), ("b", 1)]:
+        cache.put(key, key[1])
+
+    cache.invalidate(lambda key: key[0] == "a")
+
+    assert len(cache) == 1
+    assert ("b", 1) in cache
+
+
+def test_get_or_load_loads_once_for_parallel_calls():
+    cache = cache_utils.LRUCache()
+    load_count = 0
+
+    def load():
+        nonlocal load_count
+        load_count += 1
+        # Keeps the first call loading while the others start
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_load("key", load)),
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert load_count == 1
+    assert results == ["value"] * 5
+    assert cache.loading_locks == {}
+
+
+def test_get_or_load_does_not_keep_failed_loads():
+    cache = cache_utils.LRUCache()
+
+    def load():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        cache.get_or_load("key", load)
+
+    assert "key" not in cache
+    assert cache.loading_locks == {}
+    assert cache.get_or_load("key", lambda: "value") == "value"
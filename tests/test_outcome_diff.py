@@ -0,0 +1,115 @@
+"""Tests for the outcome diff of two stats."""
+
+import importlib
+
+import pandas as pd
+
+import utils.constants as consts
+
+model_visualizer_outcome_diff = importlib.import_module(
+    "pages.40_visualizer.model_visualizer_outcome_diff",
+)
+
+
+def create_outcomes(rows: list):
+    """Return outcomes as read from a stat, rows are tuples of assignment
+    id, status, matriculation number and lecture.
+    """
+    return pd.DataFrame(
+        rows,
+        columns=[
+            consts.COLUMN_NAME_ASSIGNMENTS_ID,
+            *model_visualizer_outcome_diff.OUTCOME_COLUMNS,
+        ],
+    ).set_index(consts.COLUMN_NAME_ASSIGNMENTS_ID)
+
+
+def test_transitions_match_status_counts_with_duplicate_keys():
+    # Student 1 is assigned twice to lecture 10 in a, once in b
+    df_outcomes_a = create_outcomes(
+        [
+            (1, "ZU", 1, 10),
+            (2, "ZU", 1, 10),
+            (3, "AB", 2, 10),
+            (4, "ZU", 3, 11),
+        ],
+    )
+    df_outcomes_b = create_outcomes(
+        [
+            (5, "ZU", 1, 10),
+            (6, "ZU", 2, 10),
+            (7, "AB", 3, 11),
+            (8, "ZU", 4, 11),
+        ],
+    )
+
+    outcome_diff = model_visualizer_outcome_diff.create_outcome_diff(
+        df_outcomes_a,
+        df_outcomes_b,
+        model_visualizer_outcome_diff.KEY_STUDENT_LECTURE,
+    )
+    df_transitions = outcome_diff["df_transitions"]
+    missing = model_visualizer_outcome_diff.STATUS_MISSING
+
+    for df_outcomes, counts in [
+        (df_outcomes_a, df_transitions.sum(axis=1)),
+        (df_outcomes_b, df_transitions.sum(axis=0)),
+    ]:
+        counts = counts.drop(missing)
+        assert counts[counts > 0].to_dict() == (
+            df_outcomes["status"].value_counts().to_dict()
+        )
+
+    # The second assignment of student 1 has no counterpart in b
+    assert df_transitions.loc["ZU", missing] == 1
+    assert df_transitions.loc[missing, "ZU"] == 1
+    assert len(outcome_diff["df_changed"]) == 4
+
+
+def test_unchanged_outcomes_by_assignment_id():
+    df_outcomes = create_outcomes([(1, "ZU", 1, 10), (2, "AB", 2, 10)])
+
+    outcome_diff = model_visualizer_outcome_diff.create_outcome_diff(
+        df_outcomes,
+        df_outcomes,
+        model_visualizer_outcome_diff.KEY_ASSIGNMENT_ID,
+    )
+
+    assert outcome_diff["df_changed"].empty
+    assert outcome_diff["df_transitions"].loc["ZU", "ZU"] == 1
+    assert outcome_diff["df_transitions"].loc["AB", "AB"] == 1
+
+
+def test_empty_stats_return_empty_diff():
+    df_outcomes = create_outcomes([])
+
+    outcome_diff = model_visualizer_outcome_diff.create_outcome_diff(
+        df_outcomes,
+        df_outcomes,
+        model_visualizer_outcome_diff.KEY_STUDENT_LECTURE,
+    )
+
+    assert outcome_diff["assignment_count"] == 0
+    assert outcome_diff["df_changed"].empty
+    assert outcome_diff["df_transitions"].to_numpy().sum() == 0
+
+
+def test_missing_keys_are_never_matched():
+    df_outcomes_a = create_outcomes([(1, "ZU", 1, 10), (2, "AB", None, 10)])
+    df_outcomes_a["matrikelnummer"] = df_outcomes_a["matrikelnummer"].astype(
+        "Int64",
+    )
+    df_outcomes_b = create_outcomes([(3, "ZU", 1, 10)])
+
+    outcome_diff = model_visualizer_outcome_diff.create_outcome_diff(
+        df_outcomes_a,
+        df_outcomes_b,
+        model_visualizer_outcome_diff.KEY_STUDENT_LECTURE,
+    )
+    missing = model_visualizer_outcome_diff.STATUS_MISSING
+
+    assert outcome_diff["df_transitions"].loc["ZU", "ZU"] == 1
+    assert outcome_diff["df_transitions"].loc["AB", missing] == 1
+    df_changed = outcome_diff["df_changed"]
+    assert df_changed[consts.COLUMN_NAME_ASSIGNMENTS_ID].tolist() == [2]
+    assert df_changed["status_b"].tolist() == [missing]
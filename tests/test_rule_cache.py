@@ -0,0 +1,161 @@
+"""Tests for the cache of rule results in the simulator."""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.constants as consts
+from utils import rule_utils
+
+model_rule_sim_apply_rule = importlib.import_module(
+    "pages.33_rule_simulator.model_rule_sim_apply_rule",
+)
+
+DATA_VERSION = ("db_id", 1, 1)
+
+
+def create_rule(table_x, column_x, operator_symbol, table_y, column_y):
+    """Return a rule as the simulator uses it, with table suffixes."""
+    return rule_utils.check_and_transform_rule(
+        consts.RULE(table_x, column_x, operator_symbol, table_y, column_y),
+    )
+
+
+def get_rule_cache_key(rule_assignment, rule_assignment_2=None):
+    return model_rule_sim_apply_rule.get_rule_cache_key(
+        DATA_VERSION,
+        None,
+        rule_assignment,
+        "AND" if rule_assignment_2 is not None else None,
+        rule_assignment_2,
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_rule_cache():
+    model_rule_sim_apply_rule.rule_cache.clear()
+    yield
+    model_rule_sim_apply_rule.rule_cache.clear()
+
+
+def test_equal_rules_share_their_key():
+    rule = create_rule("belegungen", "fachsemester", ">=", None, 5)
+
+    assert get_rule_cache_key(rule) is not None
+    assert get_rule_cache_key(rule) == get_rule_cache_key(
+        create_rule("belegungen", "fachsemester", ">=", None, 5),
+    )
+    assert get_rule_cache_key(rule) != get_rule_cache_key(
+        create_rule("belegungen", "fachsemester", ">=", None, 6),
+    )
+
+
+def test_key_depends_on_data_version():
+    rule = create_rule("belegungen", "fachsemester", ">=", None, 5)
+
+    assert model_rule_sim_apply_rule.get_rule_cache_key(
+        DATA_VERSION,
+        None,
+        rule,
+        None,
+        None,
+    ) != model_rule_sim_apply_rule.get_rule_cache_key(
+        ("db_id", 2, 1),
+        None,
+        rule,
+        None,
+        None,
+    )
+    assert (
+        model_rule_sim_apply_rule.get_rule_cache_key(
+            None,
+            None,
+            rule,
+            None,
+            None,
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "column",
+    model_rule_sim_apply_rule.RULE_CACHE_EXCLUDED_COLUMNS,
+)
+def test_rules_on_changed_columns_are_not_cached(column):
+    rule = create_rule("belegungen", column, "==", None, "ZU")
+    other_rule = create_rule("belegungen", "fachsemester", ">=", None, 5)
+
+    assert get_rule_cache_key(rule) is None
+    # Also if only the second rule or the compared column is affected
+    assert get_rule_cache_key(other_rule, rule) is None
+    compared_rule = create_rule(
+        "belegungen",
+        "fachsemester",
+        "==",
+        "belegungen",
+        column,
+    )
+    assert get_rule_cache_key(compared_rule) is None
+
+
+def test_rules_on_columns_of_other_tables_are_cached():
+    rule = create_rule("studierende", "status", "==", None, "ZU")
+
+    assert get_rule_cache_key(rule) is not None
+
+
+def test_cached_result_only_applies_to_enrolled_assignments(monkeypatch):
+    matching_calls = []
+
+    def get_rule_matching_ids(*args, **kwargs):
+        matching_calls.append(args)
+        return np.array([1, 2, 3])
+
+    monkeypatch.setattr(
+        model_rule_sim_apply_rule,
+        "get_rule_matching_ids",
+        get_rule_matching_ids,
+    )
+    rule = create_rule("belegungen", "fachsemester", ">=", None, 5)
+    rule_cache_key = get_rule_cache_key(rule)
+
+    def apply_rule(statuses):
+        df_assignment_buffer = pd.DataFrame(
+            {
+                consts.COLUMN_NAME_ASSIGNMENTS_ID: [1, 2, 3, 4],
+                consts.COLUMN_NAME_ASSIGNMENTS_STATUS: statuses,
+                consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO: 0,
+                consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_METHOD: "",
+                consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP: pd.Timestamp(0),
+            },
+        )
+        return model_rule_sim_apply_rule.apply_assignment_rule(
+            df_assignment_buffer,
+            rule,
+            None,
+            None,
+            "Test",
+            1,
+            "test.db",
+            rule_cache_key=rule_cache_key,
+        )
+
+    enrolled = consts.RULE_SETTING_STATUS_ENROLLED
+    proposed = consts.RULE_SETTING_STATUS_PROPOSED
+    accepted = consts.RULE_SETTING_STATUS_ACCEPTED
+
+    _, df_rule_applied = apply_rule([enrolled] * 4)
+    assert df_rule_applied.index.tolist() == [1, 2, 3]
+
+    # Second call takes the ids from the cache, but status is still checked
+    df_assignment_buffer, df_rule_applied = apply_rule(
+        [enrolled, accepted, enrolled, enrolled],
+    )
+    assert len(matching_calls) == 1
+    assert df_rule_applied.index.tolist() == [1, 3]
+    assert df_assignment_buffer[
+        consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+    ].tolist() == [proposed, accepted, proposed, enrolled]
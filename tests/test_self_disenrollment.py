@@ -0,0 +1,100 @@
+"""Tests for the self disenrollment of the generator page and pipeline."""
+
+import importlib
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import utils.constants as consts
+
+model_trigger_self_disenrollment = importlib.import_module(
+    "pages.20_modify_assignments.model_trigger_self_disenrollment",
+)
+model_rule_sim_pipeline = importlib.import_module(
+    "pages.33_rule_simulator.model_rule_sim_pipeline",
+)
+
+DATABASE_NAME = "test.db"
+SEMESTER = 20241
+STATUS = consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+
+
+@pytest.fixture
+def df_assignments():
+    """Assignments in an unsorted row order, one of another semester."""
+    assignment_ids = [7, 3, 12, 1, 9, 5, 10, 2, 8, 4, 11, 6]
+    return pd.DataFrame(
+        {
+            consts.COLUMN_NAME_ASSIGNMENTS_ID: assignment_ids,
+            consts.COLUMN_NAME_ASSIGNMENTS_LECTURE_ID: [1] * 12,
+            STATUS: [
+                consts.RULE_SETTING_STATUS_DENIED
+                if assignment_id == 5
+                else consts.RULE_SETTING_STATUS_ENROLLED
+                for assignment_id in assignment_ids
+            ],
+            consts.COLUMN_NAME_ASSIGNMENTS_SEMESTER: [
+                SEMESTER - 1 if assignment_id == 9 else SEMESTER
+                for assignment_id in assignment_ids
+            ],
+            consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP: [None] * 12,
+        },
+    )
+
+
+def get_disenrolled_ids(df_assignments):
+    return sorted(
+        df_assignments.loc[
+            df_assignments[STATUS]
+            == consts.RULE_SETTING_STATUS_SELF_DISENROLLED,
+            consts.COLUMN_NAME_ASSIGNMENTS_ID,
+        ].tolist(),
+    )
+
+
+def test_page_and_pipeline_disenroll_same_assignments(
+    tmp_path,
+    monkeypatch,
+    df_assignments,
+):
+    monkeypatch.setattr(consts, "FOLDER_DB", tmp_path)
+    with closing(sqlite3.connect(tmp_path / DATABASE_NAME)) as conn:
+        df_assignments.to_sql(
+            consts.TABLE_NAME_ASSIGNMENTS,
+            conn,
+            index=False,
+        )
+
+    count = model_trigger_self_disenrollment.trigger_self_disenrollment_chance(
+        None,
+        DATABASE_NAME,
+        probability=0.5,
+        semester=SEMESTER,
+        seed=42,
+    )
+    with closing(sqlite3.connect(tmp_path / DATABASE_NAME)) as conn:
+        page_ids = get_disenrolled_ids(
+            pd.read_sql_query(
+                f"SELECT * FROM {consts.TABLE_NAME_ASSIGNMENTS}",
+                conn,
+            ),
+        )
+
+    df_pipeline, pipeline_count = (
+        model_rule_sim_pipeline.apply_self_disenrollment(
+            df_assignments,
+            0.5,
+            42,
+            SEMESTER,
+        )
+    )
+    pipeline_ids = get_disenrolled_ids(df_pipeline)
+
+    assert 0 < count < 10
+    assert count == pipeline_count
+    assert page_ids == pipeline_ids
+    # Denied assignments and other semesters are never candidates
+    assert 5 not in page_ids
+    assert 9 not in page_ids
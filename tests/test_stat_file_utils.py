@@ -0,0 +1,104 @@
+"""Tests for storing stat dataframes as outcomes of the assignments
+snapshot.
+"""
+
+import pandas as pd
+import pytest
+
+import utils.constants as consts
+from utils import stat_file_utils
+
+STATUS = consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+
+
+@pytest.fixture
+def df_assignments():
+    """Assignments snapshot of a stat, indexed by assignment id."""
+    return pd.DataFrame(
+        {
+            STATUS: ["ZU", "ZU", "AB", "ZU"],
+            "matrikelnummer": [1, 2, 3, 4],
+            "veranstaltungs_id": [10, 10, 11, 11],
+        },
+        index=pd.Index([5, 6, 7, 8], name=consts.COLUMN_NAME_ASSIGNMENTS_ID),
+    )
+
+
+def test_outcome_frame_rebuilds_stat_frame(df_assignments):
+    # Accepted assignments in their own order with a changed status
+    df_accepted = df_assignments.loc[[8, 5]].copy()
+    df_accepted[STATUS] = "AKZ"
+
+    df_outcome = stat_file_utils.get_outcome_frame(df_accepted, df_assignments)
+
+    assert df_outcome.columns.tolist() == [STATUS]
+    pd.testing.assert_frame_equal(
+        stat_file_utils.rebuild_outcome_frame(df_outcome, df_assignments),
+        df_accepted,
+    )
+
+
+def test_outcome_frame_needs_values_of_snapshot(df_assignments):
+    df_changed = df_assignments.loc[[5, 6]].copy()
+    df_changed["matrikelnummer"] = [9, 9]
+    df_missing_id = df_assignments.loc[[5]].rename(index={5: 99})
+    df_duplicate_ids = df_assignments.loc[[5, 5]]
+
+    for df in (df_changed, df_missing_id, df_duplicate_ids):
+        assert stat_file_utils.get_outcome_frame(df, df_assignments) is None
+    assert (
+        stat_file_utils.get_outcome_frame(
+            df_assignments.iloc[:0],
+            df_assignments,
+        )
+        is None
+    )
+
+
+def test_outcome_files_are_read_as_full_frames(tmp_path, df_assignments):
+    stat_file_format = consts.STAT_FILE_FORMAT_PICKLE
+    stat_file_accepted = consts.RULE_SETTING_STAT_FILE_ACCEPTED
+    stat_file_denied = consts.RULE_SETTING_STAT_FILE_DENIED
+    df_accepted = df_assignments.loc[[6, 8]].assign(**{STATUS: "AKZ"})
+    # Empty frames of the simulator don't have all columns
+    df_denied = pd.DataFrame({STATUS: pd.Series(dtype=object)})
+
+    stat_file_utils.write_stat_frame(
+        df_assignments,
+        tmp_path,
+        consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS,
+        stat_file_format,
+    )
+    stat_file_utils.write_stat_frame(
+        stat_file_utils.get_outcome_frame(df_accepted, df_assignments),
+        tmp_path,
+        stat_file_accepted,
+        stat_file_format,
+    )
+    stat_file_utils.write_stat_frame(
+        df_denied,
+        tmp_path,
+        stat_file_denied,
+        stat_file_format,
+    )
+    stat_info = {
+        "stat_file_format": stat_file_format,
+        "stat_file_layout": {
+            stat_file_accepted: stat_file_utils.STAT_FILE_LAYOUT_OUTCOME,
+            stat_file_denied: stat_file_utils.STAT_FILE_LAYOUT_FULL,
+        },
+    }
+
+    df_read_accepted, df_read_denied = stat_file_utils.read_stat_frames(
+        tmp_path,
+        stat_info,
+        [stat_file_accepted, stat_file_denied],
+        columns=["matrikelnummer"],
+    )
+
+    pd.testing.assert_frame_equal(
+        df_read_accepted,
+        df_accepted[["matrikelnummer"]],
+    )
+    assert df_read_denied.empty
+    assert df_read_denied.columns.tolist() == []
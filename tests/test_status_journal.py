@@ -0,0 +1,179 @@
+"""Tests for the status journal and rolling back rounds with it."""
+
+import importlib
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import utils.constants as consts
+from utils import db_utils
+
+model_rule_sim = importlib.import_module(
+    "pages.33_rule_simulator.model_rule_sim",
+)
+model_rollback_round = importlib.import_module(
+    "pages.20_modify_assignments.model_rollback_round",
+)
+
+DATABASE_NAME = "test.db"
+STATUS = consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+
+
+def create_assignments(rows):
+    """Return an assignments table with only the journaled columns."""
+    return pd.DataFrame(rows, columns=model_rule_sim.JOURNAL_COLUMNS)
+
+
+def create_database(conn, df_assignments, current_round):
+    """Create the tables of a database the status journal works on."""
+    df_assignments.to_sql(consts.TABLE_NAME_ASSIGNMENTS, conn, index=False)
+    conn.execute(
+        f"""CREATE TABLE {consts.TABLE_NAME_INTERNAL} (
+        {consts.COLUMN_NAME_INTERNAL_ID} TEXT,
+        {consts.COLUMN_NAME_INTERNAL_ROUND} INTEGER,
+        {consts.COLUMN_NAME_INTERNAL_CREATION_DATE} TEXT,
+        {consts.COLUMN_NAME_INTERNAL_EDIT_DATE} TEXT)""",
+    )
+    conn.execute(
+        f"INSERT INTO {consts.TABLE_NAME_INTERNAL}"
+        " VALUES ('test', ?, NULL, NULL)",
+        (current_round,),
+    )
+    conn.commit()
+
+
+def read_assignments(conn):
+    return pd.read_sql_query(
+        f"SELECT * FROM {consts.TABLE_NAME_ASSIGNMENTS}"
+        f" ORDER BY {consts.COLUMN_NAME_ASSIGNMENTS_ID}",
+        conn,
+    )
+
+
+def simulate_round(conn, df_assignments, current_round):
+    """Write a round back like the simulator, without the stat files."""
+    model_rule_sim.write_status_journal(df_assignments, current_round, conn)
+    conn.execute(f"DELETE FROM {consts.TABLE_NAME_ASSIGNMENTS}")
+    df_assignments.to_sql(
+        consts.TABLE_NAME_ASSIGNMENTS,
+        conn,
+        if_exists="append",
+        index=False,
+    )
+    db_utils.write_new_round_counter_and_timestamp(current_round, conn)
+
+
+@pytest.fixture
+def df_round_0():
+    return create_assignments(
+        [
+            (1, "ZU", 0, None, "2024-01-01 10:00:00"),
+            (2, "ZU", 0, None, "2024-01-01 10:00:00"),
+            (3, "AB", None, None, None),
+        ],
+    )
+
+
+@pytest.fixture
+def df_round_1():
+    return create_assignments(
+        [
+            (1, "AKZ", 1, "Los", "2024-02-01 10:00:00"),
+            (2, "ZU", 0, None, "2024-01-01 10:00:00"),
+            (3, "AB", None, None, None),
+            # Added by the round, e.g. a Kombotrigger row
+            (4, "AKZ", 2, "Kombo", "2024-02-01 10:00:00"),
+        ],
+    )
+
+
+@pytest.fixture
+def database_conn(tmp_path, monkeypatch, df_round_0):
+    """Connection to a database file in a temporary db folder."""
+    monkeypatch.setattr(consts, "FOLDER_DB", tmp_path)
+    with closing(sqlite3.connect(tmp_path / DATABASE_NAME)) as conn:
+        create_database(conn, df_round_0, 0)
+        yield conn
+
+
+def test_journal_rows_hold_previous_values(df_round_0, df_round_1):
+    journal_rows = model_rule_sim.get_status_journal_rows(
+        df_round_1,
+        df_round_0,
+        1,
+    )
+
+    assert journal_rows == [
+        (1, 1, 0, "ZU", 0, None, "2024-01-01 10:00:00"),
+        (1, 4, 1, None, None, None, None),
+    ]
+
+
+def test_journal_is_written_for_every_round(df_round_0, df_round_1):
+    with closing(sqlite3.connect(":memory:")) as conn:
+        create_database(conn, df_round_0, 0)
+
+        row_count = model_rule_sim.write_status_journal_rounds(
+            [
+                (1, 0, [(1, 1, 0, "ZU", 0, None, None)]),
+                # A round without changes is journaled as well
+                (2, 1, []),
+            ],
+            conn,
+        )
+        # Simulating a rolled back round again replaces its entries
+        model_rule_sim.write_status_journal(df_round_1, 2, conn)
+
+        assert row_count == 1
+        assert model_rollback_round.get_journaled_rounds(conn.cursor()) == [
+            (2, 0),
+            (1, 0),
+        ]
+        assert conn.execute(
+            f"SELECT COUNT(*) FROM {consts.TABLE_NAME_STATUS_JOURNAL}"
+            f" WHERE {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} = 2",
+        ).fetchone() == (2,)
+
+
+def test_rollback_restores_state_before_round(
+    database_conn,
+    df_round_0,
+    df_round_1,
+):
+    df_round_2 = df_round_1.copy()
+    df_round_2.loc[df_round_2[STATUS] == "ZU", STATUS] = "AKZ"
+    simulate_round(database_conn, df_round_1, 1)
+    simulate_round(database_conn, df_round_2, 2)
+
+    # Rolling back the first round rolls back the second one as well
+    assert model_rollback_round.rollback_round(DATABASE_NAME, 1) == (2, 1)
+
+    pd.testing.assert_frame_equal(read_assignments(database_conn), df_round_0)
+    assert db_utils.get_assignment_round(database_conn) == 0
+    assert model_rollback_round.get_journaled_rounds(
+        database_conn.cursor(),
+    ) == []
+
+
+def test_rollback_needs_all_rounds_up_to_current_round(
+    database_conn,
+    df_round_1,
+):
+    simulate_round(database_conn, df_round_1, 1)
+    # Round counter changed without a journaled round
+    db_utils.write_new_round_counter_and_timestamp(2, database_conn)
+
+    assert model_rollback_round.rollback_round(DATABASE_NAME, 1) is None
+    assert model_rollback_round.rollback_round(DATABASE_NAME) is None
+
+
+def test_changes_outside_of_rounds_clear_journal(database_conn, df_round_1):
+    simulate_round(database_conn, df_round_1, 1)
+
+    assert db_utils.clear_status_journal(database_conn) == 1
+    database_conn.commit()
+
+    assert model_rollback_round.rollback_round(DATABASE_NAME) is None
+    pd.testing.assert_frame_equal(read_assignments(database_conn), df_round_1)
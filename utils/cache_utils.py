@@ -0,0 +1,136 @@
+"""Utils for in-memory caches shared by the app."""
+
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from plotly.basedatatypes import BaseFigure
+
+
+def get_object_size(value):
+    """Return the approximate memory size of a cached value in bytes."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, BaseFigure):
+        return get_object_size(value.to_dict())
+    if isinstance(value, (tuple, list)):
+        return sum(get_object_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(get_object_size(item) for item in value.values())
+    # Only finished futures count with the size of their result
+    if isinstance(value, Future):
+        if value.done() and value.exception() is None:
+            return get_object_size(value.result())
+        return sys.getsizeof(value)
+
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread safe least recently used cache bounded by entries and bytes.
+
+    Dash callbacks can run in parallel threads, so every access is locked.
+    Least recently used entries get removed first once a limit is reached.
+    A limit of 0 means no limit.
+    """
+
+    def __init__(self, max_entries=0, max_bytes=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        # One lock per key that is currently loaded, see get_or_load()
+        self.loading_locks = {}
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it as recently used."""
+        with self.lock:
+            if key not in self.entries:
+                return default
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def get_or_load(self, key, load_function):
+        """Return a cached value, loading and adding it if missing.
+
+        Parallel calls for the same key wait for the first one, so the value
+        is only loaded once.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            loading_lock = self.loading_locks.setdefault(
+                key,
+                threading.Lock(),
+            )
+
+        with loading_lock:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+
+            try:
+                value = load_function()
+                self.put(key, value)
+            finally:
+                with self.lock:
+                    self.loading_locks.pop(key, None)
+
+        return value
+
+    def put(self, key, value):
+        """Add a value, removing least recently used values if needed."""
+        value_size = get_object_size(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.remove_entry(key)
+
+            # Values bigger than the whole cache are not kept at all
+            if self.max_bytes and value_size > self.max_bytes:
+                return
+
+            self.entries[key] = value
+            self.sizes[key] = value_size
+            self.size += value_size
+
+            while (
+                self.max_entries and len(self.entries) > self.max_entries
+            ) or (self.max_bytes and self.size > self.max_bytes):
+                self.remove_entry(next(iter(self.entries)))
+
+    def remove_entry(self, key):
+        """Remove a single entry. Lock must be held by the caller."""
+        del self.entries[key]
+        self.size -= self.sizes.pop(key)
+
+    def invalidate(self, predicate):
+        """Remove all entries whose key matches the predicate function."""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                self.remove_entry(key)
+
+    def clear(self):
+        """Remove all entries."""
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.size = 0
@@ -128,6 +128,8 @@ FOLDER_CSV_IMPORT = Path(FOLDER_USERDATA, "import_files")
 FOLDER_LOGS = Path(FOLDER_USERDATA, "logs")
 FOLDER_RULE_FILES = Path(FOLDER_USERDATA, "rule_files")
 FOLDER_STAT_FILES = Path(FOLDER_USERDATA, "stats")
+FOLDER_SWEEP_FILES = Path(FOLDER_USERDATA, "sweeps")
+FOLDER_BENCHMARK_FILES = Path(FOLDER_USERDATA, "benchmarks")
 
 
 # Standardized filenames
@@ -135,6 +137,7 @@ FILENAME_BASE_DB_STRUCTURE = "base_db_structure.json"
 FILENAME_IMPORT_MAPPING = "import_mapping.json"
 FILENAME_STAT_INFO = "stat_info.json"
 FILENAME_SETTINGS = "settings.ini"
+FILENAME_BENCHMARK_BASELINE = "benchmark_baseline.json"
 SETTINGS_FILE = Path(FOLDER_USERDATA, FILENAME_SETTINGS)
 
 
@@ -142,6 +145,10 @@ SETTINGS_FILE = Path(FOLDER_USERDATA, FILENAME_SETTINGS)
 # Not strict const variables because they can be reloaded but treated similarly
 settings = configparser.RawConfigParser()
 settings.read(SETTINGS_FILE)
+# Sections added in later versions, older settings files use the fallbacks
+for setting_section in ["Profiling", "Benchmark"]:
+    if not settings.has_section(setting_section):
+        settings.add_section(setting_section)
 # Rule application settings
 # Second parameter in "get" functions acts as a fallback if setting not found
 RULE_SETTING_CURRENT_SEMESTER = settings["Rule Application"].getint(
@@ -193,6 +200,111 @@ RULE_SETTING_STAT_FILE_ASSIGNMENTS = settings["Rule Application"].get(
     "STAT_FILE_ASSIGNMENTS",
     "assignments.xz",
 )
+# Counts of the stat dataframes per rule, status and dimension value
+RULE_SETTING_STAT_FILE_AGGREGATES = settings["Rule Application"].get(
+    "STAT_FILE_AGGREGATES",
+    "aggregates.xz",
+)
+# Storage of stat dataframes: "pickle" (xz compressed), "parquet" or
+# "arrow" (Arrow IPC). Columnar formats need pyarrow, else pickle is used
+RULE_SETTING_STAT_FILE_FORMAT = settings["Rule Application"].get(
+    "STAT_FILE_FORMAT",
+    "parquet",
+)
+# Codec of columnar stat files: "zstd", "lz4" or "none". Uncompressed
+# Arrow IPC files can be read memory mapped without copying
+RULE_SETTING_STAT_FILE_COMPRESSION = settings["Rule Application"].get(
+    "STAT_FILE_COMPRESSION",
+    "zstd",
+)
+# Processes used to convert stat folders to another format, 0 uses the
+# number of cpu cores
+RULE_SETTING_STAT_FILE_CONVERT_PROCESSES = settings[
+    "Rule Application"
+].getint(
+    "STAT_FILE_CONVERT_PROCESSES",
+    0,
+)
+STAT_FILE_FORMAT_PICKLE = "pickle"
+STAT_FILE_FORMAT_PARQUET = "parquet"
+STAT_FILE_FORMAT_ARROW = "arrow"
+# 'stored' uses the los_nummer column of the assignment table, 'seeded' draws
+# new lottery numbers per simulation. Leave seed empty for a random seed
+RULE_SETTING_LOTTERY_MODE = settings["Rule Application"].get(
+    "LOTTERY_MODE",
+    "stored",
+)
+RULE_SETTING_LOTTERY_SEED = settings["Rule Application"].get(
+    "LOTTERY_SEED",
+    "",
+)
+# Monte carlo lottery runs are distributed across this many processes.
+# 0 uses the number of cpu cores
+RULE_SETTING_MONTE_CARLO_PROCESSES = settings["Rule Application"].getint(
+    "MONTE_CARLO_PROCESSES",
+    0,
+)
+RULE_SETTING_STAT_FILE_MONTE_CARLO_ASSIGNMENTS = settings[
+    "Rule Application"
+].get(
+    "STAT_FILE_MONTE_CARLO_ASSIGNMENTS",
+    "monte_carlo_assignments.xz",
+)
+RULE_SETTING_STAT_FILE_MONTE_CARLO_STUDENTS = settings["Rule Application"].get(
+    "STAT_FILE_MONTE_CARLO_STUDENTS",
+    "monte_carlo_students.xz",
+)
+RULE_SETTING_STAT_FILE_MONTE_CARLO_GROUPS = settings["Rule Application"].get(
+    "STAT_FILE_MONTE_CARLO_GROUPS",
+    "monte_carlo_groups.xz",
+)
+# Keep ids matching a rule in memory, so unchanged rules don't need to be
+# evaluated again when simulating the same database state
+RULE_SETTING_RULE_CACHE = settings["Rule Application"].getboolean(
+    "RULE_CACHE",
+    True,
+)
+RULE_SETTING_RULE_CACHE_MAX_ENTRIES = settings["Rule Application"].getint(
+    "RULE_CACHE_MAX_ENTRIES",
+    256,
+)
+# Ruleset comparisons use one process per ruleset up to this amount.
+# 0 uses the number of cpu cores
+RULE_SETTING_SWEEP_PROCESSES = settings["Rule Application"].getint(
+    "SWEEP_PROCESSES",
+    0,
+)
+
+# Profiling settings
+# Tracks peak memory per simulation stage, slows down the simulation
+PROFILING_SETTING_TRACK_MEMORY = settings["Profiling"].getboolean(
+    "TRACK_MEMORY",
+    False,
+)
+# Profiler for simulations and imports: "off", "cprofile" or "sampling".
+# Sampling uses pyinstrument if installed, else cProfile
+PROFILING_SETTING_PROFILER = settings["Profiling"].get("PROFILER", "off")
+PROFILING_SETTING_SAMPLING_INTERVAL = settings["Profiling"].getfloat(
+    "SAMPLING_INTERVAL",
+    0.001,
+)
+PROFILING_SETTING_TOP_FUNCTIONS = settings["Profiling"].getint(
+    "TOP_FUNCTIONS",
+    20,
+)
+PROFILER_CPROFILE = "cprofile"
+PROFILER_SAMPLING = "sampling"
+
+# Benchmark settings
+# Database sizes to benchmark, as keys of the synthetic dataset sizes
+BENCHMARK_SETTING_SIZES = settings["Benchmark"].get("SIZES", "100k").split(",")
+BENCHMARK_SETTING_REPEAT = settings["Benchmark"].getint("REPEAT", 1)
+BENCHMARK_SETTING_SEED = settings["Benchmark"].getint("SEED", 1)
+# Relative slowdown against the baseline that counts as regression
+BENCHMARK_SETTING_REGRESSION_THRESHOLD = settings["Benchmark"].getfloat(
+    "REGRESSION_THRESHOLD",
+    0.2,
+)
 
 # Sim Overview Settings
 OVERVIEW_SETTING_MAX_PREVIEW_SIZE = settings["Overview"].getint(
@@ -235,12 +347,65 @@ GENERATOR_SETTING_DEFAULT_DISENROLL_CHANCE = settings["Generator"].getfloat(
     "DEFAULT_DISENROLL_CHANCE",
     0.12853,
 )
+# Fitted sampling models of generator targets kept in memory
+GENERATOR_SETTING_SAMPLING_MODEL_CACHE_MAX_ENTRIES = settings[
+    "Generator"
+].getint(
+    "SAMPLING_MODEL_CACHE_MAX_ENTRIES",
+    32,
+)
 
 # Visualization
 VISU_SETTING_PLOTLY_THEME = settings["Visualization"].get(
     "PLOTLY_THEME",
     "plotly",
 )
+# Loaded stats shared by all visualizer sessions, least recently used ones
+# get removed first. 0 means no limit
+VISU_SETTING_STAT_STORE_MAX_ENTRIES = settings["Visualization"].getint(
+    "STAT_STORE_MAX_ENTRIES",
+    16,
+)
+VISU_SETTING_STAT_STORE_MAX_MB = settings["Visualization"].getint(
+    "STAT_STORE_MAX_MB",
+    512,
+)
+# Threads loading stat aggregates and dataframes in the background
+VISU_SETTING_STAT_STORE_LOADER_THREADS = settings["Visualization"].getint(
+    "STAT_STORE_LOADER_THREADS",
+    4,
+)
+# Categories shown per chart, the rest is shown as one "other" category that
+# can be clicked to show them. 0 means no limit
+VISU_SETTING_CHART_MAX_CATEGORIES = settings["Visualization"].getint(
+    "CHART_MAX_CATEGORIES",
+    20,
+)
+# Created visualizer figures shared by all sessions, least recently used
+# ones get removed first. 0 means no limit
+VISU_SETTING_FIGURE_CACHE_MAX_ENTRIES = settings["Visualization"].getint(
+    "FIGURE_CACHE_MAX_ENTRIES",
+    128,
+)
+VISU_SETTING_FIGURE_CACHE_MAX_MB = settings["Visualization"].getint(
+    "FIGURE_CACHE_MAX_MB",
+    64,
+)
+# Outcome diffs of two stats kept for the comparison tab and number of
+# changed assignments shown per page
+VISU_SETTING_OUTCOME_DIFF_CACHE_MAX_ENTRIES = settings["Visualization"].getint(
+    "OUTCOME_DIFF_CACHE_MAX_ENTRIES",
+    4,
+)
+VISU_SETTING_OUTCOME_DIFF_PAGE_SIZE = settings["Visualization"].getint(
+    "OUTCOME_DIFF_PAGE_SIZE",
+    100,
+)
+# Full text chart labels kept per database state and column
+VISU_SETTING_VALUE_NAMES_CACHE_MAX_ENTRIES = settings["Visualization"].getint(
+    "VALUE_NAMES_CACHE_MAX_ENTRIES",
+    32,
+)
 
 
 # DB mapping names - Need to be hardcoded here as a naming link between
@@ -301,6 +466,13 @@ COLUMN_NAME_INTERNAL_ID = "id"
 COLUMN_NAME_INTERNAL_ROUND = "runde"
 COLUMN_NAME_INTERNAL_CREATION_DATE = "erstellungs_datum"
 COLUMN_NAME_INTERNAL_EDIT_DATE = "änderungs_datum"
+# Internal journal of assignment values before each simulation round wrote
+# back to the database, used to roll back rounds
+TABLE_NAME_STATUS_JOURNAL = "STATUSJOURNAL"
+TABLE_NAME_STATUS_JOURNAL_ROUNDS = "STATUSJOURNAL_RUNDEN"
+COLUMN_NAME_STATUS_JOURNAL_ROUND = "runde"
+COLUMN_NAME_STATUS_JOURNAL_PREVIOUS_ROUND = "vorherige_runde"
+COLUMN_NAME_STATUS_JOURNAL_NEW_ROW = "neue_zeile"
 
 
 # Frontend names
@@ -334,6 +506,9 @@ PAGE_SIM_RULE_EDITOR_TITLE_NAME = "Simulator - Regeleditor"
 PAGE_SIM_PROCESS_URL = "/rule-simulator/"
 PAGE_SIM_PROCESS_TITLE_NAME = "Simulator - Regelanwendung"
 
+PAGE_SIM_SWEEP_URL = "/rule-sweep/"
+PAGE_SIM_SWEEP_TITLE_NAME = "Simulator - Regelwerke vergleichen"
+
 PAGE_SIM_DONE_URL = "/end-overview/"
 PAGE_SIM_DONE_TITLE_NAME = "Simulator - Endübersicht"
 
@@ -230,6 +230,65 @@ def write_new_round_counter_and_timestamp(current_round, conn):
     conn.commit()
 
 
+def create_status_journal_table(conn):
+    """Create the status journal tables if they don't exist yet.
+
+    The journal holds the values of every assignment row a simulation round
+    changed, as they were before the round. Rows the round added are only
+    marked. Every journaled round is listed with its previous round, even if
+    it didn't change any rows.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute(
+        f"""CREATE TABLE IF NOT EXISTS
+        {consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS} (
+        {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} INTEGER NOT NULL PRIMARY KEY,
+        {consts.COLUMN_NAME_STATUS_JOURNAL_PREVIOUS_ROUND} INTEGER NOT NULL);
+        """,
+    )
+
+    cursor.execute(
+        f"""CREATE TABLE IF NOT EXISTS {consts.TABLE_NAME_STATUS_JOURNAL} (
+        {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND} INTEGER NOT NULL,
+        {consts.COLUMN_NAME_ASSIGNMENTS_ID} INTEGER NOT NULL,
+        {consts.COLUMN_NAME_STATUS_JOURNAL_NEW_ROW} INTEGER NOT NULL,
+        {consts.COLUMN_NAME_ASSIGNMENTS_STATUS} TEXT,
+        {consts.COLUMN_NAME_ASSIGNMENTS_APPLICATION_ORDER_INFO} INTEGER,
+        {consts.COLUMN_NAME_ASSIGNMENTS_SYSTEM_METHOD} TEXT,
+        {consts.COLUMN_NAME_ASSIGNMENTS_TIMESTAMP} TEXT,
+        PRIMARY KEY (
+            {consts.COLUMN_NAME_STATUS_JOURNAL_ROUND},
+            {consts.COLUMN_NAME_ASSIGNMENTS_ID}
+        )) WITHOUT ROWID;
+        """,
+    )
+
+
+def clear_status_journal(conn):
+    """Remove all journaled rounds, so none of them can be rolled back.
+
+    Used by changes to the assignments table outside of simulation rounds,
+    as rolling back a round afterwards would overwrite them with journaled
+    values. Doesn't commit, so it's part of the transaction of the change.
+    Returns the number of removed rounds.
+    """
+    create_status_journal_table(conn)
+    cursor = conn.cursor()
+
+    cursor.execute(f"DELETE FROM {consts.TABLE_NAME_STATUS_JOURNAL_ROUNDS}")
+    round_count = cursor.rowcount
+    cursor.execute(f"DELETE FROM {consts.TABLE_NAME_STATUS_JOURNAL}")
+
+    if round_count:
+        logger.info(
+            f"Statusjournal mit {round_count} Runde(n) geleert, vorherige"
+            " Runden können nicht mehr zurückgesetzt werden.",
+        )
+
+    return round_count
+
+
 def create_db_id(length):
     """Generate a random id number to identify a database."""
     import random
@@ -253,6 +312,20 @@ def get_db_id(conn):
     return db_id
 
 
+def get_db_data_version(name: str):
+    """Return a value that changes whenever a database file is written.
+
+    Consists of db id, file modification time and file size, so cached
+    results of one database state are not used for another.
+    """
+    database_path = get_db_path(name, check_file_presence=True)
+    with closing(sqlite3.connect(database_path)) as conn:
+        db_id = get_db_id(conn)
+
+    file_stat = os.stat(database_path)
+    return (db_id, file_stat.st_mtime_ns, file_stat.st_size)
+
+
 def get_assignment_round(conn):
     """Return the current assignment round value of a database."""
     cursor = conn.cursor()
@@ -268,6 +341,20 @@ def get_assignment_round(conn):
     return current_round
 
 
+def get_in_condition(column: str, values):
+    """Return a parameterized "column IN (?, ...)" condition and its
+    parameters.
+
+    values can be a single value or a list of values.
+    """
+    if not isinstance(values, (list, tuple, set)):
+        values = [values]
+    values = list(values)
+
+    placeholders = ", ".join("?" * len(values))
+    return f"{column} IN ({placeholders})", values
+
+
 def get_unique_column_values(database_name: str, table: str, column: str):
     """Return the unique values found in a database column per table.
 
@@ -1,12 +1,32 @@
 """Utils for layout specific tasks."""
 
+import pandas as pd
 import plotly.express as px
 import sqlite3
 from contextlib import closing
 
+import utils.cache_utils as cache_utils
 import utils.constants as consts
 import utils.db_utils as db_utils
 import utils.file_utils as file_utils
+from utils.logger import logger
+
+# Lookup table and text column of id columns with full text names
+DB_VALUE_NAME_TABLES = {
+    "studiengangs_id": ("studiengang", "kurztext"),
+    "veranstaltungs_id": ("veranstaltung", "kurztext"),
+    "gruppen_id": ("i_gruppe", "text"),
+}
+
+# Name of the category holding all categories beyond the shown ones
+CHART_OTHER_CATEGORY = "Sonstige"
+# Column with the category offset a click on a chart category leads to
+COLUMN_DRILL_OFFSET = "drill_offset"
+
+# Full text names per database state and column, see get_db_value_names()
+db_value_names_cache = cache_utils.LRUCache(
+    max_entries=consts.VISU_SETTING_VALUE_NAMES_CACHE_MAX_ENTRIES,
+)
 
 
 def validate_input_field_values(*values):
@@ -17,12 +37,33 @@ def validate_input_field_values(*values):
     )
 
 
-def create_barchart_for_rules(df, stat_info):
-    # Group status and rule number
-    assignments_per_rule = (
-        df.groupby(["sortierwert", "status"]).size().reset_index(name="Anzahl")
-    )
+def clear_log_stream():
+    """Clear the log shown on process pages."""
+    logger.log_stream.truncate(0)
+    logger.log_stream.seek(0)
+
+
+def get_log_stream_content():
+    """Return the log shown on process pages without console colors."""
+    content = logger.log_stream.getvalue()
+    for console_color in [
+        consts.CONSOLE_GREEN,
+        consts.CONSOLE_BLUE,
+        consts.CONSOLE_RED,
+        consts.CONSOLE_YELLOW,
+        consts.CONSOLE_ENDCMD,
+    ]:
+        content = content.replace(console_color, "")
 
+    return content
+
+
+def create_barchart_for_rules(assignments_per_rule, stat_info):
+    """Create a barchart of the number of assignments per rule and status.
+
+    assignments_per_rule: counts with the columns sortierwert, status and
+    Anzahl, see stat_aggregate_utils.get_counts().
+    """
     # Sort count ascending
     assignments_per_rule = assignments_per_rule.sort_values(
         by="Anzahl", ascending=False
@@ -49,8 +90,8 @@ def create_barchart_for_rules(df, stat_info):
 
     # Rule names on X-axis
     # Get the total amount of rules
-    max_sort = df["sortierwert"].max()
-    rules_total = df["sortierwert"].value_counts().sort_index()
+    max_sort = assignments_per_rule["sortierwert"].max()
+    rules_total = assignments_per_rule.groupby("sortierwert")["Anzahl"].sum()
     rules_total = rules_total.reindex(range(1, max_sort + 1), fill_value=0)
 
     # X-axis labels
@@ -73,10 +114,15 @@ def create_barchart_for_rules(df, stat_info):
     return figure
 
 
-def create_piechart_for_assignment_status(df):
-    """Count the number of assignments per status"""
-    assignments_per_status = df["status"].value_counts().reset_index()
-    assignments_per_status.columns = ["status", "counts"]
+def create_piechart_for_assignment_status(assignments_per_status):
+    """Create a piechart of the number of assignments per status.
+
+    assignments_per_status: counts with the columns status and Anzahl, see
+    stat_aggregate_utils.get_counts().
+    """
+    assignments_per_status = assignments_per_status.sort_values(
+        by="Anzahl", ascending=False
+    ).rename(columns={"Anzahl": "counts"})
 
     figure = px.pie(
         assignments_per_status,
@@ -92,53 +138,128 @@ def create_piechart_for_assignment_status(df):
     return figure
 
 
+def load_db_value_names(column, database_name):
+    """Load the full text names of a column's values as dict.
+
+    Names of abbreviated db values come from the descriptors file, names of
+    study program, lecture and group ids from one query of their table.
+    """
+    if column not in DB_VALUE_NAME_TABLES:
+        descriptors = file_utils.read_json(
+            consts.FOLDER_UTILS, "base_db_value_descriptors.json"
+        )
+        return descriptors.get(column, {})
+
+    table_name, column_name = DB_VALUE_NAME_TABLES[column]
+    database_path = db_utils.get_db_path(
+        database_name, check_file_presence=True
+    )
+    with closing(sqlite3.connect(database_path)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT _pk_id, {column_name} FROM {table_name}")
+        rows = cursor.fetchall()
+
+    # First row wins if an id is found more than once
+    value_names = {}
+    for id, value in rows:
+        value_names.setdefault(id, value)
+
+    return value_names
+
+
+def get_db_value_names(column, database_name):
+    """Return the full text names of a column's values, loaded once per
+    database state. The returned dict must not be changed.
+    """
+    if column in DB_VALUE_NAME_TABLES:
+        cache_key = (db_utils.get_db_data_version(database_name), column)
+    else:
+        # Descriptors don't depend on the database
+        cache_key = (None, column)
+
+    return db_value_names_cache.get_or_load(
+        cache_key,
+        lambda: load_db_value_names(column, database_name),
+    )
+
+
 def expand_db_value_names(df, column, database_name):
     """Changes the shown table values from abbreviated db form
     to full text via descriptors file.
-    
+
     Also adds full names to study program and group id numbers.
+    Returns a changed copy, df itself stays unchanged.
     """
-    descriptors = file_utils.read_json(
-        consts.FOLDER_UTILS, "base_db_value_descriptors.json"
-    )
+    df = df.copy()
+    value_names = get_db_value_names(column, database_name)
+    if not value_names:
+        return df
 
-    if column in descriptors:
-        for key, value in descriptors[column].items():
-            df.loc[df[column] == key, column] = value
-
-    if column in ["studiengangs_id", "gruppen_id", "veranstaltungs_id"]:
-        unique_ids = df[column].drop_duplicates().tolist().copy()
-        if column == "studiengangs_id":
-            table_name = "studiengang"
-        elif column == "veranstaltungs_id":
-            table_name = "veranstaltung"
-        else:
-            table_name = "i_gruppe"
-
-        if column == "studiengangs_id":
-            column_name = "kurztext"
-        elif column == "veranstaltungs_id":
-            column_name = "kurztext"
-        else:
-            column_name = "text"
-
-        database_path = db_utils.get_db_path(
-            database_name, check_file_presence=True
-        )
-        with closing(sqlite3.connect(database_path)) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            for id in unique_ids:
-                cursor.execute(
-                    f"SELECT * FROM {table_name} WHERE _pk_id = ? LIMIT 1",
-                    (id,),
-                )
-                result = cursor.fetchone()
-
-                if result is not None:
-                    value = result[column_name]
-                    df[column] = df[column].astype(str)
-                    df.loc[df[column] == str(id), column] = value
+    values = df[column]
+    # Ids without a name are shown as they are
+    if column in DB_VALUE_NAME_TABLES:
+        values = values.astype(str)
+    full_names = df[column].map(value_names)
+    df[column] = full_names.where(full_names.notna(), values)
 
     return df
+
+
+def limit_chart_categories(
+    df,
+    column,
+    group_columns=(),
+    category_offset=0,
+    max_categories=consts.VISU_SETTING_CHART_MAX_CATEGORIES,
+):
+    """Keep the values of a chart column with the highest counts and sum up
+    the rest as one "other" category per group column values.
+
+    Values are ranked by their count over all groups. category_offset skips
+    the highest ranked values, used to show the values of the other
+    category. Column drill_offset holds the offset a click on the value
+    leads to: the values of the other category, or back to the top values.
+    """
+    totals = df.groupby(column, sort=True)["Anzahl"].sum()
+    ranked_values = totals.sort_values(ascending=False, kind="stable").index
+    ranked_values = ranked_values[category_offset:]
+
+    if max_categories and len(ranked_values) > max_categories:
+        other_values = ranked_values[max_categories:]
+        ranked_values = ranked_values[:max_categories]
+    else:
+        other_values = ranked_values[:0]
+
+    df_limited = df[df[column].isin(ranked_values)].copy()
+    df_limited[COLUMN_DRILL_OFFSET] = 0
+    if other_values.empty:
+        return df_limited
+
+    df_other = df[df[column].isin(other_values)]
+    if group_columns:
+        df_other = (
+            df_other.groupby(list(group_columns), sort=True)["Anzahl"]
+            .sum()
+            .reset_index()
+        )
+    else:
+        df_other = pd.DataFrame({"Anzahl": [df_other["Anzahl"].sum()]})
+    df_other[column] = f"{CHART_OTHER_CATEGORY} ({len(other_values)})"
+    df_other[COLUMN_DRILL_OFFSET] = category_offset + max_categories
+
+    # Column becomes object, so ids and the other category fit in
+    df_limited[column] = df_limited[column].astype(object)
+    return pd.concat([df_limited, df_other], ignore_index=True)
+
+
+def get_drill_offset(click_data):
+    """Return the category offset a click on a chart category leads to, see
+    limit_chart_categories(). 0 if there was no click.
+    """
+    if not click_data or not click_data.get("points"):
+        return 0
+
+    custom_data = click_data["points"][0].get("customdata")
+    if isinstance(custom_data, list):
+        custom_data = custom_data[0] if custom_data else None
+    return int(custom_data) if custom_data is not None else 0
@@ -57,6 +57,7 @@ logging.basicConfig(
 
 # Shared logger for all modules
 logger = logging.getLogger()
+logger.log_file = log_file
 
 # Stream handler for dash ui output
 logger.log_stream = StringIO()
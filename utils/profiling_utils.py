@@ -0,0 +1,403 @@
+"""Utils for measuring runtime and memory of simulation stages."""
+
+import cProfile
+import datetime
+import functools
+import importlib.util
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import constants as consts
+from .logger import logger
+
+# Profile of the simulation running in the current thread. Dash callbacks run
+# in threads, so every simulation collects its own stage records
+profile_state = threading.local()
+
+# tracemalloc traces the whole process, so memory is only measured while a
+# single stage profile is collected. Profiles collected at the same time
+# record their stages without memory.
+memory_lock = threading.Lock()
+memory_profile_count = 0
+# Increased on every new memory profile, so stages can tell if another
+# profile ran while they were measured
+memory_profile_generation = 0
+started_tracemalloc = False
+
+MEMORY_NOTE_CONCURRENT = "Speicher nicht gemessen, parallele Ausführung"
+
+
+def start_memory_profile():
+    """Register a stage profile that tracks memory, start tracemalloc for
+    the first one.
+    """
+    global memory_profile_count, memory_profile_generation
+    global started_tracemalloc
+
+    with memory_lock:
+        memory_profile_count += 1
+        memory_profile_generation += 1
+        if memory_profile_count == 1 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+
+
+def stop_memory_profile():
+    """Unregister a stage profile, stop tracemalloc after the last one."""
+    global memory_profile_count, started_tracemalloc
+
+    with memory_lock:
+        memory_profile_count -= 1
+        if memory_profile_count == 0 and started_tracemalloc:
+            tracemalloc.stop()
+            started_tracemalloc = False
+
+
+def get_memory_generation():
+    """Return the generation of the only memory profile, None if memory
+    can't be measured because no or several profiles are active.
+    """
+    if (
+        not getattr(profile_state, "track_memory", False)
+        or memory_profile_count != 1
+        or not tracemalloc.is_tracing()
+    ):
+        return None
+    return memory_profile_generation
+
+
+@contextmanager
+def collect_stage_profile():
+    """Collect records of all stages measured inside this block.
+
+    Yields the list of stage records, which is filled until the block ends.
+    Memory tracking via tracemalloc slows down allocations, so it's only
+    enabled if set in settings. It's only measured while no other stage
+    profile is collected at the same time, see MEMORY_NOTE_CONCURRENT.
+    """
+    records = []
+    profile_state.records = records
+    profile_state.active_stages = []
+    profile_state.track_memory = consts.PROFILING_SETTING_TRACK_MEMORY
+
+    if profile_state.track_memory:
+        start_memory_profile()
+
+    try:
+        yield records
+
+    finally:
+        if profile_state.track_memory:
+            stop_memory_profile()
+
+        profile_state.records = None
+        profile_state.active_stages = []
+        profile_state.track_memory = False
+
+
+def update_outer_stages(peak_memory):
+    """Hand the peak of the traced memory to all active stages."""
+    for active_stage in profile_state.active_stages:
+        active_stage["peak_bytes"] = max(
+            active_stage["peak_bytes"],
+            peak_memory - active_stage["start_bytes"],
+        )
+
+
+@contextmanager
+def measure_stage(stage_name: str, rows_in=None):
+    """Measure duration and peak memory of a code block.
+
+    Yields the stage record, so the caller can set "rows_out" once known.
+    Stages can be nested, their records are kept in order of their start.
+    Records are only collected while a stage profile is started.
+    """
+    record = {
+        "stage": stage_name,
+        "seconds": None,
+        "peak_memory_mb": None,
+        "rows_in": rows_in,
+        "rows_out": None,
+    }
+    records = getattr(profile_state, "records", None)
+    if records is None:
+        yield record
+        return
+
+    records.append(record)
+    current_memory = 0
+    with memory_lock:
+        memory_generation = get_memory_generation()
+        if memory_generation is not None:
+            # Peak is shared by all stages, hand it to the outer stages
+            # before resetting it for this one
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            update_outer_stages(peak_memory)
+            tracemalloc.reset_peak()
+
+    active_stage = {
+        "start_bytes": current_memory,
+        "peak_bytes": 0,
+    }
+    profile_state.active_stages.append(active_stage)
+    start_time = time.perf_counter()
+
+    try:
+        yield record
+
+    finally:
+        record["seconds"] = round(time.perf_counter() - start_time, 4)
+        profile_state.active_stages.pop()
+
+        with memory_lock:
+            if memory_generation is None:
+                peak_memory = None
+            elif get_memory_generation() != memory_generation:
+                # Another profile started during this stage
+                peak_memory = None
+            else:
+                _, peak_memory = tracemalloc.get_traced_memory()
+
+        if peak_memory is not None:
+            peak_bytes = max(
+                active_stage["peak_bytes"],
+                peak_memory - active_stage["start_bytes"],
+            )
+            record["peak_memory_mb"] = round(peak_bytes / 1024**2, 2)
+
+            # Outer stages also include the peak of this stage
+            update_outer_stages(peak_memory)
+        elif profile_state.track_memory:
+            record["note"] = MEMORY_NOTE_CONCURRENT
+
+        logger.debug(f"Schritt '{stage_name}': {record}")
+
+
+def get_profile_file_path(run_name: str):
+    """Return the path of a profile output next to the current log file,
+    without file extension.
+    """
+    current_datetime = datetime.datetime.now().strftime("%d_%m_%Y_%H_%M_%S")
+    return Path(
+        consts.FOLDER_LOGS,
+        f"{Path(logger.log_file).stem}_{run_name}_{current_datetime}",
+    ).resolve()
+
+
+def get_function_label(function_key):
+    """Return a readable label of a pstats function key."""
+    file_name, line_number, function_name = function_key
+    if file_name == "~":
+        # Builtin functions have no file
+        return function_name
+    return f"{function_name} ({Path(file_name).name}:{line_number})"
+
+
+def get_collapsed_stacks_from_pstats(
+    stats: pstats.Stats,
+    max_depth=64,
+    min_share=0.0001,
+):
+    """Return collapsed stacks approximated from the caller graph of cProfile.
+
+    cProfile only records caller/callee pairs, not full stacks. The time of
+    a function is split among its callers by their share of calls.
+    Stacks below min_share of the total time are left out, as the number of
+    paths through the caller graph grows exponentially.
+    Lines have the format "root;child;leaf microseconds".
+    """
+    callees = {}
+    for function_key, (_, _, _, _, callers) in stats.stats.items():
+        for caller_key, caller_stats in callers.items():
+            callees.setdefault(caller_key, []).append(
+                (function_key, caller_stats[3]),
+            )
+
+    stacks = {}
+
+    def add_stack(function_key, stack, share):
+        self_time = stats.stats[function_key][2]
+        stack = [*stack, get_function_label(function_key)]
+
+        self_microseconds = int(self_time * share * 1e6)
+        if self_microseconds:
+            stack_line = ";".join(stack)
+            stacks[stack_line] = stacks.get(stack_line, 0) + self_microseconds
+
+        if len(stack) >= max_depth:
+            return
+
+        for callee_key, callee_time in callees.get(function_key, []):
+            callee_total_time = stats.stats[callee_key][3]
+            if (
+                share * callee_time < min_time
+                or get_function_label(callee_key) in stack
+            ):
+                continue
+            add_stack(
+                callee_key,
+                stack,
+                share * callee_time / callee_total_time,
+            )
+
+    root_keys = [
+        function_key
+        for function_key, (_, _, _, _, callers) in stats.stats.items()
+        if not any(caller_key in stats.stats for caller_key in callers)
+    ]
+    min_time = max(
+        min_share * stats.total_tt,
+        # Avoids a division by zero for callees without measured time
+        1e-9,
+    )
+    for root_key in root_keys:
+        add_stack(root_key, [], 1.0)
+
+    return [f"{stack} {value}" for stack, value in stacks.items()]
+
+
+def get_collapsed_stacks_from_frame(frame, stack=None):
+    """Return collapsed stacks of a pyinstrument frame tree."""
+    stack = [*(stack or []), f"{frame.function} ({frame.code_position_short})"]
+    children_time = sum(child.time for child in frame.children)
+
+    lines = []
+    self_microseconds = int((frame.time - children_time) * 1e6)
+    if self_microseconds > 0:
+        lines.append(f"{';'.join(stack)} {self_microseconds}")
+
+    for child in frame.children:
+        lines.extend(get_collapsed_stacks_from_frame(child, stack))
+
+    return lines
+
+
+def log_profile_summary(pstats_file_path: Path):
+    """Append the functions with the highest cumulative time to the log."""
+    summary_stream = io.StringIO()
+    stats = pstats.Stats(str(pstats_file_path), stream=summary_stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+        consts.PROFILING_SETTING_TOP_FUNCTIONS,
+    )
+
+    logger.info(
+        "Top Funktionen nach kumulierter Laufzeit:\n"
+        f"{summary_stream.getvalue()}",
+    )
+
+
+def run_with_cprofile(run_name: str, function, *args, **kwargs):
+    """Run a function with cProfile and save its profile."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Only one profiler can be active at once, e.g. in parallel sweeps
+        logger.warning(
+            "Profiler bereits aktiv, führe ohne Profiling aus.",
+        )
+        return function(*args, **kwargs)
+
+    try:
+        return function(*args, **kwargs)
+
+    finally:
+        profiler.disable()
+
+        file_path = get_profile_file_path(run_name)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(file_path.with_suffix(".pstats"))
+        file_path.with_suffix(".collapsed").write_text(
+            "\n".join(get_collapsed_stacks_from_pstats(stats)),
+            encoding="utf-8",
+        )
+        logger.info(f"Profil gespeichert unter '{file_path}.pstats'")
+        log_profile_summary(file_path.with_suffix(".pstats"))
+
+
+def run_with_sampling_profiler(run_name: str, function, *args, **kwargs):
+    """Run a function with the pyinstrument sampling profiler and save its
+    profile.
+    """
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import PstatsRenderer
+
+    profiler = Profiler(
+        interval=consts.PROFILING_SETTING_SAMPLING_INTERVAL,
+        async_mode="disabled",
+    )
+    try:
+        profiler.start()
+    except RuntimeError:
+        logger.warning(
+            "Profiler bereits aktiv, führe ohne Profiling aus.",
+        )
+        return function(*args, **kwargs)
+
+    try:
+        return function(*args, **kwargs)
+
+    finally:
+        session = profiler.stop()
+
+        file_path = get_profile_file_path(run_name)
+        # Pstats renderer returns marshalled bytes decoded as string
+        file_path.with_suffix(".pstats").write_bytes(
+            PstatsRenderer().render(session).encode(
+                encoding="utf-8",
+                errors="surrogateescape",
+            ),
+        )
+        root_frame = session.root_frame()
+        file_path.with_suffix(".collapsed").write_text(
+            "\n".join(
+                get_collapsed_stacks_from_frame(root_frame)
+                if root_frame
+                else [],
+            ),
+            encoding="utf-8",
+        )
+        logger.info(f"Profil gespeichert unter '{file_path}.pstats'")
+        log_profile_summary(file_path.with_suffix(".pstats"))
+
+
+def profile_run(run_name: str):
+    """Decorator to profile a function if a profiler is set in settings.
+
+    Profiles are saved as pstats and collapsed stacks (for flame graphs) in
+    the log folder. The sampling profiler is used if set and installed,
+    otherwise cProfile.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = consts.PROFILING_SETTING_PROFILER.lower()
+
+            if profiler == consts.PROFILER_SAMPLING:
+                if importlib.util.find_spec("pyinstrument") is not None:
+                    return run_with_sampling_profiler(
+                        run_name,
+                        function,
+                        *args,
+                        **kwargs,
+                    )
+                logger.warning(
+                    "Sampling Profiler 'pyinstrument' nicht installiert,"
+                    " verwende cProfile.",
+                )
+                profiler = consts.PROFILER_CPROFILE
+
+            if profiler == consts.PROFILER_CPROFILE:
+                return run_with_cprofile(run_name, function, *args, **kwargs)
+
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -6,10 +6,10 @@ from contextlib import closing
 from pathlib import Path
 import numbers
 
-import pandas as pd
+import numpy as np
 
 from . import constants as consts
-from . import db_utils, file_utils
+from . import db_utils, file_utils, stat_aggregate_utils, stat_file_utils
 from .logger import logger
 
 
@@ -115,6 +115,20 @@ def apply_rule_to_df(df, column_x, operator_symbol, table_y, column_y):
     return df_rule_applied
 
 
+def draw_self_disenrolled_ids(assignment_ids, probability: float, seed):
+    """Return the ids of candidate assignments to set to self disenrolled.
+
+    assignment_ids: ids of accepted and enrolled candidates, sorted
+    ascending. One random draw per id in that order, so the generator page
+    and the pipeline disenroll the same assignments for a seed.
+    """
+    assignment_ids = np.asarray(assignment_ids, dtype=np.int64)
+
+    # One random draw per assignment instead of a loop over rows
+    rng = np.random.default_rng(seed)
+    return assignment_ids[rng.random(len(assignment_ids)) < probability]
+
+
 def get_ruleset_filelist():
     """Return a list of ruleset files present in the apps rule_files folder."""
     ruleset_folder = file_utils.get_folder(consts.FOLDER_RULE_FILES)
@@ -179,41 +193,90 @@ def get_stat_filelist():
     ]
 
 
-def read_stat_files(stat_folder_name: str):
-    """Read in pickled dataframes from a prior rule application and the
-    rules that were applied.
+def read_stat_info(stat_folder_name: str):
+    """Read only the info file of a prior rule application."""
+    return file_utils.read_json(
+        Path(consts.FOLDER_STAT_FILES, stat_folder_name),
+        consts.FILENAME_STAT_INFO,
+    )
+
 
+def get_stat_info_mismatch(stat_info_a: dict, stat_info_b: dict):
+    """Return the first stat info key that differs between two stats, so
+    their results can't be compared, or None if they can.
+
+    Stats can only be compared if they were simulated on the same database
+    import and semester.
     """
-    logger.info(f"Bereite Stat Files für {stat_folder_name} vor...")
+    for key in ("database_id", "assignment_semester"):
+        if stat_info_a[key] != stat_info_b[key]:
+            return key
 
-    stat_folder = file_utils.get_folder(
+    return None
+
+
+def update_stat_info(stat_folder_name: str, additional_stat_info: dict):
+    """Add further run information to an existing stat info file.
+
+    Used for information that is only known after the stat files were
+    written, e.g. the duration of writing them.
+    """
+    stat_info = read_stat_info(stat_folder_name)
+    stat_info.update(additional_stat_info)
+
+    file_utils.write_json(
+        stat_info,
         Path(consts.FOLDER_STAT_FILES, stat_folder_name),
+        consts.FILENAME_STAT_INFO,
     )
 
-    stat_info = file_utils.read_json(stat_folder, consts.FILENAME_STAT_INFO)
 
-    # Unpickle dataframes from disk
-    df_accepted_assignments = pd.read_pickle(
-        Path(stat_folder, consts.RULE_SETTING_STAT_FILE_ACCEPTED),
-        compression="infer",
+def read_stat_frames(stat_folder_name: str, stat_file_names, columns=None):
+    """Read only the given stat dataframes from a prior rule application.
+
+    columns: only read these columns of every dataframe, see
+    stat_file_utils.read_stat_frame().
+    Returns the stat info and the dataframes in the order of the given names.
+    """
+    stat_folder = file_utils.get_folder(
+        Path(consts.FOLDER_STAT_FILES, stat_folder_name),
     )
-    df_denied_assignments = pd.read_pickle(
-        Path(stat_folder, consts.RULE_SETTING_STAT_FILE_DENIED),
-        compression="infer",
+
+    stat_info = file_utils.read_json(stat_folder, consts.FILENAME_STAT_INFO)
+    stat_frames = stat_file_utils.read_stat_frames(
+        stat_folder,
+        stat_info,
+        stat_file_names,
+        columns,
     )
-    df_accepted_lecture_combinations = pd.read_pickle(
-        Path(
-            stat_folder,
+
+    return stat_info, *stat_frames
+
+
+def read_stat_files(stat_folder_name: str, columns=None):
+    """Read in stored dataframes from a prior rule application and the
+    rules that were applied.
+
+    columns: only read these columns of every dataframe, see
+    stat_file_utils.read_stat_frame().
+    """
+    logger.info(f"Bereite Stat Files für {stat_folder_name} vor...")
+
+    (
+        stat_info,
+        df_accepted_assignments,
+        df_denied_assignments,
+        df_accepted_lecture_combinations,
+        df_assignments,
+    ) = read_stat_frames(
+        stat_folder_name,
+        (
+            consts.RULE_SETTING_STAT_FILE_ACCEPTED,
+            consts.RULE_SETTING_STAT_FILE_DENIED,
             consts.RULE_SETTING_STAT_FILE_ACCEPTED_LECTURE_COMBINATIONS,
-        ),
-        compression="infer",
-    )
-    df_assignments = pd.read_pickle(
-        Path(
-            stat_folder,
             consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS,
         ),
-        compression="infer",
+        columns,
     )
 
     logger.info("Stat Files fertig vorbereitet.")
@@ -227,6 +290,60 @@ def read_stat_files(stat_folder_name: str):
     )
 
 
+def read_stat_aggregates(stat_folder_name: str):
+    """Read the aggregate cube of a prior rule application, see
+    stat_aggregate_utils.
+
+    The cube of stat folders written without one gets created from their
+    stat dataframes.
+    Returns the stat info and the cube.
+    """
+    stat_folder = file_utils.get_folder(
+        Path(consts.FOLDER_STAT_FILES, stat_folder_name),
+    )
+    stat_info = file_utils.read_json(stat_folder, consts.FILENAME_STAT_INFO)
+    stat_file_format = stat_file_utils.get_stat_folder_format(stat_info)
+
+    if "assignment_totals" in stat_info and stat_file_utils.get_stat_file_path(
+        stat_folder,
+        consts.RULE_SETTING_STAT_FILE_AGGREGATES,
+        stat_file_format,
+    ).is_file():
+        df_aggregates = stat_file_utils.read_stat_frame(
+            stat_folder,
+            consts.RULE_SETTING_STAT_FILE_AGGREGATES,
+            stat_file_format,
+        )
+        return stat_info, df_aggregates
+
+    logger.info(
+        f"Stat Ordner '{stat_folder_name}' hat keine Aggregate, erstelle"
+        " sie aus den Stat Files...",
+    )
+    (
+        stat_info,
+        df_accepted_assignments,
+        df_denied_assignments,
+        df_accepted_lecture_combinations,
+        df_assignments,
+    ) = read_stat_files(stat_folder_name)
+    df_aggregates = stat_aggregate_utils.create_aggregate_cube(
+        df_accepted_assignments,
+        df_denied_assignments,
+        df_accepted_lecture_combinations,
+        df_assignments,
+        stat_aggregate_utils.get_student_columns(
+            stat_info["database_filename"],
+            stat_info["assignment_semester"],
+        ),
+    )
+    stat_info["assignment_totals"] = (
+        stat_aggregate_utils.get_assignment_totals(df_assignments)
+    )
+
+    return stat_info, df_aggregates
+
+
 def write_stat_files(
     database_filename: str,
     ruleset_filename: str,
@@ -237,45 +354,75 @@ def write_stat_files(
     df_denied_assignments,
     df_accepted_lecture_combinations,
     df_assignments,
+    additional_stat_info: dict = None,
 ):
-    """Save dataframes from rule application and the used rules to disk."""
+    """Save dataframes from rule application and the used rules to disk.
+
+    additional_stat_info can hold further run information, e.g. the lottery
+    seed, that gets written to the stat info file.
+    """
     # Create new folder for stat files
     new_stat_folder = file_utils.get_folder(
         Path(consts.FOLDER_STAT_FILES, new_stat_folder_name),
     )
 
-    # Pickle dataframes to save them to disk
-    # New assignments with status applied this round
-    df_accepted_assignments.to_pickle(
-        Path(new_stat_folder, consts.RULE_SETTING_STAT_FILE_ACCEPTED),
-        compression="infer",
-    )
-    df_denied_assignments.to_pickle(
-        Path(new_stat_folder, consts.RULE_SETTING_STAT_FILE_DENIED),
-        compression="infer",
+    # Save dataframes to disk in the format set in settings.
+    # All assignments from chosen semester / preselection including previously
+    # accepted and denied ones, self disenrollments, leftover enrollments..
+    # New assignments with status applied this round are part of it as well,
+    # so they are only stored as ids and status if they can be rebuilt from
+    # it. Kombotrigger rows are new rows and always stored in full.
+    stat_file_format = stat_file_utils.get_stat_file_format()
+    stat_file_utils.write_stat_frame(
+        df_assignments,
+        new_stat_folder,
+        consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS,
+        stat_file_format,
     )
-    df_accepted_lecture_combinations.to_pickle(
-        Path(
-            new_stat_folder,
+    stat_file_layout = {}
+    for stat_file_name, df in (
+        (consts.RULE_SETTING_STAT_FILE_ACCEPTED, df_accepted_assignments),
+        (consts.RULE_SETTING_STAT_FILE_DENIED, df_denied_assignments),
+        (
             consts.RULE_SETTING_STAT_FILE_ACCEPTED_LECTURE_COMBINATIONS,
+            df_accepted_lecture_combinations,
         ),
-        compression="infer",
-    )
-    # All assignments from chosen semester / preselection including previously
-    # accepted and denied ones, self disenrollments, leftover enrollments..
-    # Every other df is redundant to this one, but tracking and handling of
-    # new assignments is easier when splitting them into seperate dfs.
-    # Could be mittigated by using the timestamp or a round tracking column
-    # together with the semester to detect new assignments with the downside
-    # of needing to write a lot of dataframe selection code.
-    # This approach scarifices hard drive space for code readability and
-    # ease of use.
-    df_assignments.to_pickle(
-        Path(
+    ):
+        df_outcome = stat_file_utils.get_outcome_frame(df, df_assignments)
+        if df_outcome is None:
+            stat_file_layout[stat_file_name] = (
+                stat_file_utils.STAT_FILE_LAYOUT_FULL
+            )
+        else:
+            df = df_outcome
+            stat_file_layout[stat_file_name] = (
+                stat_file_utils.STAT_FILE_LAYOUT_OUTCOME
+            )
+
+        stat_file_utils.write_stat_frame(
+            df,
             new_stat_folder,
-            consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS,
+            stat_file_name,
+            stat_file_format,
+        )
+
+    # Counts for the overview and visualizer charts, so they don't need to
+    # load and group the dataframes above
+    df_aggregates = stat_aggregate_utils.create_aggregate_cube(
+        df_accepted_assignments,
+        df_denied_assignments,
+        df_accepted_lecture_combinations,
+        df_assignments,
+        stat_aggregate_utils.get_student_columns(
+            database_filename,
+            assignment_semester,
         ),
-        compression="infer",
+    )
+    stat_file_utils.write_stat_frame(
+        df_aggregates,
+        new_stat_folder,
+        consts.RULE_SETTING_STAT_FILE_AGGREGATES,
+        stat_file_format,
     )
 
     # Get db id for later ruleset comparisons.
@@ -294,7 +441,7 @@ def write_stat_files(
         ruleset_filename,
     )
 
-    # Write info file next to pickled dataframes
+    # Write info file next to stored dataframes
     stat_info = {
         "database_filename": database_filename,
         "database_id": database_id,
@@ -303,7 +450,15 @@ def write_stat_files(
         "ruleset_filename": ruleset_filename,
         "ruleset_rule_preselection": rule_preselection,
         "ruleset_rules_assignment": rules_assignment,
+        "stat_file_format": stat_file_format,
+        "stat_file_layout": stat_file_layout,
+        "assignment_totals": stat_aggregate_utils.get_assignment_totals(
+            df_assignments,
+        ),
     }
+    if additional_stat_info:
+        stat_info.update(additional_stat_info)
+
     file_utils.write_json(
         stat_info,
         new_stat_folder,
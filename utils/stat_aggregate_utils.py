@@ -0,0 +1,206 @@
+"""Utils for the aggregate cube of a stat folder.
+
+The cube holds the number of assignments per selection, rule, status and
+value of every dimension the overview and visualizer charts show. It gets
+written next to the stat files at simulation time, so the charts only need
+to sum up a few rows instead of grouping the full stat dataframes.
+
+Every cube row belongs to one dimension and only has a value in the column
+of this dimension, so every column keeps the dtype of the stat dataframes.
+"""
+
+import pandas as pd
+
+from . import constants as consts
+from . import db_utils
+
+COLUMN_SELECTION = "auswahl"
+COLUMN_DIMENSION = "dimension"
+COLUMN_COUNT = "Anzahl"
+
+# Selections stored in the cube
+SELECTION_ACCEPTED = "zulassungen"
+SELECTION_DENIED = "ablehnungen"
+SELECTION_COMBINATIONS = "kombinationszulassungen"
+SELECTION_ASSIGNMENTS = "gesamt"
+
+# Selections put together from the stored ones
+SELECTION_NEW = "neu"
+SELECTION_NEW_WITH_COMBINATIONS = "neu_mit_kombinationen"
+SELECTION_ENROLLED = "angemeldet"
+SELECTION_SELF_DISENROLLED = "selbstabgemeldet"
+
+SELECTION_PARTS = {
+    SELECTION_NEW: [SELECTION_ACCEPTED, SELECTION_DENIED],
+    SELECTION_NEW_WITH_COMBINATIONS: [
+        SELECTION_ACCEPTED,
+        SELECTION_DENIED,
+        SELECTION_COMBINATIONS,
+    ],
+    SELECTION_ENROLLED: [SELECTION_ASSIGNMENTS],
+    SELECTION_SELF_DISENROLLED: [SELECTION_ASSIGNMENTS],
+}
+SELECTION_STATUS = {
+    SELECTION_ENROLLED: consts.RULE_SETTING_STATUS_ENROLLED,
+    SELECTION_SELF_DISENROLLED: consts.RULE_SETTING_STATUS_SELF_DISENROLLED,
+}
+
+# Every cube row is counted per rule and status
+KEY_COLUMNS = ["sortierwert", "status"]
+
+ASSIGNMENT_COLUMNS = [
+    "fachsemester",
+    "studiengangs_id",
+    "veranstaltungs_id",
+    "gruppen_id",
+    "erstbelegung",
+]
+# Merged from the students table via the matriculation number
+STUDENT_COLUMNS = ["hoererstatus", "studiumsart", "studiumstyp"]
+DIMENSIONS = [*ASSIGNMENT_COLUMNS, *STUDENT_COLUMNS]
+CUBE_COLUMNS = [
+    COLUMN_SELECTION,
+    COLUMN_DIMENSION,
+    *KEY_COLUMNS,
+    *DIMENSIONS,
+    COLUMN_COUNT,
+]
+
+# Number of unique values in the assignments snapshot for the overview
+TOTAL_COLUMNS = [
+    "matrikelnummer",
+    "studiengangs_id",
+    "veranstaltungs_id",
+    "gruppen_id",
+]
+
+
+def get_student_columns(database_name: str, assignment_semester):
+    """Return the student columns of the cube per matriculation number."""
+    df_students = db_utils.get_df(
+        database_name,
+        "studierende",
+        condition="_pk_semester",
+        condition_value=assignment_semester,
+    )
+    df_students = df_students.drop_duplicates(
+        subset="_pk_matrikelnummer",
+        keep="first",
+    )
+    return df_students.set_index("_pk_matrikelnummer")[STUDENT_COLUMNS]
+
+
+def create_aggregate_cube(
+    df_accepted_assignments,
+    df_denied_assignments,
+    df_accepted_lecture_combinations,
+    df_assignments,
+    df_student_columns,
+):
+    """Count the assignments of the stat dataframes per rule, status and
+    dimension value.
+
+    df_student_columns: student columns per matriculation number, see
+    get_student_columns().
+    """
+    cube_parts = []
+    for selection, df in (
+        (SELECTION_ACCEPTED, df_accepted_assignments),
+        (SELECTION_DENIED, df_denied_assignments),
+        (SELECTION_COMBINATIONS, df_accepted_lecture_combinations),
+        (SELECTION_ASSIGNMENTS, df_assignments),
+    ):
+        if df.empty:
+            continue
+
+        df_dimensions = df[[*KEY_COLUMNS, *ASSIGNMENT_COLUMNS]].copy()
+        for column in STUDENT_COLUMNS:
+            df_dimensions[column] = df["matrikelnummer"].map(
+                df_student_columns[column],
+            )
+
+        for dimension in DIMENSIONS:
+            df_counts = (
+                df_dimensions.groupby(
+                    [*KEY_COLUMNS, dimension],
+                    dropna=False,
+                    sort=True,
+                )
+                .size()
+                .reset_index(name=COLUMN_COUNT)
+            )
+            df_counts.insert(0, COLUMN_DIMENSION, dimension)
+            df_counts.insert(0, COLUMN_SELECTION, selection)
+            cube_parts.append(df_counts)
+
+    if not cube_parts:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+
+    return pd.concat(cube_parts, ignore_index=True)[CUBE_COLUMNS]
+
+
+def get_assignment_totals(df_assignments):
+    """Return the number of unique students, study programs, lectures and
+    groups in the assignments snapshot.
+    """
+    return {
+        column: (
+            int(df_assignments[column].nunique())
+            if column in df_assignments.columns
+            else 0
+        )
+        for column in TOTAL_COLUMNS
+    }
+
+
+def get_selection(df_cube, selection: str, dimension: str = DIMENSIONS[0]):
+    """Return the cube rows of a selection and dimension.
+
+    Returns the rule, status, dimension and count columns. Rows of put
+    together selections are not summed up yet.
+    """
+    selections = SELECTION_PARTS.get(selection, [selection])
+    df = df_cube[
+        df_cube[COLUMN_SELECTION].isin(selections)
+        & (df_cube[COLUMN_DIMENSION] == dimension)
+    ]
+
+    if selection in SELECTION_STATUS:
+        df = df[df["status"] == SELECTION_STATUS[selection]]
+
+    return df[[*KEY_COLUMNS, dimension, COLUMN_COUNT]]
+
+
+def get_counts(df_cube, selection: str, columns: list):
+    """Return the number of assignments of a selection per value of the
+    given rule, status or dimension columns. Missing values are not counted.
+    """
+    dimensions = [column for column in columns if column in DIMENSIONS]
+    dimension = dimensions[0] if dimensions else DIMENSIONS[0]
+
+    return (
+        get_selection(df_cube, selection, dimension)
+        .groupby(columns, sort=True)[COLUMN_COUNT]
+        .sum()
+        .reset_index()
+    )
+
+
+def get_total(df_cube, selection: str):
+    """Return the number of assignments of a selection."""
+    return int(get_selection(df_cube, selection)[COLUMN_COUNT].sum())
+
+
+def get_mean(df_cube, selection: str, dimension: str):
+    """Return the mean value of a numeric dimension for a selection, None if
+    there are no values.
+    """
+    df = get_selection(df_cube, selection, dimension).dropna(
+        subset=[dimension],
+    )
+    if df.empty:
+        return None
+
+    return float(
+        (df[dimension] * df[COLUMN_COUNT]).sum() / df[COLUMN_COUNT].sum(),
+    )
@@ -0,0 +1,470 @@
+"""Utils for storing the dataframes of stat folders.
+
+Stat dataframes are stored as xz compressed pickles or as columnar Parquet
+or Arrow IPC files. Columnar files are faster to write and read, don't
+depend on the pandas version and allow reading only some columns.
+The format of a stat folder is saved in its stat info file, folders
+without this entry are pickled.
+
+The assignments snapshot of a round holds every row of the accepted and
+denied dataframes, which differ from it at most in their status. Such
+dataframes are only stored as their ids and status and get rebuilt from
+the snapshot when read. The layout of every stat file is saved in the stat
+info file as well, folders without this entry store full dataframes.
+
+Run as module to convert existing stat folders to the format set in
+settings:
+    python -m utils.stat_file_utils [--format parquet] [stat folders ...]
+"""
+
+import argparse
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from . import constants as consts
+from . import file_utils
+from .logger import logger
+
+STAT_FILE_FORMATS = [
+    consts.STAT_FILE_FORMAT_PICKLE,
+    consts.STAT_FILE_FORMAT_PARQUET,
+    consts.STAT_FILE_FORMAT_ARROW,
+]
+STAT_FILE_COMPRESSIONS = ["zstd", "lz4", "none"]
+
+# Columnar files replace the suffix of the stat file name set in settings
+STAT_FILE_SUFFIXES = {
+    consts.STAT_FILE_FORMAT_PARQUET: ".parquet",
+    consts.STAT_FILE_FORMAT_ARROW: ".arrow",
+}
+
+STAT_FILE_LAYOUT_FULL = "full"
+STAT_FILE_LAYOUT_OUTCOME = "outcome"
+
+
+def get_stat_file_names():
+    """Return the names of all stat files a stat folder can contain."""
+    return [
+        consts.RULE_SETTING_STAT_FILE_ACCEPTED,
+        consts.RULE_SETTING_STAT_FILE_DENIED,
+        consts.RULE_SETTING_STAT_FILE_ACCEPTED_LECTURE_COMBINATIONS,
+        consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS,
+        consts.RULE_SETTING_STAT_FILE_AGGREGATES,
+        consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_ASSIGNMENTS,
+        consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_STUDENTS,
+        consts.RULE_SETTING_STAT_FILE_MONTE_CARLO_GROUPS,
+    ]
+
+
+def get_stat_file_format(stat_file_format=None):
+    """Return the stat file format to write, defaults to the settings.
+
+    Falls back to pickle if the format is unknown or pyarrow is missing.
+    """
+    if stat_file_format is None:
+        stat_file_format = consts.RULE_SETTING_STAT_FILE_FORMAT
+    stat_file_format = stat_file_format.lower()
+
+    if stat_file_format not in STAT_FILE_FORMATS:
+        logger.warning(
+            f"Unbekanntes Stat File Format '{stat_file_format}',"
+            f" verwende {consts.STAT_FILE_FORMAT_PICKLE}.",
+        )
+        return consts.STAT_FILE_FORMAT_PICKLE
+
+    if stat_file_format != consts.STAT_FILE_FORMAT_PICKLE:
+        # An installed pyarrow can still fail to import, e.g. if it was
+        # built against another numpy version
+        try:
+            importlib.import_module("pyarrow")
+        except ImportError:
+            logger.warning(
+                f"Stat File Format '{stat_file_format}' benötigt 'pyarrow',"
+                f" verwende {consts.STAT_FILE_FORMAT_PICKLE}.",
+            )
+            return consts.STAT_FILE_FORMAT_PICKLE
+
+    return stat_file_format
+
+
+def get_stat_folder_format(stat_info: dict):
+    """Return the format the stat files of a stat folder are stored in."""
+    return stat_info.get("stat_file_format", consts.STAT_FILE_FORMAT_PICKLE)
+
+
+def get_compression():
+    """Return the codec for columnar stat files, None if uncompressed."""
+    compression = consts.RULE_SETTING_STAT_FILE_COMPRESSION.lower()
+    if compression not in STAT_FILE_COMPRESSIONS:
+        logger.warning(
+            f"Unbekannte Kompression '{compression}' für Stat Files,"
+            " verwende zstd.",
+        )
+        compression = "zstd"
+
+    return None if compression == "none" else compression
+
+
+def get_stat_file_path(
+    stat_folder: Path,
+    stat_file_name: str,
+    stat_file_format,
+):
+    """Return the path of a stat file in the given format."""
+    if stat_file_format == consts.STAT_FILE_FORMAT_PICKLE:
+        return Path(stat_folder, stat_file_name)
+
+    return Path(
+        stat_folder,
+        Path(stat_file_name).stem + STAT_FILE_SUFFIXES[stat_file_format],
+    )
+
+
+def write_stat_frame(
+    df,
+    stat_folder: Path,
+    stat_file_name: str,
+    stat_file_format,
+):
+    """Write a stat dataframe including its index in the given format."""
+    file_path = get_stat_file_path(
+        stat_folder,
+        stat_file_name,
+        stat_file_format,
+    )
+
+    if stat_file_format == consts.STAT_FILE_FORMAT_PICKLE:
+        df.to_pickle(file_path, compression="infer")
+        return file_path
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    compression = get_compression()
+
+    if stat_file_format == consts.STAT_FILE_FORMAT_PARQUET:
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, file_path, compression=compression or "none")
+
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(str(file_path), "wb") as sink:
+            with pa.ipc.new_file(
+                sink,
+                table.schema,
+                options=options,
+            ) as writer:
+                writer.write_table(table)
+
+    return file_path
+
+
+def get_index_columns(schema):
+    """Return the stored index columns of an arrow schema written from
+    pandas. Range indices are only saved as metadata and not returned.
+    """
+    pandas_metadata = schema.pandas_metadata or {}
+    return [
+        column
+        for column in pandas_metadata.get("index_columns", [])
+        if isinstance(column, str)
+    ]
+
+
+def read_stat_frame(
+    stat_folder: Path,
+    stat_file_name: str,
+    stat_file_format,
+    columns=None,
+):
+    """Read a stat dataframe written by write_stat_frame().
+
+    columns: only read these columns, the index is always read. Columns
+    missing in the file are left out, e.g. of empty simulator dataframes.
+    Columnar files are memory mapped and skip all other columns on disk.
+    """
+    file_path = get_stat_file_path(
+        stat_folder,
+        stat_file_name,
+        stat_file_format,
+    )
+
+    if stat_file_format == consts.STAT_FILE_FORMAT_PICKLE:
+        df = pd.read_pickle(file_path, compression="infer")
+        if columns is None:
+            return df
+        return df[[column for column in columns if column in df.columns]]
+
+    import pyarrow as pa
+
+    if stat_file_format == consts.STAT_FILE_FORMAT_PARQUET:
+        import pyarrow.parquet as pq
+
+        if columns is not None:
+            schema_names = pq.read_schema(file_path).names
+            columns = [column for column in columns if column in schema_names]
+
+        # Index columns get added by pyarrow through the pandas metadata
+        table = pq.read_pandas(file_path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    # Converted while the memory map is open, as the table points into it
+    with pa.memory_map(str(file_path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            columns = [
+                column for column in columns if column in table.schema.names
+            ]
+            table = table.select(
+                [*columns, *get_index_columns(table.schema)],
+            )
+        return table.to_pandas()
+
+
+def rebuild_outcome_frame(df_outcome, df_assignments):
+    """Rebuild a stat dataframe from its outcome dataframe and the
+    assignments snapshot it was taken from. Rows keep the outcome order.
+    """
+    df = df_assignments.take(
+        df_assignments.index.get_indexer(df_outcome.index),
+    )
+
+    column_status = consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+    if column_status in df.columns:
+        df[column_status] = df_outcome[column_status].to_numpy()
+
+    return df
+
+
+def get_outcome_frame(df, df_assignments):
+    """Return the ids and status of a stat dataframe if all other values are
+    found in the assignments snapshot, None if it can't be rebuilt from it.
+    """
+    column_status = consts.COLUMN_NAME_ASSIGNMENTS_STATUS
+    if (
+        df.empty
+        or column_status not in df.columns
+        or df.index.name != df_assignments.index.name
+        or not df.index.is_unique
+        or not df_assignments.index.is_unique
+        or not df.index.isin(df_assignments.index).all()
+    ):
+        return None
+
+    df_outcome = df[[column_status]]
+
+    # Only store the outcome if the rebuild gives back the same dataframe
+    if not rebuild_outcome_frame(df_outcome, df_assignments).equals(df):
+        return None
+
+    return df_outcome
+
+
+def get_stat_file_layout(stat_info: dict, stat_file_name: str):
+    """Return the layout a stat file of a stat folder is stored in."""
+    return stat_info.get("stat_file_layout", {}).get(
+        stat_file_name,
+        STAT_FILE_LAYOUT_FULL,
+    )
+
+
+def read_stat_frames(
+    stat_folder: Path,
+    stat_info: dict,
+    stat_file_names,
+    columns=None,
+):
+    """Read the given stat dataframes of a stat folder.
+
+    Outcome dataframes get rebuilt from the assignments snapshot, which is
+    read once and only if needed.
+    columns: only read these columns of every dataframe, see
+    read_stat_frame().
+    Returns the dataframes in the order of the given names.
+    """
+    stat_file_format = get_stat_folder_format(stat_info)
+    stat_file_name_assignments = consts.RULE_SETTING_STAT_FILE_ASSIGNMENTS
+
+    df_assignments = None
+    stat_frames = []
+    for stat_file_name in stat_file_names:
+        if (
+            get_stat_file_layout(stat_info, stat_file_name)
+            != STAT_FILE_LAYOUT_OUTCOME
+        ) and stat_file_name != stat_file_name_assignments:
+            stat_frames.append(
+                read_stat_frame(
+                    stat_folder,
+                    stat_file_name,
+                    stat_file_format,
+                    columns,
+                ),
+            )
+            continue
+
+        if df_assignments is None:
+            df_assignments = read_stat_frame(
+                stat_folder,
+                stat_file_name_assignments,
+                stat_file_format,
+                columns,
+            )
+
+        if stat_file_name == stat_file_name_assignments:
+            stat_frames.append(df_assignments)
+            continue
+
+        df_outcome = read_stat_frame(
+            stat_folder,
+            stat_file_name,
+            stat_file_format,
+        )
+        stat_frames.append(rebuild_outcome_frame(df_outcome, df_assignments))
+
+    return stat_frames
+
+
+def convert_stat_folder(stat_folder: Path, stat_file_format):
+    """Convert all stat files of a stat folder to the given format.
+
+    Files keep their layout, outcome files stay outcome files. Old files
+    are only removed after all new files were written.
+    Returns the number of converted files.
+    """
+    stat_info = file_utils.read_json(stat_folder, consts.FILENAME_STAT_INFO)
+    previous_format = get_stat_folder_format(stat_info)
+    if previous_format == stat_file_format:
+        return 0
+
+    converted_files = []
+    for stat_file_name in get_stat_file_names():
+        previous_file_path = get_stat_file_path(
+            stat_folder,
+            stat_file_name,
+            previous_format,
+        )
+        if not previous_file_path.is_file():
+            continue
+
+        df = read_stat_frame(stat_folder, stat_file_name, previous_format)
+        write_stat_frame(df, stat_folder, stat_file_name, stat_file_format)
+        converted_files.append(previous_file_path)
+
+    stat_info["stat_file_format"] = stat_file_format
+    file_utils.write_json(stat_info, stat_folder, consts.FILENAME_STAT_INFO)
+
+    for previous_file_path in converted_files:
+        previous_file_path.unlink()
+
+    return len(converted_files)
+
+
+def convert_stat_folders(
+    stat_folder_names=None,
+    stat_file_format=None,
+    processes=None,
+):
+    """Convert stat folders to another format in parallel processes.
+
+    Converts all stat folders if no names are given, to the format set in
+    settings if no format is given.
+    Returns the names of all successfully converted stat folders.
+    """
+    stat_file_format = get_stat_file_format(stat_file_format)
+    stats_folder = file_utils.get_folder(consts.FOLDER_STAT_FILES)
+    if stat_folder_names is None:
+        stat_folder_names = [
+            name
+            for name in os.listdir(stats_folder)
+            if file_utils.check_file_presence(
+                Path(stats_folder, name),
+                consts.FILENAME_STAT_INFO,
+            )
+        ]
+    if not stat_folder_names:
+        return []
+
+    if processes is None:
+        processes = (
+            consts.RULE_SETTING_STAT_FILE_CONVERT_PROCESSES or os.cpu_count()
+        )
+    processes = max(1, min(processes, len(stat_folder_names)))
+
+    logger.info(
+        f"Konvertiere {len(stat_folder_names)} Stat Ordner zu"
+        f" '{stat_file_format}' mit {processes} Prozess(en)...",
+    )
+
+    converted_stat_folder_names = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(
+                convert_stat_folder,
+                Path(stats_folder, stat_folder_name),
+                stat_file_format,
+            ): stat_folder_name
+            for stat_folder_name in stat_folder_names
+        }
+
+        for future in as_completed(futures):
+            try:
+                converted_files = future.result()
+                converted_stat_folder_names.append(futures[future])
+                logger.info(
+                    f"Stat Ordner '{futures[future]}' konvertiert"
+                    f" ({converted_files} Dateien).",
+                )
+
+            except Exception as e:
+                logger.error(
+                    f"Stat Ordner '{futures[future]}' konnte nicht"
+                    f" konvertiert werden: {e}",
+                )
+
+    logger.info(
+        f"{consts.CONSOLE_GREEN}{len(converted_stat_folder_names)} von"
+        f" {len(stat_folder_names)} Stat Ordnern konvertiert."
+        f" {consts.CONSOLE_ENDCMD}",
+    )
+
+    return converted_stat_folder_names
+
+
+def main():
+    """Convert stat folders from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Konvertiert Stat Ordner in ein anderes Dateiformat.",
+    )
+    parser.add_argument(
+        "stat_folders",
+        nargs="*",
+        help="Namen der Stat Ordner, standardmäßig alle",
+    )
+    parser.add_argument(
+        "--format",
+        choices=STAT_FILE_FORMATS,
+        default=None,
+        help="Zielformat, standardmäßig aus den Einstellungen",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Anzahl paralleler Prozesse",
+    )
+    args = parser.parse_args()
+
+    convert_stat_folders(
+        args.stat_folders or None,
+        args.format,
+        args.processes,
+    )
+
+
+if __name__ == "__main__":
+    main()